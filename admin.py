@@ -0,0 +1,24 @@
+# admin.py - Guard for operator-only endpoints
+#
+# Set ADMIN_TOKEN and send it as the X-Admin-Token header. Without
+# ADMIN_TOKEN every admin endpoint answers 404, so nothing is exposed by
+# default on a fresh deploy.
+import functools
+import hmac
+import os
+
+from flask import jsonify, request
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints are disabled (set ADMIN_TOKEN)'}), 404
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'error': 'Admin token required'}), 403
+        return view(*args, **kwargs)
+    return wrapped
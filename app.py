@@ -9,6 +9,21 @@ import sys
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import text
+import item_search
+import item_sync
+import live_events
+import ratelimit
+import datagen
+import archive
+import warmup
+import tracing
+import profiler
+import rollups
+import item_bulk
+import item_patch
+import assets
+import traffic
+import shmcache
 
 print("=" * 60)
 print("🚀 Starting Python 3.14 Flask App")
@@ -38,6 +53,8 @@ CORS(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 migrate = Migrate(app, db)
+# TRAFFIC_CAPTURE=1: sanitised request log for `python traffic.py replay` (registered first so every request is timed)
+traffic.init_app(app)
 
 # Models
 class User(db.Model, UserMixin):
@@ -80,10 +97,19 @@ class Item(db.Model):
             'description': self.description,
             'status': self.status,
             'user_id': self.user_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Full-text index over Item title/description (FTS5 on SQLite, inverted index elsewhere)
+item_search.init_app(app, db, Item)
+# Tombstones + (user_id, updated_at, id) index for the incremental change feed
+ItemTombstone = item_sync.init_app(app, db, Item)
+# Cold items move to items_archive (`flask archive-items`)
+ArchivedItem = archive.init_app(app, db, Item)
+
 @login_manager.user_loader
+@tracing.traced('auth')
 def load_user(user_id):
     return User.query.get(int(user_id))
 
@@ -124,170 +150,59 @@ def create_sample_data():
         db.session.commit()
         print(f"✓ Created {User.query.count()} users and {Item.query.count()} items")
 
+# Per-user/status/day item counts kept in item_rollups: GET /api/stats
+rollups.init_app(app, db, Item)
+
+# `flask generate-data`: bulk synthetic users/items for benchmarking
+datagen.init_app(app, db, Item)
+
+# Fingerprinted /static/dist bundles (asset_url) and the Jinja bytecode cache
+assets.init_app(app)
+
+# GET /api/ready: 503 until this worker's pool and templates are warm (see gunicorn_conf.py)
+warmup.init_app(app)
+
+# Sampled request/auth/sql/serialize spans: Server-Timing header + TRACE_EXPORT
+tracing.init_app(app)
+
+# Admin-only CPU profile and tracemalloc snapshots (ADMIN_TOKEN)
+profiler.init_app(app)
+
+# Push item changes and health transitions to /api/events subscribers
+health_monitor = live_events.init_app(app, db, Item, test_db_connection)
+
+# Landing pages poll /api/health: one worker per node runs the probe per HEALTH_CACHE_SECONDS
+shmcache.init_app(app)
+HEALTH_CACHE_SECONDS = float(os.environ.get('HEALTH_CACHE_SECONDS', '10'))
+FAILURE_CACHE_SECONDS = float(os.environ.get('FAILURE_CACHE_SECONDS', '2'))
+
 # Routes
 @app.route('/')
 def index():
-    return '''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <title>Python 3.14 Mobile App</title>
-    <style>
-        body { 
-            font-family: Arial, sans-serif; 
-            margin: 0; 
-            padding: 20px; 
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-        }
-        .container { 
-            max-width: 800px; 
-            margin: 0 auto; 
-            background: white; 
-            border-radius: 15px; 
-            padding: 30px; 
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-        }
-        h1 { 
-            color: #333; 
-            margin-bottom: 20px; 
-            text-align: center;
-        }
-        .card {
-            background: #f8f9fa;
-            border-radius: 10px;
-            padding: 20px;
-            margin: 15px 0;
-        }
-        .btn {
-            background: #0078d4;
-            color: white;
-            border: none;
-            padding: 12px 24px;
-            border-radius: 8px;
-            font-size: 16px;
-            cursor: pointer;
-            margin: 5px;
-            transition: background 0.3s;
-        }
-        .btn:hover { background: #005a9e; }
-        .status { 
-            padding: 15px; 
-            background: #e8f4fd; 
-            border-radius: 8px;
-            margin: 15px 0;
-            border-left: 4px solid #0078d4;
-        }
-        .mobile-box {
-            background: #28a745;
-            color: white;
-            padding: 15px;
-            border-radius: 10px;
-            margin: 20px 0;
-        }
-        pre {
-            background: #f4f4f4;
-            padding: 15px;
-            border-radius: 5px;
-            overflow-x: auto;
-            font-family: monospace;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>📱 Python 3.14 Mobile App</h1>
-        <p style="text-align: center; color: #666;">Fully functional web app accessible from your phone!</p>
-        
-        <div class="mobile-box">
-            <h3 style="margin-top: 0;">📲 Mobile Access:</h3>
-            <p>On your phone browser, open:</p>
-            <code style="background: rgba(255,255,255,0.2); padding: 5px 10px; border-radius: 5px;">http://192.168.40.7:5000</code>
-            <p><small>(Must be on same WiFi network)</small></p>
-        </div>
-        
-        <div class="card">
-            <h3>Test API Endpoints</h3>
-            <button class="btn" onclick="testHealth()">Test Health</button>
-            <button class="btn" onclick="testDB()">Test Database</button>
-            <div class="status" id="status">Ready to test...</div>
-            <pre id="result"></pre>
-        </div>
-        
-        <div class="card">
-            <h3>Quick Links</h3>
-            <p><a href="/api/health" target="_blank">/api/health - Health Check</a></p>
-            <p><a href="/api/test-db" target="_blank">/api/test-db - Database Test</a></p>
-            <p><a href="/api/auth/me" target="_blank">/api/auth/me - Current User</a></p>
-        </div>
-        
-        <div class="card">
-            <h3>Test Users</h3>
-            <p><strong>Username:</strong> admin | <strong>Password:</strong> admin123</p>
-            <p><strong>Username:</strong> test | <strong>Password:</strong> test123</p>
-            <p><em>Use these to test login functionality</em></p>
-        </div>
-        
-        <div class="card">
-            <h3>API Documentation</h3>
-            <p><strong>GET /api/health</strong> - Check system health</p>
-            <p><strong>GET /api/test-db</strong> - Test database connection</p>
-            <p><strong>POST /api/auth/login</strong> - User login</p>
-            <p><strong>POST /api/auth/register</strong> - User registration</p>
-            <p><strong>GET /api/items</strong> - Get user items</p>
-        </div>
-    </div>
-    
-    <script>
-        async function testHealth() {
-            document.getElementById('status').innerHTML = 'Testing health...';
-            try {
-                const response = await fetch('/api/health');
-                const data = await response.json();
-                document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                document.getElementById('status').innerHTML = '✓ Health check successful';
-            } catch (error) {
-                document.getElementById('result').innerHTML = 'Error: ' + error;
-                document.getElementById('status').innerHTML = '✗ Health check failed';
-            }
-        }
-        
-        async function testDB() {
-            document.getElementById('status').innerHTML = 'Testing database...';
-            try {
-                const response = await fetch('/api/test-db');
-                const data = await response.json();
-                document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                if (data.status === 'success') {
-                    document.getElementById('status').innerHTML = '✓ Database connected';
-                } else {
-                    document.getElementById('status').innerHTML = '✗ Database error';
-                }
-            } catch (error) {
-                document.getElementById('result').innerHTML = 'Error: ' + error;
-                document.getElementById('status').innerHTML = '✗ Database test failed';
-            }
-        }
-        
-        // Auto-test on load
-        window.onload = testHealth;
-    </script>
-</body>
-</html>
-'''
+    return render_template('home.html')
 
 @app.route('/api/health')
 def health():
     return jsonify({
         'status': 'healthy',
         'python': sys.version.split()[0],
-        'database': 'connected' if test_db_connection() else 'disconnected',
+        'database': shmcache.get('app:health:database',
+                                 lambda: 'connected' if test_db_connection() else 'disconnected',
+                                 ttl=lambda s: HEALTH_CACHE_SECONDS if s == 'connected' else FAILURE_CACHE_SECONDS),
         'app': 'Flask Mobile App',
         'mobile_url': 'http://192.168.40.7:5000',
         'message': 'App is running successfully!'
     })
 
+@app.route('/api/events')
+def events():
+    # Anonymous streams receive health changes only; signed-in users also get their item changes
+    user_id = current_user.id if current_user.is_authenticated else None
+    initial = [('health', health_monitor.current())] if health_monitor.state else []
+    response = live_events.event_response(user_id, initial)
+    health_monitor.ensure_running()
+    return response
+
 @app.route('/api/test-db')
 def test_db():
     try:
@@ -300,7 +215,8 @@ def test_db():
             'tables': tables,
             'record_counts': {
                 'users': User.query.count(),
-                'items': Item.query.count()
+                # From item_rollups: no scan of items
+                'items': sum(rollups.counts(db.session.connection(), 'status')['status'].values())
             }
         })
     except Exception as e:
@@ -311,6 +227,7 @@ def test_db():
         }), 500
 
 @app.route('/api/auth/login', methods=['POST'])
+@ratelimit.limit('login', client='10/minute', global_='20/second', max_concurrent=4, max_queue_ms=250)
 def login():
     try:
         data = request.get_json()
@@ -327,6 +244,7 @@ def login():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/auth/register', methods=['POST'])
+@ratelimit.limit('register', client='10/minute', global_='20/second', max_concurrent=4, max_queue_ms=250)
 def register():
     try:
         data = request.get_json()
@@ -359,11 +277,27 @@ def logout():
 def get_current_user():
     return jsonify(current_user.to_dict())
 
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    return render_template('dashboard.html')
+
 @app.route('/api/items')
 @login_required
 def get_items():
-    items = Item.query.filter_by(user_id=current_user.id).all()
-    return jsonify([item.to_dict() for item in items])
+    # ?include_archived=1 or a ?from= date older than the archive horizon also reads items_archive
+    try:
+        created_from = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        created_to = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates'}), 400
+    items = archive.items_for_user(
+        db.session, Item, current_user.id,
+        include_archived=request.args.get('include_archived') in ('1', 'true'),
+        created_from=created_from, created_to=created_to
+    )
+    with tracing.span('serialize', rows=len(items)):
+        return jsonify(items)
 
 @app.route('/api/items', methods=['POST'])
 @login_required
@@ -376,7 +310,133 @@ def create_item():
     )
     db.session.add(item)
     db.session.commit()
-    return jsonify(item.to_dict()), 201
+    response = jsonify(item.to_dict())
+    response.headers['ETag'] = item_patch.etag(item.updated_at)
+    return response, 201
+
+@app.route('/api/items/<int:item_id>')
+@login_required
+def get_item(item_id):
+    item = Item.query.filter_by(id=item_id, user_id=current_user.id).first()
+    if not item:
+        return jsonify({'error': 'Item not found'}), 404
+    response = jsonify(item.to_dict())
+    response.headers['ETag'] = item_patch.etag(item.updated_at)
+    return response
+
+@app.route('/api/items/<int:item_id>', methods=['PATCH'])
+@login_required
+def patch_item(item_id):
+    # One conditional UPDATE ... RETURNING; If-Match carries the ETag from GET/POST/PATCH
+    if 'If-Match' not in request.headers:
+        return jsonify({'error': 'If-Match header required (use the item ETag, or *)'}), 428
+    try:
+        expected = item_patch.parse_if_match(request.headers['If-Match'])
+        changes = item_patch.validate(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    user_id = current_user.id  # read before commit expires the user
+    try:
+        row = item_patch.patch(db.session.connection(), Item, item_id, user_id, expected, changes)
+    except LookupError:
+        db.session.rollback()
+        return jsonify({'error': 'Item not found'}), 404
+    except item_patch.PreconditionFailed as e:
+        db.session.rollback()
+        response = jsonify({'error': 'Item was modified by someone else', 'etag': e.current_etag})
+        response.headers['ETag'] = e.current_etag
+        return response, 412
+    db.session.commit()
+    item = Item(**row).to_dict()
+    live_events.hub.publish('item', {'op': 'updated', 'item': item}, user_id=user_id)
+    response = jsonify(item)
+    response.headers['ETag'] = item_patch.etag(row['updated_at'])
+    return response
+
+@app.route('/api/items/search')
+@login_required
+def search_items():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query (q)'}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    
+    items, has_more = item_search.search(
+        db.session, Item, query, user_id=current_user.id, page=page, per_page=per_page
+    )
+    return jsonify({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        'items': [item.to_dict() for item in items]
+    })
+
+@app.route('/api/items/changes')
+@login_required
+def item_changes():
+    try:
+        limit = int(request.args.get('limit', 500))
+        changes, cursor, has_more = item_sync.changes(
+            db.session, Item, current_user.id, cursor=request.args.get('since'), limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'changes': changes,
+        'cursor': cursor,
+        'has_more': has_more
+    })
+
+@app.route('/api/items/<int:item_id>', methods=['DELETE'])
+@login_required
+def delete_item(item_id):
+    item = Item.query.filter_by(id=item_id, user_id=current_user.id).first()
+    if not item:
+        return jsonify({'error': 'Item not found'}), 404
+    db.session.delete(item)
+    db.session.commit()
+    return jsonify({'message': 'Item deleted', 'id': item_id})
+
+@app.route('/api/items/bulk-update', methods=['POST'])
+@login_required
+def bulk_update_items():
+    # Set-based, id-window batches: rows are never loaded (see item_bulk.py)
+    data = request.get_json(silent=True) or {}
+    try:
+        where = item_bulk.parse_filter(Item, current_user.id, data.get('filter') or {})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('dry_run'):
+        return jsonify({'matched': item_bulk.count(db.engine, Item, where)})
+    try:
+        values = item_bulk.parse_set(data.get('set'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    updated, batches = item_bulk.bulk_update(db.engine, Item, where, values)
+    live_events.hub.publish('item', {'op': 'bulk_updated', 'set': values, 'count': updated}, user_id=current_user.id)
+    return jsonify({'updated': updated, 'batches': batches})
+
+@app.route('/api/items/bulk-delete', methods=['POST'])
+@login_required
+def bulk_delete_items():
+    data = request.get_json(silent=True) or {}
+    spec = data.get('filter') or {}
+    if not spec and not data.get('all'):
+        return jsonify({'error': 'Empty filter: pass "all": true to delete every item'}), 400
+    try:
+        where = item_bulk.parse_filter(Item, current_user.id, spec)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('dry_run'):
+        return jsonify({'matched': item_bulk.count(db.engine, Item, where)})
+    deleted, batches = item_bulk.bulk_delete(db.engine, Item, where)
+    live_events.hub.publish('item', {'op': 'bulk_deleted', 'count': deleted}, user_id=current_user.id)
+    return jsonify({'deleted': deleted, 'batches': batches})
 
 # Initialize app
 if __name__ == '__main__':
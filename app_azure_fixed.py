@@ -1,6 +1,11 @@
 # app_azure_fixed.py - UPDATED FOR PYTHONANYWHERE
-from flask import Flask, jsonify, render_template
-import pymssql
+from flask import Flask, jsonify, render_template, request
+import assets
+import azure_driver
+import jobs
+import metrics
+import shmcache
+import traffic
 import os
 import sys
 from dotenv import load_dotenv
@@ -58,16 +63,18 @@ PYMSSQL_CONNECTION = {
 
 
 # For SQLAlchemy (if you want to use it)
-SQLALCHEMY_DATABASE_URI = f"mssql+pymssql://{AZURE_USERNAME}:{AZURE_PASSWORD}@{AZURE_SERVER}:1433/{AZURE_DATABASE}"
+SQLALCHEMY_DATABASE_URI = azure_driver.sqlalchemy_uri(**PYMSSQL_CONNECTION)
 
 print(f"\n📊 Azure Configuration:")
 print(f"   Server: {AZURE_SERVER}")
 print(f"   Database: {AZURE_DATABASE}")
 print(f"   Username: {AZURE_USERNAME}")
 print(f"   Password: {'*' * len(AZURE_PASSWORD) if AZURE_PASSWORD else 'NOT SET'}")
+print(f"   Driver: {azure_driver.AZURE_DRIVER}")
 
 # Set Flask configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = azure_driver.engine_options(**PYMSSQL_CONNECTION)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'azure-app-secret-' + os.urandom(16).hex())
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
@@ -82,21 +89,34 @@ class TestUser(db.Model):
     username = db.Column(db.String(80))
     email = db.Column(db.String(120))
 
+# TRAFFIC_CAPTURE=1: sanitised request log for `python traffic.py replay` (registered first so every request is timed)
+traffic.init_app(app)
+
+# Long-running operations can be queued instead of run inside the request
+# (?async=1 on /api/create-tables and /api/list-tables, or POST /api/jobs; /api/jobs* need X-Admin-Token)
+job_store = jobs.init_app(app)
+# GET /api/metrics (single-flight hit counts)
+metrics.init_app(app)
+# Fingerprinted /static/dist bundles (asset_url) and the Jinja bytecode cache
+assets.init_app(app)
+# Azure status/health/table list shared by all workers on the node (GET /admin/shmcache)
+shmcache.init_app(app)
+HEALTH_CACHE_SECONDS = float(os.environ.get('HEALTH_CACHE_SECONDS', '30'))
+FAILURE_CACHE_SECONDS = float(os.environ.get('FAILURE_CACHE_SECONDS', '5'))
+
+@jobs.handler('create_tables')
+def create_tables_job(params, job):
+    with app.app_context():
+        db.create_all()
+    return {'tables': ['test_users']}
+
 # Direct connection test (bypass SQLAlchemy for initial test)
 # Add this at the top of your app_azure_fixed.py
 def check_azure_status():
     """Check Azure connection status with helpful messages"""
     try:
-        import pymssql
-        import socket
-        
         # First check if we can reach the server
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        result = sock.connect_ex(('fseb.database.windows.net', 1433))
-        sock.close()
-        
-        if result != 0:
+        if not azure_driver.probe(AZURE_SERVER, 1433, timeout=5):
             return {
                 'status': 'blocked',
                 'message': 'Firewall is blocking PythonAnywhere',
@@ -105,13 +125,7 @@ def check_azure_status():
             }
         
         # Try to connect
-        conn = pymssql.connect(
-            server='fseb.database.windows.net',
-            database='fseb',
-            user='fseb_admin',
-            password='Welcome1',
-            timeout=5
-        )
+        conn = azure_driver.connect(**PYMSSQL_CONNECTION, timeout=5)
         
         cursor = conn.cursor()
         cursor.execute('SELECT @@VERSION')
@@ -126,7 +140,7 @@ def check_azure_status():
             'version': version[:100]
         }
         
-    except pymssql.OperationalError as e:
+    except azure_driver.OperationalError as e:
         error_msg = str(e)
         if 'Unable to connect' in error_msg:
             return {
@@ -162,7 +176,12 @@ def check_azure_status():
 # Add a status route
 @app.route('/status')
 def status():
-    return jsonify(check_azure_status())
+    # One worker on the node probes Azure per HEALTH_CACHE_SECONDS; copy before adding per-worker fields
+    result = dict(shmcache.get(f'azure:status:{AZURE_SERVER}', check_azure_status,
+                               ttl=lambda r: HEALTH_CACHE_SECONDS if r['status'] == 'connected' else FAILURE_CACHE_SECONDS))
+    # While the circuit is open the result above is the cached diagnosis, not a fresh login
+    result['circuit'] = azure_driver.breaker(server=AZURE_SERVER).snapshot()
+    return jsonify(result)
 
 
 
@@ -172,7 +191,7 @@ def test_direct_connection():
     try:
         print(f"\n🔌 Testing direct connection to {AZURE_SERVER}...")
         
-        conn = pymssql.connect(**PYMSSQL_CONNECTION)
+        conn = azure_driver.connect(**PYMSSQL_CONNECTION)
         cursor = conn.cursor()
         
         # Get SQL Server version
@@ -204,7 +223,7 @@ def test_direct_connection():
             'table_count': len(tables)
         }
         
-    except pymssql.OperationalError as e:
+    except azure_driver.OperationalError as e:
         error_msg = str(e)
         if "Login failed" in error_msg:
             return {
@@ -277,208 +296,7 @@ def test_sqlalchemy_connection():
 
 @app.route('/')
 def home():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Azure SQL - Working!</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                padding: 20px;
-            }
-            .container {
-                max-width: 900px;
-                margin: 0 auto;
-                background: white;
-                border-radius: 20px;
-                padding: 40px;
-                box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            }
-            h1 { 
-                color: #28a745;
-                margin-bottom: 10px;
-                font-size: 32px;
-            }
-            .success-card {
-                background: #d4edda;
-                border: 2px solid #28a745;
-                border-radius: 15px;
-                padding: 25px;
-                margin: 20px 0;
-            }
-            .btn {
-                background: #0078d4;
-                color: white;
-                border: none;
-                padding: 15px 30px;
-                border-radius: 10px;
-                font-size: 16px;
-                margin: 10px;
-                cursor: pointer;
-                transition: all 0.3s;
-            }
-            .btn:hover { background: #005a9e; transform: translateY(-2px); }
-            .btn-success { background: #28a745; }
-            .btn-success:hover { background: #218838; }
-            .mobile-box {
-                background: #28a745;
-                color: white;
-                padding: 20px;
-                border-radius: 15px;
-                margin: 25px 0;
-            }
-            .result-box {
-                background: #f4f4f4;
-                border-radius: 10px;
-                padding: 20px;
-                margin: 20px 0;
-                font-family: monospace;
-                max-height: 400px;
-                overflow-y: auto;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🎉 Azure SQL Connected!</h1>
-            <p style="color: #666; margin-bottom: 20px;">Python 3.14 + Flask + Azure SQL Database</p>
-            
-            <div class="success-card">
-                <h3 style="color: #28a745; margin-top: 0;">✅ CONNECTION VERIFIED</h3>
-                <p>Direct pymssql connection to Azure SQL is working perfectly!</p>
-                <p><strong>Server:</strong> fseb.database.windows.net</p>
-                <p><strong>Database:</strong> Connected successfully</p>
-            </div>
-            
-            <div class="pythonanywhere-box" style="background: #0078d4; color: white; padding: 20px; border-radius: 15px; margin: 25px 0;">
-                <h3 style="margin-top: 0;">🌐 PythonAnywhere Deployment</h3>
-                <p>Your app is configured for PythonAnywhere!</p>
-                <p><strong>Next steps:</strong></p>
-                <ol style="margin-left: 20px; margin-top: 10px;">
-                    <li>Upload files to PythonAnywhere</li>
-                    <li>Set environment variables</li>
-                    <li>Configure web app</li>
-                </ol>
-                <p style="margin-top: 15px; font-size: 14px;">Once deployed, your app will be available at:</p>
-                <code style="background: rgba(255,255,255,0.3); padding: 10px 15px; border-radius: 8px; font-size: 16px; display: block; margin-top: 10px;">
-                    https://[your-username].pythonanywhere.com
-                </code>
-            </div>
-            
-            <div>
-                <h3>🔧 Test Functions</h3>
-                <button class="btn" onclick="testDirect()">Test Direct Connection</button>
-                <button class="btn" onclick="testSQLAlchemy()">Test SQLAlchemy</button>
-                <button class="btn btn-success" onclick="createTables()">Create Tables</button>
-                <button class="btn" onclick="listTables()">List Tables</button>
-                
-                <div id="status" style="margin: 20px 0; padding: 15px; border-radius: 8px;"></div>
-                <div class="result-box" id="result"></div>
-            </div>
-            
-            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
-                <h3>📊 System Info</h3>
-                <p><strong>Python:</strong> 3.14.2</p>
-                <p><strong>Database:</strong> Azure SQL (Microsoft SQL Azure)</p>
-                <p><strong>Driver:</strong> pymssql 2.3.11</p>
-                <p><strong>Local URL:</strong> <a href="http://localhost:5000" target="_blank">localhost:5000</a></p>
-                <p><strong>Mobile URL:</strong> <a href="http://192.168.40.7:5000" target="_blank">192.168.40.7:5000</a></p>
-            </div>
-        </div>
-        
-        <script>
-            function updateStatus(message, type = 'info') {
-                const statusDiv = document.getElementById('status');
-                statusDiv.innerHTML = message;
-                statusDiv.style.background = type === 'success' ? '#d4edda' : 
-                                           type === 'error' ? '#f8d7da' : 
-                                           type === 'warning' ? '#fff3cd' : '#d1ecf1';
-                statusDiv.style.color = type === 'success' ? '#155724' : 
-                                       type === 'error' ? '#721c24' : 
-                                       type === 'warning' ? '#856404' : '#0c5460';
-            }
-            
-            async function testDirect() {
-                updateStatus('Testing direct pymssql connection...', 'info');
-                try {
-                    const response = await fetch('./api/test-direct');
-                    const data = await response.json();
-                    document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                    
-                    if (data.success) {
-                        updateStatus('✅ Direct connection successful!', 'success');
-                    } else {
-                        updateStatus('❌ Direct connection failed', 'error');
-                    }
-                } catch (error) {
-                    document.getElementById('result').innerHTML = 'Error: ' + error;
-                    updateStatus('❌ Test failed', 'error');
-                }
-            }
-            
-            async function testSQLAlchemy() {
-                updateStatus('Testing SQLAlchemy connection...', 'info');
-                try {
-                    const response = await fetch('./api/test-sqlalchemy');
-                    const data = await response.json();
-                    document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                    
-                    if (data.success) {
-                        updateStatus('✅ SQLAlchemy connection successful!', 'success');
-                    } else {
-                        updateStatus('⚠ SQLAlchemy connection issue', 'warning');
-                    }
-                } catch (error) {
-                    document.getElementById('result').innerHTML = 'Error: ' + error;
-                    updateStatus('❌ Test failed', 'error');
-                }
-            }
-            
-            async function createTables() {
-                updateStatus('Creating database tables...', 'info');
-                try {
-                    const response = await fetch('./api/create-tables', { method: 'POST' });
-                    const data = await response.json();
-                    document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                    
-                    if (data.success) {
-                        updateStatus('✅ Tables created successfully!', 'success');
-                    } else {
-                        updateStatus('⚠ ' + data.message, 'warning');
-                    }
-                } catch (error) {
-                    document.getElementById('result').innerHTML = 'Error: ' + error;
-                    updateStatus('❌ Failed to create tables', 'error');
-                }
-            }
-            
-            async function listTables() {
-                updateStatus('Listing database tables...', 'info');
-                try {
-                    const response = await fetch('./api/list-tables');
-                    const data = await response.json();
-                    document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
-                    
-                    if (data.success) {
-                        updateStatus('✅ Retrieved table list', 'success');
-                    }
-                } catch (error) {
-                    document.getElementById('result').innerHTML = 'Error: ' + error;
-                    updateStatus('❌ Failed to list tables', 'error');
-                }
-            }
-            
-            // Auto-test on page load
-            window.onload = testDirect;
-        </script>
-    </body>
-    </html>
-    '''
+    return render_template('azure_home.html')
 
 # API Routes
 
@@ -495,9 +313,14 @@ def deployment_info():
     })
     return jsonify(info)
 
+def shared_direct_connection():
+    """test_direct_connection(), shared: one Azure round trip per HEALTH_CACHE_SECONDS for all workers"""
+    return shmcache.get(f'azure:direct:{AZURE_SERVER}/{AZURE_DATABASE}', test_direct_connection,
+                        ttl=lambda r: HEALTH_CACHE_SECONDS if r['success'] else FAILURE_CACHE_SECONDS)
+
 @app.route('/api/test-direct')
 def api_test_direct():
-    result = test_direct_connection()
+    result = shared_direct_connection()
     return jsonify(result)
 
 @app.route('/api/test-sqlalchemy')
@@ -511,6 +334,8 @@ def api_test_sqlalchemy():
 
 @app.route('/api/create-tables', methods=['POST'])
 def api_create_tables():
+    if jobs.wants_async():
+        return jobs.submit_response(job_store, 'create_tables')
     try:
         with app.app_context():
             db.create_all()
@@ -526,10 +351,27 @@ def api_create_tables():
             'tip': 'Check database permissions'
         }), 500
 
+@app.route('/api/test-users/bulk', methods=['POST'])
+def api_bulk_test_users():
+    # Bulk writes go through the bulk engine (pyodbc + fast_executemany when installed)
+    rows = request.get_json(silent=True) or []
+    if not isinstance(rows, list) or not all(isinstance(r, dict) and r.get('username') for r in rows):
+        return jsonify({'success': False, 'message': 'Expected a JSON list of {username, email}'}), 400
+    try:
+        count = azure_driver.bulk_insert(
+            TestUser.__table__, [{'username': r['username'], 'email': r.get('email')} for r in rows],
+            **PYMSSQL_CONNECTION
+        )
+        return jsonify({'success': True, 'inserted': count, 'driver': azure_driver.driver_for('bulk')})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/list-tables')
 def api_list_tables():
+    if jobs.wants_async():
+        return jobs.submit_response(job_store, 'list_tables')
     try:
-        result = test_direct_connection()
+        result = shared_direct_connection()
         if result['success']:
             return jsonify({
                 'success': True,
@@ -551,7 +393,7 @@ def api_list_tables():
 
 @app.route('/api/health')
 def health():
-    direct_test = test_direct_connection()
+    direct_test = shared_direct_connection()
     sqlalchemy_test = test_sqlalchemy_connection()
     
     return jsonify({
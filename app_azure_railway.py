@@ -5,6 +5,7 @@ from flask import Flask, jsonify, render_template_string
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from sqlalchemy import text
+import azure_driver
 
 print("=" * 70)
 print("🚀 AZURE SQL FLASK APP - RAILWAY DEPLOYMENT")
@@ -34,9 +35,16 @@ print(f"   AZURE_PASSWORD: {'*' * 8 if AZURE_PASSWORD else 'NOT SET - WILL FAIL'
 
 # ========== DATABASE CONFIGURATION ==========
 # SQLAlchemy connection string for Azure SQL
-SQLALCHEMY_DATABASE_URI = f"mssql+pymssql://{AZURE_USERNAME}:{AZURE_PASSWORD}@{AZURE_SERVER}:1433/{AZURE_DATABASE}"
+AZURE_CONNECTION = {
+    'server': AZURE_SERVER,
+    'database': AZURE_DATABASE,
+    'user': AZURE_USERNAME,
+    'password': AZURE_PASSWORD
+}
+SQLALCHEMY_DATABASE_URI = azure_driver.sqlalchemy_uri(**AZURE_CONNECTION)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = azure_driver.engine_options(**AZURE_CONNECTION)
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
@@ -53,13 +61,7 @@ class TestUser(db.Model):
 def test_azure_connection():
     """Test connection to Azure SQL"""
     try:
-        import pymssql
-        conn = pymssql.connect(
-            server=AZURE_SERVER,
-            database=AZURE_DATABASE,
-            user=AZURE_USERNAME,
-            password=AZURE_PASSWORD
-        )
+        conn = azure_driver.connect(**AZURE_CONNECTION)
         
         cursor = conn.cursor()
         cursor.execute('SELECT @@VERSION, DB_NAME()')
@@ -308,13 +310,7 @@ def list_tables():
         return jsonify(test_result)
     
     try:
-        import pymssql
-        conn = pymssql.connect(
-            server=AZURE_SERVER,
-            database=AZURE_DATABASE,
-            user=AZURE_USERNAME,
-            password=AZURE_PASSWORD
-        )
+        conn = azure_driver.connect(**AZURE_CONNECTION)
         
         cursor = conn.cursor()
         cursor.execute("""
@@ -1,6 +1,6 @@
 # app_simple.py - Minimal working Flask app with Azure SQL
 from flask import Flask, jsonify, render_template_string
-import pymssql
+import azure_driver
 import os
 
 app = Flask(__name__)
@@ -16,7 +16,7 @@ AZURE_CONFIG = {
 def test_connection():
     """Test connection to Azure SQL"""
     try:
-        conn = pymssql.connect(**AZURE_CONFIG)
+        conn = azure_driver.connect(**AZURE_CONFIG)
         cursor = conn.cursor()
         cursor.execute('SELECT @@VERSION')
         version = cursor.fetchone()[0]
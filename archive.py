@@ -0,0 +1,244 @@
+# archive.py - Move cold items out of the hot items table
+#
+# An item is cold once it has not been touched for ARCHIVE_RETENTION_DAYS, or
+# sooner (ARCHIVE_TERMINAL_DAYS) when its status is terminal. Cold rows are
+# copied to items_archive and deleted from items in small id-ordered batches,
+# one short transaction each, with a pause in between so interactive writes
+# never queue behind the archiver. Progress is checkpointed per batch in
+# archive_checkpoints: an interrupted run resumes where it stopped, and
+# re-running a batch is harmless because both statements re-check eligibility.
+# Each batch also writes item_sync tombstones in the same transaction, so
+# delta-sync clients drop the rows, and publishes a bulk_deleted live event per
+# owner once it commits (only streams served by this process see it; a CLI
+# run relies on the tombstones). items_archive has its own archive_id key:
+# SQLite can hand a deleted item's id to a new row, which may be archived too.
+#
+#   flask --app app archive-items                 (one full pass)
+#   flask --app app archive-items --dry-run       (count what would move)
+#
+# Reads stay on the hot table unless asked: see items_for_user().
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, literal, or_, select
+
+import tracing
+
+RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '365'))
+TERMINAL_DAYS = int(os.environ.get('ARCHIVE_TERMINAL_DAYS', '30'))
+TERMINAL_STATUSES = tuple(
+    s.strip() for s in os.environ.get('ARCHIVE_TERMINAL_STATUSES', 'done,cancelled,archived').split(',') if s.strip()
+)
+BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+PAUSE_MS = int(os.environ.get('ARCHIVE_PAUSE_MS', '100'))
+
+CHECKPOINT = 'items'
+COLUMNS = ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user_id')
+
+_state = {}
+
+
+def horizon(now=None):
+    """Oldest last-touched time that is guaranteed to still be in the hot table"""
+    now = now or datetime.utcnow()
+    return now - timedelta(days=min(RETENTION_DAYS, TERMINAL_DAYS if TERMINAL_STATUSES else RETENTION_DAYS))
+
+
+def eligible(Item, now=None):
+    """WHERE clause selecting cold items"""
+    now = now or datetime.utcnow()
+    touched = func.coalesce(Item.updated_at, Item.created_at)
+    clause = touched < now - timedelta(days=RETENTION_DAYS)
+    if TERMINAL_STATUSES:
+        clause = or_(clause, and_(Item.status.in_(TERMINAL_STATUSES),
+                                  touched < now - timedelta(days=TERMINAL_DAYS)))
+    return clause
+
+
+# ========== CHECKPOINTS ==========
+def _load_checkpoint(connection):
+    table = _state['checkpoint_table']
+    return connection.execute(select(table.c.last_id).where(table.c.name == CHECKPOINT)).scalar() or 0
+
+
+def _save_checkpoint(connection, last_id):
+    table = _state['checkpoint_table']
+    values = {'last_id': last_id, 'updated_at': datetime.utcnow()}
+    if connection.execute(table.update().where(table.c.name == CHECKPOINT).values(**values)).rowcount == 0:
+        connection.execute(table.insert().values(name=CHECKPOINT, **values))
+
+
+# ========== ARCHIVING ==========
+def archive_batch(connection, Item, last_id, batch_size=BATCH_SIZE, now=None):
+    """Move the next batch of cold items after `last_id`
+
+    Returns (moved, scanned_to_id or None at the end, {user_id: moved})
+    """
+    import item_search
+    import item_sync
+    import rollups
+
+    items = Item.__table__
+    archive_table = _state['archive_table']
+    now = now or datetime.utcnow()
+    cold = eligible(Item, now)
+
+    ids = connection.execute(
+        select(items.c.id).where(items.c.id > last_id, cold).order_by(items.c.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return 0, None, {}
+
+    in_batch = and_(items.c.id.in_(ids), cold)
+    connection.execute(archive_table.insert().from_select(
+        COLUMNS + ('archived_at',),
+        select(*[items.c[name] for name in COLUMNS], literal(now)).where(in_batch),
+    ))
+    by_user = dict(connection.execute(
+        select(items.c.user_id, func.count()).where(in_batch).group_by(items.c.user_id)
+    ).all())
+    rollups.record_change(connection, Item, in_batch, -1)
+    item_sync.record_deletions_where(connection, Item, in_batch, deleted_at=now)
+    moved = connection.execute(items.delete().where(in_batch)).rowcount
+    # FTS5 triggers clean up on SQLite; the portable index needs an explicit pass
+    if item_search.backend(connection) == 'terms':
+        item_search.unindex_items(connection, ids)
+    _save_checkpoint(connection, ids[-1])
+    return moved, ids[-1], by_user
+
+
+def run(engine, Item, batch_size=BATCH_SIZE, pause_ms=PAUSE_MS, max_seconds=None, progress=None):
+    """Archive until no cold rows remain (or max_seconds runs out); returns stats"""
+    started = time.monotonic()
+    moved_total, batches = 0, 0
+    with engine.connect() as connection:
+        last_id = _load_checkpoint(connection)
+    resumed_from = last_id
+
+    while True:
+        with engine.begin() as connection:
+            moved, next_id, by_user = archive_batch(connection, Item, last_id, batch_size)
+        _publish(by_user)
+        if next_id is None:
+            # Full pass done: the next run starts over, as rows keep aging
+            with engine.begin() as connection:
+                _save_checkpoint(connection, 0)
+            finished = True
+            break
+        moved_total += moved
+        batches += 1
+        last_id = next_id
+        if progress:
+            progress(moved_total, last_id)
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            finished = False
+            break
+        time.sleep(pause_ms / 1000.0)
+
+    return {
+        'moved': moved_total,
+        'batches': batches,
+        'resumed_from_id': resumed_from,
+        'last_id': last_id,
+        'finished': finished,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def _publish(by_user):
+    import live_events
+
+    for user_id, count in by_user.items():
+        live_events.hub.publish('item', {'op': 'bulk_deleted', 'count': count, 'archived': True}, user_id=user_id)
+
+
+def pending(session, Item):
+    """How many hot rows are cold right now"""
+    return session.query(func.count(Item.id)).filter(eligible(Item)).scalar()
+
+
+# ========== READS ==========
+def items_for_user(session, Item, user_id, include_archived=False, created_from=None, created_to=None):
+    """Item dicts for one user; the archive is read only if asked for, or if the range reaches past horizon()"""
+    ArchivedItem = _state['archive_model']
+    query = session.query(Item).filter(Item.user_id == user_id)
+    if created_from:
+        query = query.filter(Item.created_at >= created_from)
+    if created_to:
+        query = query.filter(Item.created_at < created_to)
+    rows = query.all()
+    with tracing.span('to_dict', rows=len(rows)):
+        results = [item.to_dict() for item in rows]
+
+    if include_archived or (created_from is not None and created_from < horizon()):
+        archived = session.query(ArchivedItem).filter(ArchivedItem.user_id == user_id)
+        if created_from:
+            archived = archived.filter(ArchivedItem.created_at >= created_from)
+        if created_to:
+            archived = archived.filter(ArchivedItem.created_at < created_to)
+        results.extend(item.to_dict() for item in archived.order_by(ArchivedItem.created_at))
+    return results
+
+
+# ========== WIRING ==========
+def init_app(app, db, Item):
+    """Declare items_archive + archive_checkpoints and add `flask archive-items`"""
+    import click
+
+    class ArchivedItem(db.Model):
+        __tablename__ = 'items_archive'
+        __table_args__ = (
+            db.Index('ix_items_archive_user_created', 'user_id', 'created_at'),
+            db.Index('ix_items_archive_id', 'id'),
+        )
+        # Not the item id: that can repeat once a reused id is archived again
+        archive_id = db.Column(db.Integer, primary_key=True)
+        id = db.Column(db.Integer, nullable=False)
+        title = db.Column(db.String(200), nullable=False)
+        description = db.Column(db.Text)
+        status = db.Column(db.String(50))
+        created_at = db.Column(db.DateTime)
+        updated_at = db.Column(db.DateTime)
+        user_id = db.Column(db.Integer)
+        archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+        def to_dict(self):
+            return {
+                'id': self.id,
+                'title': self.title,
+                'description': self.description,
+                'status': self.status,
+                'user_id': self.user_id,
+                'created_at': self.created_at.isoformat() if self.created_at else None,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+                'archived': True,
+                'archived_at': self.archived_at.isoformat()
+            }
+
+    checkpoint_table = db.Table(
+        'archive_checkpoints',
+        db.Column('name', db.String(50), primary_key=True),
+        db.Column('last_id', db.Integer, nullable=False),
+        db.Column('updated_at', db.DateTime),
+    )
+    _state.update(archive_model=ArchivedItem, archive_table=ArchivedItem.__table__,
+                  checkpoint_table=checkpoint_table)
+
+    @app.cli.command('archive-items')
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+    @click.option('--pause-ms', default=PAUSE_MS, show_default=True, help='Sleep between batches')
+    @click.option('--max-seconds', type=float, help='Stop (resumably) after this long')
+    @click.option('--dry-run', is_flag=True, help='Only count cold items')
+    def archive_items(batch_size, pause_ms, max_seconds, dry_run):
+        """Move cold items into items_archive"""
+        db.create_all()
+        if dry_run:
+            print(f"{pending(db.session, Item)} items would be archived")
+            return
+        stats = run(db.engine, Item, batch_size=batch_size, pause_ms=pause_ms, max_seconds=max_seconds,
+                    progress=lambda moved, last_id: print(f'  {moved} moved (id <= {last_id})'))
+        state = 'done' if stats['finished'] else f"paused, resumes after id {stats['last_id']}"
+        print(f"✓ Archived {stats['moved']} items in {stats['batches']} batches, {stats['seconds']}s ({state})")
+
+    return ArchivedItem
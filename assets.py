@@ -0,0 +1,90 @@
+# assets.py - Fingerprinted static bundles and the Jinja bytecode cache
+#
+# Templates link bundles with {{ asset_url('home.css') }}, which resolves to
+# /static/dist/home.<hash>.css through the manifest written by
+# build_assets.py. Those URLs change whenever the content does, so they are
+# served with "Cache-Control: public, max-age=31536000, immutable" (and the
+# pre-compressed .gz when the client accepts gzip): a returning browser makes
+# no request for them at all.
+#
+# ASSETS_AUTO_BUILD=1 (default) rebuilds at startup when the manifest is
+# missing or older than assets/; set it to 0 where the deploy step runs
+# `python build_assets.py` and the code directory is read-only.
+#
+# Compiled templates are kept in JINJA_CACHE_DIR (default
+# instance/jinja_cache), so a new worker loads bytecode instead of parsing
+# and compiling each template again; Jinja still checks the source mtime and
+# recompiles edited templates.
+import json
+import os
+
+from flask import abort, request, send_file
+from jinja2 import FileSystemBytecodeCache
+
+import build_assets
+
+ASSETS_AUTO_BUILD = os.environ.get('ASSETS_AUTO_BUILD', '1') == '1'
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join('instance', 'jinja_cache'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_state = {'manifest': {}}
+
+
+def load_manifest():
+    if ASSETS_AUTO_BUILD and build_assets.is_stale():
+        try:
+            build_assets.build(verbose=False)
+            print('✓ Static bundles rebuilt')
+        except OSError as e:
+            print(f'⚠ Could not build static bundles: {e}')
+    try:
+        with open(build_assets.MANIFEST) as f:
+            _state['manifest'] = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'⚠ No asset manifest ({e}); run python build_assets.py')
+        _state['manifest'] = {}
+    return _state['manifest']
+
+
+def asset_url(name):
+    filename = _state['manifest'].get(name)
+    if filename is None:
+        raise KeyError(f'Unknown asset bundle: {name}')
+    return f'/static/dist/{filename}'
+
+
+def serve(filename):
+    if filename not in _state['manifest'].values():
+        abort(404)
+    path = os.path.join(build_assets.DIST_DIR, filename)
+    gz = path + '.gz'
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if accepts_gzip and os.path.exists(gz):
+        response = send_file(gz, mimetype=_mimetype(filename), conditional=True, etag=False)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_file(path, conditional=True, etag=False)
+    # The name is the content hash: no revalidation needed
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _mimetype(filename):
+    return 'text/css' if filename.endswith('.css') else 'text/javascript'
+
+
+def init_app(app):
+    load_manifest()
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    cache_dir = JINJA_CACHE_DIR if os.path.isabs(JINJA_CACHE_DIR) else os.path.join(app.root_path, JINJA_CACHE_DIR)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    except OSError as e:
+        print(f'⚠ Jinja bytecode cache disabled: {e}')
+
+    # More specific than Flask's /static/<path:filename>, so it wins the match
+    app.add_url_rule('/static/dist/<filename>', 'dist_asset', serve)
+    print(f"✓ Assets: {len(_state['manifest'])} bundles, Jinja bytecode cache in {cache_dir}")
@@ -0,0 +1,73 @@
+// azure.js - app_azure_fixed.py landing page: connection tests
+async function testDirect() {
+    updateStatus('Testing direct pymssql connection...', 'info');
+    try {
+        const response = await fetch('./api/test-direct');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+
+        if (data.success) {
+            updateStatus('✅ Direct connection successful!', 'success');
+        } else {
+            updateStatus('❌ Direct connection failed', 'error');
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Test failed', 'error');
+    }
+}
+
+async function testSQLAlchemy() {
+    updateStatus('Testing SQLAlchemy connection...', 'info');
+    try {
+        const response = await fetch('./api/test-sqlalchemy');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+
+        if (data.success) {
+            updateStatus('✅ SQLAlchemy connection successful!', 'success');
+        } else {
+            updateStatus('⚠ SQLAlchemy connection issue', 'warning');
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Test failed', 'error');
+    }
+}
+
+async function createTables() {
+    updateStatus('Creating database tables...', 'info');
+    try {
+        const response = await fetch('./api/create-tables', { method: 'POST' });
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+
+        if (data.success) {
+            updateStatus('✅ Tables created successfully!', 'success');
+        } else {
+            updateStatus('⚠ ' + data.message, 'warning');
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Failed to create tables', 'error');
+    }
+}
+
+async function listTables() {
+    updateStatus('Listing database tables...', 'info');
+    try {
+        const response = await fetch('./api/list-tables');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+
+        if (data.success) {
+            updateStatus('✅ Retrieved table list', 'success');
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Failed to list tables', 'error');
+    }
+}
+
+// Auto-test on page load
+window.onload = testDirect;
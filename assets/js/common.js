@@ -0,0 +1,11 @@
+// common.js - Helpers shared by the landing pages
+function updateStatus(message, type = 'info') {
+    const statusDiv = document.getElementById('status');
+    statusDiv.innerHTML = message;
+    statusDiv.style.background = type === 'success' ? '#d4edda' : 
+                               type === 'error' ? '#f8d7da' : 
+                               type === 'warning' ? '#fff3cd' : '#d1ecf1';
+    statusDiv.style.color = type === 'success' ? '#155724' : 
+                           type === 'error' ? '#721c24' : 
+                           type === 'warning' ? '#856404' : '#0c5460';
+}
@@ -0,0 +1,66 @@
+// dashboard.js - item list kept current from /api/events
+const items = new Map();
+
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function render() {
+    document.getElementById('items').innerHTML = Array.from(items.values())
+        .map(item => `<div class="item"><strong>${escapeHtml(item.title)}</strong> - ${escapeHtml(item.description)}</div>`)
+        .join('');
+}
+
+async function loadItems() {
+    const response = await fetch('/api/items');
+    const list = await response.json();
+    items.clear();
+    list.forEach(item => items.set(item.id, item));
+    render();
+}
+
+async function logout() {
+    await fetch('/api/auth/logout', { method: 'POST' });
+    window.location.href = '/';
+}
+
+// One initial load, then the server pushes changes instead of us polling
+function subscribe() {
+    const events = new EventSource('/api/events');
+    events.addEventListener('item', function(e) {
+        const change = JSON.parse(e.data);
+        if (change.op === 'bulk_updated' || change.op === 'bulk_deleted') {
+            // Bulk changes only carry a count: reload the list once
+            loadItems();
+            return;
+        }
+        if (change.op === 'deleted') {
+            items.delete(change.id);
+        } else {
+            items.set(change.item.id, change.item);
+        }
+        render();
+    });
+    events.addEventListener('health', function(e) {
+        const data = JSON.parse(e.data);
+        document.getElementById('live').textContent = 'Live - database ' + data.database;
+    });
+    events.addEventListener('resync', loadItems);
+    events.onopen = function() {
+        document.getElementById('live').textContent = 'Live updates connected';
+    };
+    events.onerror = function() {
+        document.getElementById('live').textContent = 'Live updates reconnecting...';
+        // The browser gives up after a non-200 (503: worker at its stream cap)
+        if (events.readyState === EventSource.CLOSED) {
+            setTimeout(subscribe, 30000);
+        }
+    };
+}
+
+window.onload = function() {
+    loadItems();
+    subscribe();
+};
@@ -0,0 +1,51 @@
+// home.js - app.py landing page: API self-tests and polled health
+async function testHealth() {
+    document.getElementById('status').innerHTML = 'Testing health...';
+    try {
+        const response = await fetch('/api/health');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+        document.getElementById('status').innerHTML = '✓ Health check successful';
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        document.getElementById('status').innerHTML = '✗ Health check failed';
+    }
+}
+
+async function testDB() {
+    document.getElementById('status').innerHTML = 'Testing database...';
+    try {
+        const response = await fetch('/api/test-db');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+        if (data.status === 'success') {
+            document.getElementById('status').innerHTML = '✓ Database connected';
+        } else {
+            document.getElementById('status').innerHTML = '✗ Database error';
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        document.getElementById('status').innerHTML = '✗ Database test failed';
+    }
+}
+
+// Auto-test on load, then poll the (server-cached) health check; an open
+// /api/events stream per landing tab would take a slot dashboards need
+const HEALTH_POLL_MS = 30000;
+
+async function pollHealth() {
+    try {
+        const response = await fetch('/api/health');
+        const data = await response.json();
+        document.getElementById('status').innerHTML = data.database === 'connected'
+            ? '✓ Database connected'
+            : '✗ Database disconnected';
+    } catch (error) {
+        document.getElementById('status').innerHTML = '✗ Health check failed';
+    }
+}
+
+window.onload = function() {
+    testHealth();
+    setInterval(pollHealth, HEALTH_POLL_MS);
+};
@@ -0,0 +1,49 @@
+// simple.js - app_simple.py landing page: health, database and visit tests
+// Show current URL
+document.getElementById('current-url').textContent = window.location.href;
+
+async function testHealth() {
+    updateStatus('Testing health...');
+    try {
+        const response = await fetch('/api/health');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+        updateStatus('✅ Health check successful', 'success');
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Health check failed', 'error');
+    }
+}
+
+async function testDB() {
+    updateStatus('Testing database...');
+    try {
+        const response = await fetch('/api/test-db');
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+        if (data.success) {
+            updateStatus('✅ Database connected', 'success');
+        } else {
+            updateStatus('⚠ Database issue', 'error');
+        }
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Database test failed', 'error');
+    }
+}
+
+async function recordVisit() {
+    updateStatus('Recording visit...');
+    try {
+        const response = await fetch('/api/visit', { method: 'POST' });
+        const data = await response.json();
+        document.getElementById('result').innerHTML = JSON.stringify(data, null, 2);
+        updateStatus('✅ Visit recorded: ' + data.count + ' total visits', 'success');
+    } catch (error) {
+        document.getElementById('result').innerHTML = 'Error: ' + error;
+        updateStatus('❌ Failed to record visit', 'error');
+    }
+}
+
+// Auto-test on load
+window.onload = testHealth;
@@ -0,0 +1,216 @@
+# azure_driver.py - Pluggable driver shim for every Azure SQL connection
+#
+# All Azure-facing modules call azure_driver.connect() instead of
+# pymssql.connect(). AZURE_DRIVER selects the backend:
+#
+#   AZURE_DRIVER=pymssql   (default) the real server, fseb.database.windows.net
+#   AZURE_DRIVER=pyodbc    the real server through ODBC_DRIVER (ODBC Driver 17)
+#   AZURE_DRIVER=standin   local SQLite stand-in with injected latency/failures
+#                          (see sql_standin.py for the STANDIN_* knobs)
+#
+# Workloads can use a different driver than the rest of the app:
+# engine_for('bulk') runs over AZURE_BULK_DRIVER (pyodbc when installed), whose
+# fast_executemany sends a whole parameter array per round trip, while
+# pymssql executes executemany() one row at a time.
+#
+# Every connect() and probe() passes through a per-server circuit breaker
+# (circuit.py): while Azure is unreachable callers get CircuitOpenError at
+# once, with the cached diagnosis, instead of waiting out the driver timeout.
+import os
+import socket
+
+import circuit
+
+AZURE_DRIVER = os.environ.get('AZURE_DRIVER', 'pymssql')
+ODBC_DRIVER = os.environ.get('ODBC_DRIVER', 'ODBC Driver 17 for SQL Server')
+DRIVERS = ('pymssql', 'pyodbc', 'standin')
+
+AZURE_CONNECTION = {
+    'server': os.environ.get('AZURE_SERVER', 'fseb.database.windows.net'),
+    'database': os.environ.get('AZURE_DATABASE', 'fseb'),
+    'user': os.environ.get('AZURE_USERNAME', 'fseb_admin'),
+    'password': os.environ.get('AZURE_PASSWORD', 'Welcome1'),
+}
+
+
+class OperationalError(Exception):
+    """Connection-level failure, whichever driver raised it"""
+
+
+class CircuitOpenError(OperationalError):
+    """Raised without trying while the server's circuit is open"""
+
+    def __init__(self, breaker):
+        self.diagnosis = breaker.diagnosis
+        self.retry_after = breaker.retry_after()
+        # Keep the driver's wording: callers classify errors by message
+        super().__init__(f'{breaker.last_error} [circuit open ({breaker.diagnosis}), '
+                         f'retry in {self.retry_after:.0f}s]')
+
+
+def get_driver(name=None):
+    """Return the DB-API module for a driver name"""
+    name = name or AZURE_DRIVER
+    if name == 'pymssql':
+        import pymssql
+        return pymssql
+    if name == 'pyodbc':
+        import pyodbc
+        return pyodbc
+    if name == 'standin':
+        import sql_standin
+        return sql_standin
+    raise ValueError(f'Unknown AZURE_DRIVER: {name}')
+
+
+def is_standin(name=None):
+    return (name or AZURE_DRIVER) == 'standin'
+
+
+def is_available(name):
+    try:
+        get_driver(name)
+        return True
+    except ImportError:
+        return False
+
+
+def paramstyle(driver=None):
+    """Placeholder for raw DB-API SQL: '%s' or '?'"""
+    return '?' if (driver or AZURE_DRIVER) == 'pyodbc' else '%s'
+
+
+def odbc_connection_string(params):
+    return (f"Driver={{{ODBC_DRIVER}}};Server=tcp:{params['server']},1433;Database={params['database']};"
+            f"Uid={params['user']};Pwd={params['password']};Encrypt=yes;TrustServerCertificate=no;")
+
+
+def _open(name, module, params):
+    if name != 'pyodbc':
+        return module.connect(**params)
+    # pyodbc takes a connection string; map the pymssql-style timeouts
+    conn = module.connect(odbc_connection_string(params),
+                          timeout=int(params.get('login_timeout') or params.get('timeout') or 30))
+    if params.get('timeout'):
+        conn.timeout = int(params['timeout'])
+    return conn
+
+
+def breaker(driver=None, server=None):
+    return circuit.breaker_for(driver or AZURE_DRIVER, server or AZURE_CONNECTION['server'])
+
+
+def connect(driver=None, **overrides):
+    """Open a DB-API connection; keyword arguments override AZURE_CONNECTION"""
+    name = driver or AZURE_DRIVER
+    module = get_driver(name)
+    params = dict(AZURE_CONNECTION, **overrides)
+    if not circuit.CIRCUIT_ENABLED:
+        try:
+            return _open(name, module, params)
+        except module.Error as e:
+            raise OperationalError(str(e)) from e
+
+    state = breaker(name, params['server'])
+    if not state.allow():
+        raise CircuitOpenError(state)
+    try:
+        conn = _open(name, module, params)
+    except Exception as e:
+        # Anything escaping here must settle a half-open trial
+        state.record_failure(e)
+        if isinstance(e, module.Error):
+            raise OperationalError(str(e)) from e
+        raise
+    state.record_success()
+    return conn
+
+
+def probe(server=None, port=1433, timeout=5):
+    """TCP reachability check; always true for the stand-in, false at once while the circuit is open on firewall"""
+    if is_standin():
+        return True
+    state = breaker(server=server)
+    trial = False
+    if circuit.CIRCUIT_ENABLED and state.state != circuit.CLOSED and state.diagnosis == 'firewall':
+        if not state.allow():
+            return False
+        trial = True
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        reachable = sock.connect_ex((server or AZURE_CONNECTION['server'], port)) == 0
+    except OSError:  # DNS failure
+        reachable = False
+    finally:
+        sock.close()
+    if circuit.CIRCUIT_ENABLED:
+        if not reachable:
+            state.record_failure(f'Unable to connect: {server or AZURE_CONNECTION["server"]}:{port} unreachable')
+        elif trial:
+            state.record_success()
+    return reachable
+
+
+def sqlalchemy_uri(driver=None, **overrides):
+    """SQLAlchemy URI for the selected driver"""
+    driver = driver or AZURE_DRIVER
+    params = dict(AZURE_CONNECTION, **overrides)
+    if is_standin(driver):
+        # The engine gets its connections from engine_options()['creator']
+        return 'sqlite://'
+    dialect = 'mssql+pyodbc' if driver == 'pyodbc' else 'mssql+pymssql'
+    return (f"{dialect}://{params['user']}:{params['password']}"
+            f"@{params['server']}:1433/{params['database']}")
+
+
+def engine_options(driver=None, **overrides):
+    """Extra SQLALCHEMY_ENGINE_OPTIONS for the selected driver"""
+    driver = driver or AZURE_DRIVER
+    params = dict(AZURE_CONNECTION, **overrides)
+    if is_standin(driver):
+        import sql_standin
+        from sqlalchemy.pool import QueuePool
+        return {
+            'creator': lambda: sql_standin.connect(pyformat=False, **params),
+            'poolclass': QueuePool,
+        }
+    # Pool connects go through connect() too, so they share the circuit breaker
+    options = {'creator': lambda: connect(driver, **params)}
+    if driver == 'pyodbc':
+        options['fast_executemany'] = True
+    return options
+
+
+# ========== PER-WORKLOAD ENGINES ==========
+WORKLOAD_DRIVERS = {
+    'default': AZURE_DRIVER,
+    # The stand-in replaces every real driver, bulk included
+    'bulk': AZURE_DRIVER if is_standin() else os.environ.get(
+        'AZURE_BULK_DRIVER', 'pyodbc' if is_available('pyodbc') else AZURE_DRIVER),
+}
+
+_engines = {}
+
+
+def driver_for(workload):
+    return WORKLOAD_DRIVERS.get(workload, AZURE_DRIVER)
+
+
+def engine_for(workload='default', **overrides):
+    """Shared SQLAlchemy engine for a workload (the same models work on any of them)"""
+    driver = driver_for(workload)
+    key = (driver, tuple(sorted(overrides.items())))
+    if key not in _engines:
+        from sqlalchemy import create_engine
+        _engines[key] = create_engine(sqlalchemy_uri(driver, **overrides), **engine_options(driver, **overrides))
+    return _engines[key]
+
+
+def bulk_insert(table, rows, **overrides):
+    """INSERT many rows into a SQLAlchemy Table on the bulk engine; returns the row count"""
+    if not rows:
+        return 0
+    with engine_for('bulk', **overrides).begin() as conn:
+        conn.execute(table.insert(), rows)
+    return len(rows)
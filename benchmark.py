@@ -0,0 +1,618 @@
+# benchmark.py - Load test every route against a local database
+#
+# Usage:
+#   python benchmark.py routes --users 50 --items 5000 --concurrency 8 --requests 200
+#   python benchmark.py routes --out bench.json
+#   python benchmark.py routes --baseline bench.json --threshold 0.20
+#   python benchmark.py search --items 1000000
+#   python benchmark.py serving --presets sync,gthread,async
+#   python benchmark.py drivers --rows 50000     (needs Azure for pymssql/pyodbc)
+#
+# The app is served from a background thread on localhost against a fresh
+# SQLite file, and the proxy talks to the same file through the Azure SQL
+# stand-in (AZURE_DRIVER=standin), so nothing here ever touches Azure. A
+# --database-url must point at an empty database; --reset-database drops the
+# app's tables there first. The --*-latency-ms / --failure-rate / --max-qps
+# flags are passed through to the stand-in to model a remote server. Results
+# are printed (and optionally written) as JSON; with --baseline the run exits non-zero when a
+# route's p50/p99 latency grew, or its throughput fell, by more than the
+# threshold.
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from datagen import DEFAULT_PASSWORD
+
+
+# ========== LOCAL SERVER ==========
+class LocalServer:
+    """Serve a WSGI app on 127.0.0.1 from a daemon thread"""
+
+    def __init__(self, wsgi_app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def load_app(database_url):
+    """Import app.py against the given database (must run before any other import of app)"""
+    os.environ['DATABASE_URL'] = database_url
+    import app as app_module
+    return app_module
+
+
+def seed_database(app_module, users, items, seed=42, reset=False):
+    """Fresh tables filled by datagen (skewed owners, status mix, spread dates).
+    Raises RuntimeError if the database already has tables and reset is False."""
+    import datagen
+    from sqlalchemy import inspect
+    app, db = app_module.app, app_module.db
+
+    with app.app_context():
+        existing = inspect(db.engine).get_table_names()
+        if existing and not reset:
+            raise RuntimeError(f"{db.engine.url.render_as_string(hide_password=True)} already has tables "
+                               f"({', '.join(sorted(existing))}): pass --reset-database to drop them")
+        if existing:
+            db.drop_all()
+        db.create_all()
+        return datagen.generate(db.engine, users, items, seed=seed, Item=app_module.Item)
+
+
+# ========== HTTP CLIENT ==========
+class Client:
+    """Minimal cookie-aware JSON client (one per worker thread)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        for key, value in (headers or {}).items():
+            req.add_header(key, value)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def login(self, username):
+        return self.request('POST', '/api/auth/login', {'username': username, 'password': DEFAULT_PASSWORD})
+
+
+# ========== SCENARIOS ==========
+def build_scenarios(app_url, proxy_url, users):
+    """Map route name -> (base_url, needs_login, request factory)"""
+    scenarios = {
+        'POST /api/auth/login': (app_url, False, lambda i: (
+            'POST', '/api/auth/login', {'username': f'user{1 + i % users}', 'password': DEFAULT_PASSWORD})),
+        'GET /api/items': (app_url, True, lambda i: ('GET', '/api/items', None)),
+        'POST /api/items': (app_url, True, lambda i: (
+            'POST', '/api/items', {'title': f'Bench {i}', 'description': 'created by benchmark'})),
+        'GET /api/test-db': (app_url, False, lambda i: ('GET', '/api/test-db', None)),
+        'GET /api/health': (app_url, False, lambda i: ('GET', '/api/health', None)),
+    }
+    if proxy_url:
+        scenarios['POST /api/query'] = (proxy_url, False, lambda i: (
+            'POST', '/api/query', {'sql': 'SELECT id, title FROM items WHERE id <= 50'}))
+    return scenarios
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(base_url, needs_login, factory, concurrency, total, users):
+    """Fire `total` requests from `concurrency` threads and collect latencies"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(worker_id):
+        nonlocal errors
+        client = Client(base_url)
+        if needs_login:
+            client.login(f'user{1 + worker_id % users}')
+        local, local_errors = [], 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            method, path, body = factory(i)
+            start = time.perf_counter()
+            status = client.request(method, path, body)
+            local.append((time.perf_counter() - start) * 1000.0)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p90_ms': round(percentile(latencies, 90), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+    }
+
+
+def configure_limits(args):
+    """Rate limiting would turn a load test into a 429 test unless asked for"""
+    if not args.rate_limit:
+        os.environ['RATELIMIT_ENABLED'] = '0'
+    os.environ.setdefault('RATELIMIT_STATE', os.path.join(tempfile.mkdtemp(prefix='fseb-rl-'), 'ratelimit.bin'))
+
+
+def configure_standin(args, workdir):
+    """Point the Azure driver shim at the bench database via the stand-in"""
+    os.environ['AZURE_DRIVER'] = 'standin'
+    os.environ['STANDIN_DIR'] = workdir
+    knobs = {
+        'STANDIN_CONNECT_LATENCY_MS': args.connect_latency_ms,
+        'STANDIN_QUERY_LATENCY_MS': args.query_latency_ms,
+        'STANDIN_JITTER_MS': args.jitter_ms,
+        'STANDIN_FAILURE_RATE': args.failure_rate,
+        'STANDIN_MAX_QPS': args.max_qps,
+    }
+    for name, value in knobs.items():
+        os.environ[name] = str(value)
+    return {name.lower().replace('standin_', ''): value for name, value in knobs.items()}
+
+
+def load_proxy_app():
+    """Import proxi_api.py if its driver is available, else return (None, reason)"""
+    try:
+        import proxi_api
+        return proxi_api.app, None
+    except ImportError as e:
+        return None, f'proxy skipped: {e}'
+
+
+# ========== REPORTING ==========
+# Everything except the final report goes to stderr (see __main__)
+REPORT_STREAM = sys.stdout
+
+
+def emit_report(report, out=None):
+    output = json.dumps(report, indent=2)
+    if out:
+        with open(out, 'w') as f:
+            f.write(output)
+    print(output, file=REPORT_STREAM)
+
+
+# ========== BASELINE COMPARISON ==========
+def compare_to_baseline(current, baseline, threshold):
+    """Return a list of human-readable regressions (empty list = pass)"""
+    regressions = []
+    for route, stats in current['routes'].items():
+        old = baseline.get('routes', {}).get(route)
+        if not old or 'skipped' in stats or 'skipped' in old:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if old.get(metric) and stats.get(metric) and stats[metric] > old[metric] * (1 + threshold):
+                regressions.append(f'{route}: {metric} {old[metric]} -> {stats[metric]}')
+        if old.get('rps') and stats.get('rps') and stats['rps'] < old['rps'] * (1 - threshold):
+            regressions.append(f'{route}: rps {old["rps"]} -> {stats["rps"]}')
+        if stats['errors'] > old.get('errors', 0):
+            regressions.append(f'{route}: errors {old.get("errors", 0)} -> {stats["errors"]}')
+    return regressions
+
+
+# ========== COMMANDS ==========
+def cmd_routes(args):
+    workdir = tempfile.mkdtemp(prefix='fseb-bench-')
+    # Named after AZURE_DATABASE so the stand-in serves the proxy from the same file
+    database_url = args.database_url or f'sqlite:///{os.path.join(workdir, "fseb.db")}'
+    standin = configure_standin(args, workdir)
+    configure_limits(args)
+
+    app_module = load_app(database_url)
+    print(f'Seeding {args.users} users x {args.items} items into {database_url}', file=sys.stderr)
+    try:
+        seed_database(app_module, args.users, args.items, reset=args.reset_database)
+    except RuntimeError as e:
+        print(f'❌ {e}', file=sys.stderr)
+        return 1
+
+    proxy_app, proxy_note = load_proxy_app()
+    routes = [r.strip() for r in args.routes.split(',')] if args.routes else None
+
+    report = {
+        'config': {
+            'users': args.users,
+            'items': args.items,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'database': database_url.split('://')[0],
+            'python': sys.version.split()[0],
+            'standin': standin,
+            'rate_limit': args.rate_limit,
+        },
+        'routes': {},
+    }
+
+    with LocalServer(app_module.app) as app_server:
+        proxy_server = LocalServer(proxy_app) if proxy_app else None
+        if proxy_server:
+            proxy_server.__enter__()
+        try:
+            scenarios = build_scenarios(app_server.url, proxy_server.url if proxy_server else None, args.users)
+            if proxy_note:
+                report['routes']['POST /api/query'] = {'skipped': proxy_note}
+            for name, (base_url, needs_login, factory) in scenarios.items():
+                if routes and name not in routes:
+                    continue
+                print(f'  {name} ...', file=sys.stderr)
+                report['routes'][name] = run_scenario(
+                    base_url, needs_login, factory, args.concurrency, args.requests, args.users
+                )
+        finally:
+            if proxy_server:
+                proxy_server.__exit__(None, None, None)
+
+    emit_report(report, args.out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print('\n❌ REGRESSIONS (threshold {:.0%}):'.format(args.threshold), file=sys.stderr)
+            for line in regressions:
+                print(f'   {line}', file=sys.stderr)
+            return 1
+        print('\n✅ No regressions against baseline', file=sys.stderr)
+    return 0
+
+
+# ========== SEARCH ==========
+def time_calls(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return {
+        'repeats': repeats,
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def cmd_search(args):
+    workdir = tempfile.mkdtemp(prefix='fseb-bench-')
+    database_url = args.database_url or f'sqlite:///{os.path.join(workdir, "fseb.db")}'
+    app_module = load_app(database_url)
+    import item_search
+
+    print(f'Seeding {args.items} searchable items into {database_url}', file=sys.stderr)
+    started = time.perf_counter()
+    try:
+        stats = seed_database(app_module, args.users, args.items, seed=args.seed, reset=args.reset_database)
+    except RuntimeError as e:
+        print(f'❌ {e}', file=sys.stderr)
+        return 1
+    vocabulary = stats['vocabulary']
+    load_seconds = time.perf_counter() - started
+
+    queries = {
+        'common_term': vocabulary[0],
+        'mid_term': vocabulary[500],
+        'rare_term': vocabulary[15000],
+        'two_terms': f'{vocabulary[3]} {vocabulary[40]}',
+        'prefix': vocabulary[10][:3],
+    }
+    app, db, Item = app_module.app, app_module.db, app_module.Item
+    report = {
+        'config': {
+            'items': args.items,
+            'users': args.users,
+            'database': database_url.split('://')[0],
+            'load_seconds': round(load_seconds, 2),
+        },
+        'queries': {},
+    }
+    with app.app_context():
+        report['config']['backend'] = item_search.backend(db.session.connection())
+        # Search as the heaviest user: the Zipf owner curve makes that the worst case
+        user_id = db.session.execute(
+            db.select(Item.user_id).group_by(Item.user_id).order_by(db.func.count().desc()).limit(1)
+        ).scalar()
+        report['config']['user_items'] = Item.query.filter_by(user_id=user_id).count()
+        for name, query in queries.items():
+            for page in (1, 5):
+                report['queries'][f'{name} page {page}'] = dict(
+                    time_calls(lambda: item_search.search(db.session, Item, query, user_id=user_id, page=page),
+                               args.repeats),
+                    query=query,
+                )
+        # What clients do today: pull everything and filter (here: a LIKE scan)
+        report['queries']['like_scan (no index)'] = dict(
+            time_calls(lambda: Item.query.filter(Item.user_id == user_id, Item.title.like(f'%{queries["mid_term"]}%'))
+                       .limit(20).all(), max(1, args.repeats // 10)),
+            query=queries['mid_term'],
+        )
+
+    emit_report(report, args.out)
+    return 0
+
+
+# ========== DRIVERS ==========
+def bench_driver(driver, rows, batch):
+    """Insert then fetch `rows` rows through one DB-API driver; returns rows/second for each"""
+    import azure_driver
+    from datetime import datetime
+    mark = azure_driver.paramstyle(driver)
+    conn = azure_driver.connect(driver, login_timeout=15)
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.execute('DROP TABLE bench_driver_rows')
+        except Exception:
+            conn.rollback()
+        cursor.execute('CREATE TABLE bench_driver_rows (id INT PRIMARY KEY, title NVARCHAR(200), '
+                       'amount INT, created_at DATETIME)')
+        conn.commit()
+        if driver == 'pyodbc':
+            cursor.fast_executemany = True
+
+        now = datetime(2026, 1, 1)
+        data = [(i, f'Driver benchmark row {i}', i % 997, now) for i in range(rows)]
+        sql = f'INSERT INTO bench_driver_rows (id, title, amount, created_at) VALUES ({", ".join([mark] * 4)})'
+        started = time.perf_counter()
+        for start in range(0, rows, batch):
+            cursor.executemany(sql, data[start:start + batch])
+            conn.commit()
+        insert_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cursor.execute('SELECT id, title, amount, created_at FROM bench_driver_rows')
+        fetched = 0
+        while True:
+            chunk = cursor.fetchmany(5000)
+            if not chunk:
+                break
+            fetched += len(chunk)
+        fetch_seconds = time.perf_counter() - started
+
+        cursor.execute('DROP TABLE bench_driver_rows')
+        conn.commit()
+    finally:
+        conn.close()
+    return {
+        'rows': rows,
+        'insert_seconds': round(insert_seconds, 3),
+        'inserts_per_second': round(rows / insert_seconds) if insert_seconds else None,
+        'fetch_seconds': round(fetch_seconds, 3),
+        'fetch_rows_per_second': round(fetched / fetch_seconds) if fetch_seconds else None,
+    }
+
+
+def cmd_drivers(args):
+    workdir = tempfile.mkdtemp(prefix='fseb-bench-')
+    os.environ.setdefault('STANDIN_DIR', workdir)
+    os.environ['STANDIN_QUERY_LATENCY_MS'] = str(args.query_latency_ms)
+    import azure_driver
+
+    report = {
+        'config': {'rows': args.rows, 'batch': args.batch, 'server': azure_driver.AZURE_CONNECTION['server'],
+                   'bulk_driver': azure_driver.driver_for('bulk')},
+        'drivers': {},
+    }
+    for driver in args.drivers.split(','):
+        if not azure_driver.is_available(driver):
+            report['drivers'][driver] = {'skipped': f'{driver} is not installed'}
+            continue
+        print(f'  {driver} ...', file=sys.stderr)
+        try:
+            report['drivers'][driver] = bench_driver(driver, args.rows, args.batch)
+        except azure_driver.OperationalError as e:
+            report['drivers'][driver] = {'skipped': f'cannot connect: {e}'}
+    emit_report(report, args.out)
+    return 0
+
+
+# ========== SERVING PRESETS ==========
+def wait_until_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/api/ready', timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn_server(preset, database_url, workdir, workers=None):
+    """Run app.py under gunicorn_conf.py with one serving preset"""
+    import subprocess
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, SERVING_PRESET=preset, PORT=str(port),
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn_conf.py')
+    log = open(os.path.join(workdir, f'gunicorn-{preset}.log'), 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', conf, '--bind', f'127.0.0.1:{port}',
+                                'app:app'], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        if not wait_until_ready(url):
+            raise RuntimeError(f'gunicorn ({preset}) did not become ready, see {log.name}')
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+
+
+def cmd_serving(args):
+    import importlib.util
+    import serving
+    if importlib.util.find_spec('gunicorn') is None:
+        print('❌ gunicorn is not installed', file=sys.stderr)
+        return 1
+    workdir = tempfile.mkdtemp(prefix='fseb-bench-')
+    database_url = args.database_url or f'sqlite:///{os.path.join(workdir, "fseb.db")}'
+    configure_limits(args)
+    app_module = load_app(database_url)
+    print(f'Seeding {args.users} users x {args.items} items into {database_url}', file=sys.stderr)
+    try:
+        seed_database(app_module, args.users, args.items, reset=args.reset_database)
+    except RuntimeError as e:
+        print(f'❌ {e}', file=sys.stderr)
+        return 1
+
+    routes = [r.strip() for r in args.routes.split(',')]
+    report = {
+        'config': {
+            'users': args.users,
+            'items': args.items,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'cores': serving.available_cores(),
+            'python': sys.version.split()[0],
+        },
+        'presets': {},
+    }
+    for preset in args.presets.split(','):
+        resolved = serving.settings(preset)
+        if args.workers:
+            resolved['workers'] = args.workers
+        print(f'  {preset}: {resolved["worker_class"]} x {resolved["workers"]}', file=sys.stderr)
+        result = {'settings': {k: v for k, v in resolved.items() if k in (
+            'worker_class', 'workers', 'threads', 'worker_connections', '_notes')}, 'routes': {}}
+        with gunicorn_server(preset, database_url, workdir, args.workers) as url:
+            for name, (base_url, needs_login, factory) in build_scenarios(url, None, args.users).items():
+                if name not in routes:
+                    continue
+                result['routes'][name] = run_scenario(
+                    base_url, needs_login, factory, args.concurrency, args.requests, args.users
+                )
+        result['total_rps'] = round(sum(r['rps'] or 0 for r in result['routes'].values()), 2)
+        report['presets'][preset] = result
+
+    emit_report(report, args.out)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='FSEB benchmark harness')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    routes = sub.add_parser('routes', help='Load test every API route')
+    routes.add_argument('--users', type=int, default=20)
+    routes.add_argument('--items', type=int, default=2000)
+    routes.add_argument('--concurrency', type=int, default=8)
+    routes.add_argument('--requests', type=int, default=200, help='Requests per route')
+    routes.add_argument('--routes', help='Comma-separated subset, e.g. "GET /api/items,GET /api/health"')
+    routes.add_argument('--database-url', help='Must be empty or new (default: a fresh SQLite file in a temp dir)')
+    routes.add_argument('--reset-database', action='store_true', help='Drop and recreate the tables of --database-url')
+    routes.add_argument('--connect-latency-ms', type=float, default=0, help='Stand-in connect latency')
+    routes.add_argument('--query-latency-ms', type=float, default=0, help='Stand-in per-query latency')
+    routes.add_argument('--jitter-ms', type=float, default=0, help='Stand-in latency jitter (+/-)')
+    routes.add_argument('--failure-rate', type=float, default=0, help='Stand-in failure probability')
+    routes.add_argument('--max-qps', type=float, default=0, help='Stand-in throughput cap (0 = none)')
+    routes.add_argument('--rate-limit', action='store_true', help='Keep rate limiting/load shedding on')
+    routes.add_argument('--out', help='Write the JSON report to this file')
+    routes.add_argument('--baseline', help='Compare against a previous JSON report')
+    routes.add_argument('--threshold', type=float, default=0.20, help='Allowed regression ratio')
+    routes.set_defaults(func=cmd_routes)
+
+    search = sub.add_parser('search', help='Full-text search latency at scale')
+    search.add_argument('--items', type=int, default=1000000)
+    search.add_argument('--users', type=int, default=100)
+    search.add_argument('--repeats', type=int, default=50, help='Timed runs per query')
+    search.add_argument('--seed', type=int, default=42)
+    search.add_argument('--database-url', help='Must be empty or new (default: a fresh SQLite file in a temp dir)')
+    search.add_argument('--reset-database', action='store_true', help='Drop and recreate the tables of --database-url')
+    search.add_argument('--out', help='Write the JSON report to this file')
+    search.set_defaults(func=cmd_search)
+
+    drivers = sub.add_parser('drivers', help='Bulk insert and fetch throughput per Azure SQL driver')
+    drivers.add_argument('--drivers', default='pymssql,pyodbc,standin')
+    drivers.add_argument('--rows', type=int, default=20000)
+    drivers.add_argument('--batch', type=int, default=1000, help='Rows per executemany() call')
+    drivers.add_argument('--query-latency-ms', type=float, default=0, help='Stand-in per-query latency')
+    drivers.add_argument('--out', help='Write the JSON report to this file')
+    drivers.set_defaults(func=cmd_drivers)
+
+    serve = sub.add_parser('serving', help='Compare gunicorn serving presets on the real routes')
+    serve.add_argument('--presets', default='sync,gthread,async')
+    serve.add_argument('--workers', type=int, help='Same worker count for every preset (default: per preset)')
+    serve.add_argument('--users', type=int, default=20)
+    serve.add_argument('--items', type=int, default=2000)
+    serve.add_argument('--concurrency', type=int, default=32)
+    serve.add_argument('--requests', type=int, default=400, help='Requests per route')
+    serve.add_argument('--routes', default='GET /api/items,GET /api/health,POST /api/items,POST /api/auth/login')
+    serve.add_argument('--database-url', help='Must be empty or new (default: a fresh SQLite file in a temp dir)')
+    serve.add_argument('--reset-database', action='store_true', help='Drop and recreate the tables of --database-url')
+    serve.add_argument('--rate-limit', action='store_true', help='Keep rate limiting/load shedding on')
+    serve.add_argument('--out', help='Write the JSON report to this file')
+    serve.set_defaults(func=cmd_serving)
+
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    with contextlib.redirect_stdout(sys.stderr):
+        sys.exit(args.func(args))
@@ -0,0 +1,113 @@
+# build_assets.py - Bundle assets/ into fingerprinted files under static/dist/
+#
+#   python build_assets.py                 (run on deploy, before starting workers)
+#   python build_assets.py --templates     (also warm the Jinja bytecode cache)
+#
+# Each bundle is its source files concatenated in order and written as
+# static/dist/<bundle>.<sha256[:12]>.<ext> plus a pre-compressed .gz twin, so
+# a changed file gets a new URL and an unchanged one can be cached by the
+# browser forever. static/dist/manifest.json maps bundle names to file names;
+# assets.asset_url() reads it. Every file is written to a temp name and
+# renamed into place, so workers starting mid-build never see half a bundle.
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, 'assets')
+DIST_DIR = os.path.join(ROOT, 'static', 'dist')
+MANIFEST = os.path.join(DIST_DIR, 'manifest.json')
+
+# bundle name -> source files (relative to assets/), concatenated in order
+BUNDLES = {
+    'home.css': ['css/base.css'],
+    'home.js': ['js/home.js'],
+    'azure.css': ['css/landing.css', 'css/azure.css'],
+    'azure.js': ['js/common.js', 'js/azure.js'],
+    'simple.css': ['css/landing.css', 'css/simple.css'],
+    'simple.js': ['js/common.js', 'js/simple.js'],
+    'dashboard.css': ['css/dashboard.css'],
+    'dashboard.js': ['js/dashboard.js'],
+}
+
+
+def source_paths():
+    return sorted({os.path.join(SOURCE_DIR, f) for files in BUNDLES.values() for f in files})
+
+
+def is_stale():
+    """True if there is no manifest or any source is newer than it"""
+    try:
+        built = os.path.getmtime(MANIFEST)
+    except OSError:
+        return True
+    return any(os.path.getmtime(p) > built for p in source_paths() + [os.path.abspath(__file__)])
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(verbose=True):
+    """Write all bundles and the manifest; returns the manifest dict"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    for name, files in BUNDLES.items():
+        parts = []
+        for f in files:
+            with open(os.path.join(SOURCE_DIR, f), 'rb') as src:
+                parts.append(src.read().rstrip(b'\n') + b'\n')
+        data = b'\n'.join(parts)
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(DIST_DIR, filename)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+            # mtime=0 keeps the .gz byte-identical across rebuilds
+            _write_atomic(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        manifest[name] = filename
+        if verbose:
+            print(f'✓ {name} -> {filename} ({len(data)} bytes)')
+
+    _write_atomic(MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Older fingerprints are no longer referenced by any page
+    current = set(manifest.values()) | {f + '.gz' for f in manifest.values()} | {'manifest.json'}
+    for filename in os.listdir(DIST_DIR):
+        if filename not in current and not filename.endswith('.tmp'):
+            os.remove(os.path.join(DIST_DIR, filename))
+    return manifest
+
+
+def warm_templates(app):
+    """Compile every template once so its bytecode lands in the app's bytecode cache"""
+    count = 0
+    with app.app_context():
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+            count += 1
+    print(f'✓ {count} templates compiled')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build fingerprinted static bundles')
+    parser.add_argument('--templates', action='store_true', help='also warm the Jinja bytecode cache')
+    parser.add_argument('--app', default='app', help='app module whose templates to compile (default: app)')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    build(verbose=not args.quiet)
+    if args.templates:
+        sys.path.insert(0, ROOT)
+        module = __import__(args.app)
+        warm_templates(module.app)
+
+
+if __name__ == '__main__':
+    main()
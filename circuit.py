@@ -0,0 +1,122 @@
+# circuit.py - Circuit breaker for Azure SQL connection attempts
+#
+#   closed     connects go through; CIRCUIT_FAILURE_THRESHOLD consecutive
+#              failures (or one login failure: retrying cannot fix a password)
+#              open the circuit
+#   open       connects fail immediately with the cached diagnosis instead
+#              of blocking a worker for the driver's connect timeout
+#   half-open  after the backoff one caller is let through as a trial; success
+#              closes the circuit, failure re-opens it with the backoff doubled
+#              (CIRCUIT_BACKOFF_SECONDS * 2**n, capped at CIRCUIT_MAX_BACKOFF_SECONDS)
+#
+# State is per process. azure_driver.connect() and probe() go through
+# breaker_for(driver, server) automatically.
+import os
+import threading
+import time
+
+CIRCUIT_ENABLED = os.environ.get('CIRCUIT_ENABLED', '1') != '0'
+FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+BACKOFF_SECONDS = float(os.environ.get('CIRCUIT_BACKOFF_SECONDS', '2'))
+MAX_BACKOFF_SECONDS = float(os.environ.get('CIRCUIT_MAX_BACKOFF_SECONDS', '300'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# Driver messages -> what the operator has to fix
+_FIREWALL = ('Client with IP address', '40615', 'firewall', 'Unable to connect', 'timed out',
+             'Adaptive Server is unavailable', 'unreachable')
+_AUTH = ('Login failed', '18456')
+
+
+def diagnose(error):
+    """'firewall', 'auth' or 'other' for a connection error message"""
+    message = str(error)
+    if any(marker in message for marker in _AUTH):
+        return 'auth'
+    if any(marker in message for marker in _FIREWALL):
+        return 'firewall'
+    return 'other'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, backoff=BACKOFF_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self.trial_running = False
+        self.last_error = None
+        self.diagnosis = None
+        self.rejected = 0
+
+    def allow(self):
+        """True if the caller may attempt a connection now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() >= self.retry_at:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self):
+        return max(0.0, self.retry_at - self.clock())
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = self.trips = 0
+            self.trial_running = False
+            self.last_error = self.diagnosis = None
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.diagnosis = diagnose(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold or self.diagnosis == 'auth':
+                delay = min(self.max_backoff, self.backoff * 2 ** self.trips)
+                self.trips += 1
+                self.state = OPEN
+                self.retry_at = self.clock() + delay
+            self.trial_running = False
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'diagnosis': self.diagnosis,
+                'last_error': self.last_error,
+                'consecutive_failures': self.failures,
+                'retry_in_seconds': round(self.retry_after(), 1) if self.state != CLOSED else None,
+                'rejected': self.rejected,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(*key):
+    name = ':'.join(str(part) for part in key)
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def snapshot():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
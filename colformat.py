@@ -0,0 +1,345 @@
+# colformat.py - Columnar binary encoding for SQL proxy results
+#
+# JSON repeats the row structure on every row and loses types. A client that
+# sends one of these Accept types gets column names and types once, then one
+# compressed block of values per column:
+#
+#   application/vnd.fseb.columnar   built in (struct + zlib), always available
+#   application/vnd.apache.arrow.stream   Arrow IPC, when pyarrow is installed
+#   application/msgpack             {"columns", "types", "data": {name: [...]}}
+#                                   when msgpack is installed
+#
+# Anything else (or no Accept header) keeps the JSON {"results": [[...], ...]}.
+#
+# vnd.fseb.columnar layout (little endian):
+#   b'FSCB' u8 version u32 rows u16 columns
+#   per column: u16 name length, name (utf-8), u8 type code
+#   per column: u8 codec (0 raw, 1 zlib), u32 block length, block
+#   block = null bitmap (ceil(rows/8) bytes, bit set = NULL) + values:
+#     int/float/datetime/date/bool   fixed-width array (NULLs stored as 0)
+#     str/bytes/decimal/json         u32 offsets[rows+1] + concatenated bytes
+#
+# Client side: decode(body) -> Columns, or fetch(url, sql) to do both.
+import json
+import struct
+import zlib
+from array import array
+from itertools import accumulate
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+COLUMNAR = 'application/vnd.fseb.columnar'
+ARROW = 'application/vnd.apache.arrow.stream'
+MSGPACK = 'application/msgpack'
+JSON = 'application/json'
+
+MAGIC = b'FSCB'
+VERSION = 1
+COMPRESS_MIN_BYTES = 512
+
+# type name -> (code, array typecode for fixed-width values or None)
+TYPES = {
+    'int': (1, 'q'),
+    'float': (2, 'd'),
+    'bool': (3, 'b'),
+    'datetime': (4, 'q'),   # microseconds since 1970-01-01 (naive, as the server sent it)
+    'date': (5, 'i'),       # days since 1970-01-01
+    'str': (6, None),
+    'bytes': (7, None),
+    'decimal': (8, None),   # exact decimal text
+    'json': (9, None),      # anything else, one JSON document per value
+}
+TYPE_NAMES = {code: name for name, (code, _) in TYPES.items()}
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = date(1970, 1, 1)
+_HEADER = struct.Struct('<4sBIH')
+_BLOCK = struct.Struct('<BI')
+
+
+def _optional(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+
+def available_types():
+    """Media types this process can produce, most compact first"""
+    types = [COLUMNAR]
+    if _optional('pyarrow') is not None:
+        types.insert(0, ARROW)
+    if _optional('msgpack') is not None:
+        types.append(MSGPACK)
+    return types
+
+
+# ========== TYPE INFERENCE ==========
+_KINDS = {bool: 'bool', int: 'int', float: 'float', datetime: 'datetime', date: 'date', str: 'str',
+          bytes: 'bytes', bytearray: 'bytes', memoryview: 'bytes', Decimal: 'decimal'}
+
+
+def infer_type(values):
+    # set(map(type, ...)) runs in C: one pass, no per-value Python code
+    kinds = {_KINDS.get(t, 'json') for t in set(map(type, values)) if t is not type(None)}
+    if not kinds:
+        return 'str'
+    if len(kinds) == 1:
+        kind = kinds.pop()
+    elif kinds == {'int', 'float'}:
+        kind = 'float'
+    elif kinds == {'int', 'decimal'}:
+        kind = 'decimal'
+    else:
+        return 'json'
+    if kind == 'int' and (max(v for v in values if v is not None) >= 2**63
+                          or min(v for v in values if v is not None) < -2**63):
+        return 'decimal'
+    if kind == 'datetime' and any(v.tzinfo is not None for v in values if v is not None):
+        return 'json'
+    return kind
+
+
+# ========== ENCODING ==========
+def _null_bitmap(values):
+    bitmap = bytearray((len(values) + 7) // 8)
+    if None in values:
+        for i, value in enumerate(values):
+            if value is None:
+                bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+def _fixed(kind, values):
+    typecode = TYPES[kind][1]
+    if kind == 'datetime':
+        values = [(v - _EPOCH) // timedelta(microseconds=1) if v is not None else 0 for v in values]
+    elif kind == 'date':
+        values = [(v - _EPOCH_DATE).days if v is not None else 0 for v in values]
+    elif None in values:
+        values = [v if v is not None else 0 for v in values]
+    return array(typecode, values).tobytes()
+
+
+def _variable(kind, values):
+    if kind == 'str':
+        encoded = [v.encode() if v is not None else b'' for v in values]
+    elif kind == 'bytes':
+        encoded = [bytes(v) if v is not None else b'' for v in values]
+    elif kind == 'decimal':
+        encoded = [str(v).encode() if v is not None else b'' for v in values]
+    else:
+        encoded = [json.dumps(v, default=str).encode() if v is not None else b'' for v in values]
+    offsets = array('I', [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    return offsets.tobytes() + b''.join(encoded)
+
+
+def encode(columns, rows, compress=True):
+    """Rows (sequence of tuples) -> vnd.fseb.columnar bytes"""
+    data = list(zip(*rows)) if rows else [()] * len(columns)
+    kinds = [infer_type(values) for values in data]
+    parts = [_HEADER.pack(MAGIC, VERSION, len(rows), len(columns))]
+    for name, kind in zip(columns, kinds):
+        raw = str(name).encode()
+        parts.append(struct.pack('<H', len(raw)) + raw + struct.pack('<B', TYPES[kind][0]))
+    for kind, values in zip(kinds, data):
+        block = _null_bitmap(values) + (_fixed(kind, values) if TYPES[kind][1] else _variable(kind, values))
+        codec = 0
+        if compress and len(block) >= COMPRESS_MIN_BYTES:
+            packed = zlib.compress(block, 1)
+            if len(packed) < len(block):
+                block, codec = packed, 1
+        parts.append(_BLOCK.pack(codec, len(block)) + block)
+    return b''.join(parts)
+
+
+def _jsonable(kind, values):
+    if kind == 'datetime' or kind == 'date':
+        return [v.isoformat() if v is not None else None for v in values]
+    if kind == 'decimal':
+        return [str(v) if v is not None else None for v in values]
+    if kind == 'json':
+        return [json.loads(json.dumps(v, default=str)) if v is not None else None for v in values]
+    if kind == 'bytes':
+        return [bytes(v) if v is not None else None for v in values]
+    return list(values)
+
+
+def encode_msgpack(columns, rows):
+    import msgpack
+    data = list(zip(*rows)) if rows else [()] * len(columns)
+    kinds = [infer_type(values) for values in data]
+    return msgpack.packb({
+        'columns': list(columns),
+        'types': kinds,
+        'data': {name: _jsonable(kind, values) for name, kind, values in zip(columns, kinds, data)},
+    }, use_bin_type=True)
+
+
+def encode_arrow(columns, rows):
+    import pyarrow as pa
+    data = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = []
+    for values in data:
+        kind = infer_type(values)
+        arrays.append(pa.array(_jsonable(kind, values) if kind == 'json' else list(values)))
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in columns])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate(accept_mimetypes):
+    """Best media type for a werkzeug Accept header; JSON unless a binary type is asked for explicitly"""
+    offered = available_types()
+    best = accept_mimetypes.best_match([JSON] + offered, default=JSON)
+    # '*/*' matches everything: only hand out binary to clients that named it
+    if best != JSON and not any(value == best and quality > 0 for value, quality in accept_mimetypes):
+        return JSON
+    return best
+
+
+def response(columns, rows, meta=None, status=200):
+    """Flask response for the request's Accept header; `meta` goes into the
+    JSON body, or the X-Result-Meta header for binary encodings"""
+    from flask import Response, jsonify, request
+    media_type = negotiate(request.accept_mimetypes)
+    if media_type == COLUMNAR:
+        body = encode(columns, rows)
+    elif media_type == MSGPACK:
+        body = encode_msgpack(columns, rows)
+    elif media_type == ARROW:
+        body = encode_arrow(columns, rows)
+    else:
+        return jsonify({'columns': list(columns), 'results': [list(row) for row in rows], **(meta or {})}), status
+    result = Response(body, status=status, mimetype=media_type)
+    result.headers['Vary'] = 'Accept'
+    if meta:
+        result.headers['X-Result-Meta'] = json.dumps(meta, default=str)
+    return result
+
+
+# ========== DECODING (client side) ==========
+class Columns:
+    """Decoded result: names, types and one array/list per column (no per-row objects)"""
+
+    def __init__(self, columns, types, data, rows):
+        self.columns = columns
+        self.types = types
+        self.data = data
+        self.rows = rows
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __len__(self):
+        return self.rows
+
+    def to_rows(self):
+        """Row tuples, for callers that do want them"""
+        return list(zip(*(self.data[name] for name in self.columns)))
+
+
+def _decode_fixed(kind, payload, rows, nulls):
+    values = array(TYPES[kind][1])
+    values.frombytes(payload[:rows * values.itemsize])
+    if kind == 'bool':
+        values = [bool(v) for v in values]
+    elif kind == 'datetime':
+        values = [_EPOCH + timedelta(microseconds=v) for v in values]
+    elif kind == 'date':
+        values = [_EPOCH_DATE + timedelta(days=v) for v in values]
+    if nulls:
+        values = list(values)
+        for i in nulls:
+            values[i] = None
+    return values
+
+
+def _decode_variable(kind, payload, rows, nulls):
+    offsets = array('I')
+    offsets.frombytes(payload[:(rows + 1) * 4])
+    blob = bytes(payload[(rows + 1) * 4:])
+    chunks = [blob[offsets[i]:offsets[i + 1]] for i in range(rows)]
+    if kind == 'str':
+        values = [chunk.decode() for chunk in chunks]
+    elif kind == 'bytes':
+        values = [bytes(chunk) for chunk in chunks]
+    elif kind == 'decimal':
+        values = [Decimal(chunk.decode()) if chunk else None for chunk in chunks]
+    else:
+        values = [json.loads(chunk) if chunk else None for chunk in chunks]
+    for i in nulls:
+        values[i] = None
+    return values
+
+
+def decode(body):
+    """vnd.fseb.columnar bytes -> Columns"""
+    magic, version, rows, count = _HEADER.unpack_from(body, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a vnd.fseb.columnar v1 payload')
+    offset = _HEADER.size
+    columns, types = [], []
+    for _ in range(count):
+        (length,) = struct.unpack_from('<H', body, offset)
+        offset += 2
+        columns.append(body[offset:offset + length].decode())
+        offset += length
+        types.append(TYPE_NAMES[body[offset]])
+        offset += 1
+
+    data = {}
+    bitmap_size = (rows + 7) // 8
+    for name, kind in zip(columns, types):
+        codec, length = _BLOCK.unpack_from(body, offset)
+        offset += _BLOCK.size
+        block = body[offset:offset + length]
+        offset += length
+        if codec == 1:
+            block = zlib.decompress(block)
+        block = memoryview(block)
+        bitmap = block[:bitmap_size]
+        nulls = [i for i in range(rows) if bitmap[i >> 3] & (1 << (i & 7))] if any(bitmap) else []
+        payload = block[bitmap_size:]
+        if TYPES[kind][1]:
+            data[name] = _decode_fixed(kind, payload, rows, nulls)
+        else:
+            data[name] = _decode_variable(kind, payload, rows, nulls)
+    return Columns(columns, types, data, rows)
+
+
+def decode_response(content_type, body):
+    """Any of the proxy's encodings -> Columns"""
+    content_type = (content_type or JSON).split(';')[0].strip()
+    if content_type == COLUMNAR:
+        return decode(body)
+    if content_type == MSGPACK:
+        import msgpack
+        payload = msgpack.unpackb(body, raw=False)
+        rows = len(payload['data'][payload['columns'][0]]) if payload['columns'] else 0
+        return Columns(payload['columns'], payload['types'], payload['data'], rows)
+    if content_type == ARROW:
+        import pyarrow as pa
+        table = pa.ipc.open_stream(body).read_all()
+        return Columns(table.column_names, [str(t) for t in table.schema.types],
+                       {name: table.column(name).to_pylist() for name in table.column_names}, table.num_rows)
+    payload = json.loads(body)
+    rows = payload['results']
+    columns = payload.get('columns') or [f'column{i}' for i in range(len(rows[0]) if rows else 0)]
+    data = {name: list(values) for name, values in zip(columns, zip(*rows))} if rows else {c: [] for c in columns}
+    return Columns(columns, ['json'] * len(columns), data, len(rows))
+
+
+def fetch(url, sql, accept=COLUMNAR, timeout=60, headers=None):
+    """POST sql to a proxy /api/query endpoint and decode whatever comes back"""
+    import urllib.request
+    request = urllib.request.Request(url, data=json.dumps({'sql': sql}).encode(), method='POST')
+    request.add_header('Content-Type', JSON)
+    request.add_header('Accept', accept)
+    for key, value in (headers or {}).items():
+        request.add_header(key, value)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return decode_response(response.headers.get('Content-Type'), response.read())
@@ -0,0 +1,248 @@
+# fanout.py - Run one read query across several Azure databases at once
+#
+#   POST /api/query {"sql": "...", "databases": ["fseb_eu", "fseb_us"]}
+#   POST /api/query {"sql": "...", "database_set": "emea", "merge_on": "created_at"}
+#
+# Each database gets its own small connection pool (FANOUT_POOL_SIZE) and the
+# statements run concurrently, one producer thread per database of the
+# request (at most FANOUT_MAX_WORKERS databases per request). The threads are
+# the request's own: a producer parked on a full queue must never keep another
+# database, of this or a concurrent fan-out, from starting. Rows are pulled
+# in FANOUT_BATCH_ROWS batches through a short per-database queue, so a slow
+# consumer holds back the producers instead of buffering whole result sets,
+# and are merged as they arrive:
+#   * concatenated, database by database in the requested order, or
+#   * k-way merged on merge_on (each query must ORDER BY that key already)
+# A _database column is prepended to every row. A database that fails, times
+# out or returns different columns is reported in the per-database summary;
+# the others still answer. FANOUT_TIMEOUT_SECONDS bounds both the wait for
+# every database's first result and each later wait for a source's next batch.
+#
+# Only databases listed in FANOUT_DATABASES or a FANOUT_SETS entry
+# ("emea=fseb_de,fseb_fr;us=fseb_us") can be addressed; AZURE_DATABASE always can.
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.pool import QueuePool
+
+import azure_driver
+
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '8'))
+FANOUT_POOL_SIZE = int(os.environ.get('FANOUT_POOL_SIZE', '2'))
+FANOUT_BATCH_ROWS = int(os.environ.get('FANOUT_BATCH_ROWS', '1000'))
+FANOUT_QUEUE_BATCHES = int(os.environ.get('FANOUT_QUEUE_BATCHES', '4'))
+FANOUT_TIMEOUT_SECONDS = float(os.environ.get('FANOUT_TIMEOUT_SECONDS', '30'))
+
+
+def _parse_sets(spec):
+    sets = {}
+    for entry in spec.split(';'):
+        name, _, members = entry.partition('=')
+        if name.strip() and members.strip():
+            sets[name.strip()] = [m.strip() for m in members.split(',') if m.strip()]
+    return sets
+
+
+DATABASE_SETS = _parse_sets(os.environ.get('FANOUT_SETS', ''))
+ALLOWED_DATABASES = (
+    {d.strip() for d in os.environ.get('FANOUT_DATABASES', '').split(',') if d.strip()}
+    | {d for members in DATABASE_SETS.values() for d in members}
+    | {azure_driver.AZURE_CONNECTION['database']}
+)
+
+
+class FanOutError(ValueError):
+    """Bad request: unknown database/set or unusable merge key"""
+
+
+def resolve(databases=None, database_set=None):
+    """Ordered, de-duplicated database list for a request"""
+    if database_set is not None:
+        if database_set not in DATABASE_SETS:
+            raise FanOutError(f'Unknown database set: {database_set}')
+        databases = DATABASE_SETS[database_set]
+    if not databases or not isinstance(databases, list):
+        raise FanOutError('databases must be a non-empty list')
+    if len(set(map(str, databases))) > FANOUT_MAX_WORKERS:
+        raise FanOutError(f'At most {FANOUT_MAX_WORKERS} databases per query (FANOUT_MAX_WORKERS)')
+    unknown = [d for d in databases if d not in ALLOWED_DATABASES]
+    if unknown:
+        raise FanOutError(f"Databases not allowed: {', '.join(map(str, unknown))}")
+    return list(dict.fromkeys(databases))
+
+
+# ========== POOLS ==========
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(database):
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = QueuePool(lambda: azure_driver.connect(database=database),
+                                         pool_size=FANOUT_POOL_SIZE, max_overflow=FANOUT_POOL_SIZE,
+                                         timeout=FANOUT_TIMEOUT_SECONDS, pre_ping=False)
+        return _pools[database]
+
+
+# ========== PRODUCERS ==========
+class _Source:
+    """One database's share of a fan-out: a producer task feeding a bounded queue"""
+
+    def __init__(self, database, sql):
+        self.database = database
+        self.sql = sql
+        self.cancelled = threading.Event()
+        self.queue = queue.Queue(FANOUT_QUEUE_BATCHES)
+        self.columns = None
+        self.rows = 0
+        self.error = None
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def produce(self):
+        try:
+            conn = pool_for(self.database).connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(self.sql)
+                self._put(('columns', [d[0] for d in cursor.description or []]))
+                while not self.cancelled.is_set():
+                    batch = cursor.fetchmany(FANOUT_BATCH_ROWS)
+                    if not batch:
+                        break
+                    self._put(('rows', batch))
+            finally:
+                conn.close()
+            self._put(('done', None))
+        except Exception as e:
+            self._put(('done', e))
+
+    def _put(self, message):
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(message, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, deadline):
+        # Past the deadline a message that is already queued still counts
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return self.queue.get_nowait()
+        return self.queue.get(timeout=remaining)
+
+    def fail(self, error):
+        self.error = self.error or error
+        self.finished = self.finished or time.perf_counter()
+        # Nobody reads this queue any more: let the producer return its connection
+        self.cancelled.set()
+
+    def report(self):
+        result = {'rows': self.rows, 'ms': round(((self.finished or time.perf_counter()) - self.started) * 1000, 1)}
+        if self.error is not None:
+            result['error'] = str(self.error)
+        return result
+
+
+def _iter_rows(source, timeout):
+    """Rows of one source (already past its columns message), tagged with the database"""
+    tag = (source.database,)
+    while True:
+        try:
+            # Per batch: time spent while the consumer drained other sources does not count
+            kind, payload = source.get(time.perf_counter() + timeout)
+        except queue.Empty:
+            source.fail(TimeoutError(f'no rows for {timeout:.0f}s'))
+            return
+        if kind == 'done':
+            if payload is not None:
+                source.fail(payload)
+            source.finished = source.finished or time.perf_counter()
+            return
+        source.rows += len(payload)
+        for row in payload:
+            yield tag + tuple(row)
+
+
+# ========== FAN-OUT ==========
+class FanOut:
+    """columns, an iterator of merged rows, and report() once it is exhausted"""
+
+    def __init__(self, databases, sql, merge_on=None, descending=False, timeout=FANOUT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.deadline = time.perf_counter() + timeout
+        self.sources = [_Source(database, sql) for database in databases]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix='fanout')
+        for source in self.sources:
+            self.executor.submit(source.produce)
+
+        # Wait for every database to execute (or fail) and agree on columns
+        for source in self.sources:
+            try:
+                kind, payload = source.get(self.deadline)
+            except queue.Empty:
+                source.fail(TimeoutError(f'no result within {timeout:.0f}s'))
+                continue
+            if kind == 'done':
+                source.fail(payload or RuntimeError('statement returned no result set'))
+            else:
+                source.columns = payload
+        live = [s for s in self.sources if s.error is None]
+        self.columns = ['_database'] + (live[0].columns if live else [])
+        for source in live[1:]:
+            if source.columns != live[0].columns:
+                source.fail(ValueError(f'columns differ from {live[0].database}: {source.columns}'))
+        self.live = [s for s in live if s.error is None]
+
+        self.merge_index = None
+        if merge_on is not None and self.live:
+            keys = [merge_on] if isinstance(merge_on, str) else list(merge_on)
+            missing = [k for k in keys if k not in self.columns]
+            if missing:
+                self.close()
+                raise FanOutError(f"merge_on columns not in result: {', '.join(missing)}")
+            self.merge_index = [self.columns.index(k) for k in keys]
+        self.descending = descending
+
+    def _sort_key(self, row):
+        # NULLs sort first ascending (SQL Server's order), never compared to values
+        return tuple((row[i] is not None, row[i]) for i in self.merge_index)
+
+    def rows(self):
+        streams = [_iter_rows(s, self.timeout) for s in self.live]
+        try:
+            if self.merge_index is None:
+                for stream in streams:
+                    yield from stream
+            else:
+                yield from heapq.merge(*streams, key=self._sort_key, reverse=self.descending)
+        finally:
+            self.close()
+
+    def close(self):
+        # Unblocks producers of an abandoned stream; their connections go back to the pool
+        for source in self.sources:
+            source.cancelled.set()
+        self.executor.shutdown(wait=False)
+
+    def report(self):
+        return {s.database: s.report() for s in self.sources}
+
+    @property
+    def failed(self):
+        return [s.database for s in self.sources if s.error is not None]
+
+
+def ndjson(result):
+    """Streamed body: {"columns"} line, one JSON array per row, then {"databases"} with the per-database report"""
+    yield json.dumps({'columns': result.columns}) + '\n'
+    for row in result.rows():
+        yield json.dumps(row, default=str) + '\n'
+    yield json.dumps({'databases': result.report()}) + '\n'
@@ -0,0 +1,33 @@
+# gunicorn_conf.py - gunicorn settings and worker hooks
+#
+#   gunicorn -c gunicorn_conf.py app:app
+#   SERVING_PRESET=sync|gthread|async gunicorn -c gunicorn_conf.py app:app
+#
+# Worker model, counts, timeouts and recycling come from serving.py.
+# With preload_app the app (and any engine it creates at import) lives in the
+# master; post_fork makes each worker drop the inherited pools, and
+# post_worker_init starts warm-up (warmup.py). /api/ready reports 503 until
+# the worker is warm.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import serving  # noqa: E402
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+globals().update(serving.gunicorn_settings())
+
+
+def post_fork(server, worker):
+    import ratelimit
+    ratelimit.after_fork()
+    if server.cfg.preload_app:
+        import warmup
+        warmup.after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    # worker.wsgi is gunicorn's error app if the import failed: nothing to warm
+    if hasattr(worker.wsgi, 'extensions'):
+        import warmup
+        warmup.start(worker.wsgi)
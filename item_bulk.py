@@ -0,0 +1,120 @@
+# item_bulk.py - Set-based bulk update and delete of a user's items
+#
+#   POST /api/items/bulk-update {"filter": {"status": "active", "to": "2024-01-01"},
+#                                "set": {"status": "done"}}
+#   POST /api/items/bulk-delete {"filter": {"ids": [1, 2, 3]}}
+#
+# Filters (all optional, always ANDed with the caller's user_id): ids, status,
+# from/to on created_at. Matching rows are never loaded: each batch finds its
+# upper id bound with one scalar query (OFFSET BULK_BATCH_SIZE-1) and then
+# runs a single UPDATE/DELETE over that id window, in its own short
+# transaction, so the log and lock footprint stay bounded however many rows
+# match. Side tables are kept in step set-wise in the same transaction:
+# tombstones for the sync feed, rollup deltas, and the portable search index.
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+
+import item_search
+import item_sync
+import rollups
+
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '1000'))
+BULK_FIELDS = ('status',)
+MAX_IDS = 10000
+STATUS_MAX_LENGTH = 50  # items.status is String(50)
+
+
+def parse_filter(Item, user_id, spec):
+    """WHERE clause for a filter dict; raises ValueError on bad input"""
+    if not isinstance(spec, dict):
+        raise ValueError('filter must be an object')
+    unknown = set(spec) - {'ids', 'status', 'from', 'to'}
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}")
+    clauses = [Item.user_id == user_id]
+    if 'ids' in spec:
+        ids = spec['ids']
+        if not isinstance(ids, list) or not ids or len(ids) > MAX_IDS:
+            raise ValueError(f'ids must be a list of 1-{MAX_IDS} integers')
+        clauses.append(Item.id.in_([int(i) for i in ids]))
+    if 'status' in spec:
+        clauses.append(Item.status == str(spec['status']))
+    if spec.get('from'):
+        clauses.append(Item.created_at >= datetime.fromisoformat(spec['from']))
+    if spec.get('to'):
+        clauses.append(Item.created_at < datetime.fromisoformat(spec['to']))
+    return and_(*clauses)
+
+
+def parse_set(spec):
+    """{field: value} for a bulk update's "set"; raises ValueError on bad input"""
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError('set must be a non-empty object')
+    unknown = set(spec) - set(BULK_FIELDS)
+    if unknown:
+        raise ValueError(f"set must contain only: {', '.join(BULK_FIELDS)}")
+    status = spec.get('status')
+    if not isinstance(status, str) or not status.strip() or len(status) > STATUS_MAX_LENGTH:
+        raise ValueError(f'set.status must be a non-empty string of at most {STATUS_MAX_LENGTH} characters')
+    return dict(spec)
+
+
+def id_windows(engine, Item, where, batch_size=BULK_BATCH_SIZE):
+    """Yield id-window clauses each covering at most batch_size matching rows"""
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            upper = connection.execute(
+                select(Item.id).where(where, Item.id > last_id).order_by(Item.id)
+                .offset(batch_size - 1).limit(1)
+            ).scalar()
+            if upper is None:
+                # Fewer than batch_size left: one last window up to the highest match, if any
+                upper = connection.execute(select(func.max(Item.id)).where(where, Item.id > last_id)).scalar()
+                if upper is None:
+                    return
+                batch_size = 0
+        yield and_(where, Item.id > last_id, Item.id <= upper)
+        if not batch_size:
+            return
+        last_id = upper
+
+
+def bulk_update(engine, Item, where, values, batch_size=BULK_BATCH_SIZE):
+    """UPDATE items SET values, updated_at=now per id window; returns (rows, batches)"""
+    items = Item.__table__
+    status = values['status']
+    # Rows already in the target state are left alone (and keep their updated_at)
+    where = and_(where, or_(Item.status != status, Item.status.is_(None)))
+    updated, batches = 0, 0
+    for window in id_windows(engine, Item, where, batch_size):
+        with engine.begin() as connection:
+            rollups.record_status_change(connection, Item, window, status)
+            updated += connection.execute(
+                items.update().where(window).values(status=status, updated_at=datetime.utcnow())
+            ).rowcount
+        batches += 1
+    return updated, batches
+
+
+def bulk_delete(engine, Item, where, batch_size=BULK_BATCH_SIZE):
+    """DELETE per id window with tombstones and rollups; returns (rows, batches)"""
+    items = Item.__table__
+    deleted, batches = 0, 0
+    for window in id_windows(engine, Item, where, batch_size):
+        with engine.begin() as connection:
+            item_sync.record_deletions_where(connection, Item, window)
+            rollups.record_change(connection, Item, window, -1)
+            # FTS5 triggers cover SQLite; the portable index needs an explicit pass
+            if item_search.backend(connection) == 'terms':
+                item_search.unindex_items(connection, select(Item.id).where(window))
+            deleted += connection.execute(items.delete().where(window)).rowcount
+        batches += 1
+    return deleted, batches
+
+
+def count(engine, Item, where):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(Item.__table__).where(where)).scalar()
@@ -0,0 +1,116 @@
+# item_patch.py - Conditional single-statement item updates (If-Match / ETag)
+#
+# An item's ETag is its updated_at in microseconds since the epoch, so the
+# version check lives in the UPDATE itself:
+#
+#   UPDATE items SET title=?, updated_at=? WHERE id=? AND user_id=? AND updated_at=?
+#   RETURNING ...            (SQLite; OUTPUT inserted.* on SQL Server)
+#
+# One round trip changes the row and returns the new representation; no ORM
+# load, no identity map. Only when nothing matched does a second query tell
+# 404 (no such item for this user) from 412 (someone changed it first).
+# If-Match: * skips the version check; a list of ETags matches if any one
+# does. Side tables the ORM hooks would have maintained are kept in step:
+# rollup deltas on status changes, the portable search index on
+# title/description changes, and a live event after commit.
+import string
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select
+
+import item_search
+import rollups
+
+PATCH_FIELDS = {'title': str, 'description': str, 'status': str}
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class PreconditionFailed(Exception):
+    def __init__(self, current_etag):
+        super().__init__('Item was modified')
+        self.current_etag = current_etag
+
+
+def etag(updated_at):
+    if updated_at is None:
+        return '"0"'
+    return f'"{(updated_at - EPOCH) // MICROSECOND:x}"'
+
+
+def parse_if_match(header):
+    """Expected updated_at values from an If-Match header: a list of datetimes
+    (None for a row with no timestamp), or ... for '*'; raises ValueError if unusable"""
+    value = header.strip()
+    if value == '*':
+        return ...
+    expected, weak = [], False
+    for tag in (t.strip() for t in value.split(',')):
+        if not tag:
+            continue
+        if tag.startswith('W/'):
+            # Weak comparison is not allowed for If-Match (RFC 9110 13.1.1): never matches
+            weak = True
+            continue
+        if len(tag) < 2 or tag[0] != '"' or tag[-1] != '"':
+            raise ValueError('If-Match must be a list of quoted ETags')
+        digits = tag[1:-1]
+        try:
+            if not digits or digits.strip(string.hexdigits):
+                raise ValueError(digits)
+            micros = int(digits, 16)
+            expected.append(None if micros == 0 else EPOCH + micros * MICROSECOND)
+        except (ValueError, OverflowError):
+            raise ValueError(f'malformed ETag: {tag}') from None
+    if not expected:
+        raise ValueError('weak ETags cannot be used with If-Match' if weak else 'If-Match must be a quoted ETag')
+    return expected
+
+
+def validate(data):
+    """{field: value} of the patchable fields in a JSON body; raises ValueError"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError('Body must be a non-empty JSON object')
+    unknown = set(data) - set(PATCH_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown or read-only fields: {', '.join(sorted(unknown))}")
+    for field, value in data.items():
+        if not isinstance(value, PATCH_FIELDS[field]) and not (value is None and field != 'title'):
+            raise ValueError(f'{field} must be a {PATCH_FIELDS[field].__name__}')
+    if data.get('title') == '':
+        raise ValueError('title must not be empty')
+    return dict(data)
+
+
+def patch(connection, Item, item_id, user_id, expected, changes):
+    """Apply `changes` if the item's updated_at is one of `expected` (from parse_if_match);
+    returns the new row mapping. Raises LookupError (not found) or PreconditionFailed."""
+    items = Item.__table__
+    where = [items.c.id == item_id, items.c.user_id == user_id]
+    if expected is not ...:
+        where.append(or_(*[items.c.updated_at == value if value is not None else items.c.updated_at.is_(None)
+                           for value in expected]))
+
+    if 'status' in changes:
+        # Inserts nothing if the version check is going to fail
+        rollups.record_status_change(connection, Item, and_(*where), changes['status'] or '')
+
+    statement = items.update().where(*where).values(**changes, updated_at=datetime.utcnow())
+    if connection.dialect.update_returning:
+        row = connection.execute(statement.returning(*items.c)).mappings().first()
+    else:
+        row = None
+        if connection.execute(statement).rowcount:
+            row = connection.execute(select(*items.c).where(items.c.id == item_id)).mappings().first()
+
+    if row is None:
+        current = connection.execute(
+            select(items.c.updated_at).where(items.c.id == item_id, items.c.user_id == user_id)
+        ).first()
+        if current is None:
+            raise LookupError(item_id)
+        raise PreconditionFailed(etag(current[0]))
+
+    if ('title' in changes or 'description' in changes) and item_search.backend(connection) == 'terms':
+        item_search.index_item(connection, row['id'], row['title'], row['description'])
+    return row
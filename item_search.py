@@ -0,0 +1,252 @@
+# item_search.py - Full-text search over Item title and description
+#
+# Two index backends, picked per database:
+#   * SQLite with FTS5: an external-content FTS5 table (items_fts) kept in
+#     sync by triggers, ranked with bm25().
+#   * Everything else (Azure SQL, SQLite without FTS5): an inverted-index
+#     table (item_terms) maintained incrementally from SQLAlchemy mapper
+#     events, ranked by weighted term frequency (whole terms only, no prefix
+#     matching).
+#
+# Wire it up once from the app:  item_search.init_app(app, db, Item)
+import re
+from collections import Counter
+
+from sqlalchemy import Select, event, func, inspect, text
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_backends = {}
+_state = {}
+
+
+def tokenize(*texts):
+    """Lower-cased word tokens, truncated to fit the index column"""
+    tokens = []
+    for value in texts:
+        if value:
+            tokens.extend(t[:MAX_TERM_LENGTH] for t in _TOKEN.findall(value.lower()))
+    return tokens
+
+
+# ========== SQLITE FTS5 ==========
+FTS5_TABLE_DDL = (
+    "CREATE VIRTUAL TABLE items_fts USING fts5("
+    "title, description, content='items', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+)
+FTS5_TRIGGER_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF title, description ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO items_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+]
+
+
+def _fts5_exists(connection):
+    return connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'"
+    )).first() is not None
+
+
+def ensure_index(connection, rebuild=False):
+    """Create the FTS5 table and triggers if missing (SQLite only); returns the backend name"""
+    if connection.dialect.name != 'sqlite':
+        return 'terms'
+    created = False
+    if not _fts5_exists(connection):
+        try:
+            connection.execute(text(FTS5_TABLE_DDL))
+        except Exception as e:
+            print(f"⚠ FTS5 unavailable, using inverted index: {str(e)[:100]}")
+            return 'terms'
+        created = True
+    # Triggers disappear whenever items is dropped, so always re-assert them
+    for statement in FTS5_TRIGGER_DDL:
+        connection.execute(text(statement))
+    if created or rebuild:
+        # Index whatever is already in items
+        connection.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+    if created:
+        print("✓ Created items_fts full-text index")
+    return 'fts5'
+
+
+def backend(connection):
+    """'fts5' or 'terms' for the connection's database (cached per engine URL)"""
+    key = str(connection.engine.url)
+    if key not in _backends:
+        use_fts5 = connection.dialect.name == 'sqlite' and _fts5_exists(connection)
+        _backends[key] = 'fts5' if use_fts5 else 'terms'
+    return _backends[key]
+
+
+def fts5_query(terms):
+    """Quote every term so user input can never be parsed as FTS5 syntax; last term is a prefix"""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+# ========== INVERTED INDEX ==========
+def _item_terms(title, description):
+    counts = Counter()
+    for token in tokenize(title):
+        counts[token] += TITLE_WEIGHT
+    for token in tokenize(description):
+        counts[token] += 1
+    return counts
+
+
+def index_item(connection, item_id, title, description):
+    """Replace one item's postings in item_terms"""
+    table = _state['terms_table']
+    connection.execute(table.delete().where(table.c.item_id == item_id))
+    counts = _item_terms(title, description)
+    if counts:
+        connection.execute(table.insert(), [
+            {'term': term, 'item_id': item_id, 'weight': weight} for term, weight in counts.items()
+        ])
+
+
+def unindex_items(connection, item_ids):
+    """item_ids: ids, or a SELECT of ids (stays server-side)"""
+    table = _state['terms_table']
+    ids = item_ids if isinstance(item_ids, Select) else list(item_ids)
+    connection.execute(table.delete().where(table.c.item_id.in_(ids)))
+
+
+def _after_insert(mapper, connection, target):
+    if backend(connection) == 'terms':
+        index_item(connection, target.id, target.title, target.description)
+
+
+def _after_update(mapper, connection, target):
+    state = inspect(target)
+    if backend(connection) == 'terms' and (
+        state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes()
+    ):
+        index_item(connection, target.id, target.title, target.description)
+
+
+def _after_delete(mapper, connection, target):
+    if backend(connection) == 'terms':
+        unindex_items(connection, [target.id])
+
+
+# ========== SEARCH ==========
+def search(session, Item, query, user_id=None, page=1, per_page=20):
+    """Ranked, paginated search; returns (items, has_more)"""
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], False
+    per_page = max(1, min(int(per_page), 100))
+    offset = (max(1, int(page)) - 1) * per_page
+
+    connection = session.connection()
+    if backend(connection) == 'fts5':
+        sql = (
+            "SELECT items.id FROM items_fts JOIN items ON items.id = items_fts.rowid "
+            "WHERE items_fts MATCH :match"
+            + (" AND items.user_id = :user_id" if user_id is not None else "")
+            + " ORDER BY bm25(items_fts, :title_weight, 1.0) LIMIT :limit OFFSET :offset"
+        )
+        ids = [row[0] for row in connection.execute(text(sql), {
+            'match': fts5_query(terms),
+            'user_id': user_id,
+            'title_weight': float(TITLE_WEIGHT),
+            'limit': per_page + 1,
+            'offset': offset,
+        })]
+    else:
+        table = _state['terms_table']
+        score = func.sum(table.c.weight).label('score')
+        stmt = (
+            session.query(table.c.item_id, score)
+            .join(Item, Item.id == table.c.item_id)
+            .filter(table.c.term.in_(terms))
+        )
+        if user_id is not None:
+            stmt = stmt.filter(Item.user_id == user_id)
+        stmt = (
+            stmt.group_by(table.c.item_id)
+            .having(func.count(table.c.term) == len(terms))
+            .order_by(score.desc(), table.c.item_id)
+            .limit(per_page + 1)
+            .offset(offset)
+        )
+        ids = [row[0] for row in stmt]
+
+    has_more = len(ids) > per_page
+    ids = ids[:per_page]
+    if not ids:
+        return [], has_more
+    by_id = {item.id: item for item in session.query(Item).filter(Item.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id], has_more
+
+
+def rebuild(session, Item):
+    """Rebuild the index from scratch (after bulk loads that bypass the ORM)"""
+    connection = session.connection()
+    if backend(connection) == 'fts5':
+        connection.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+        return
+    table = _state['terms_table']
+    connection.execute(table.delete())
+    last_id = 0
+    while True:
+        # Keyset batches: never hold a result set open while writing (pymssql has no MARS)
+        rows = (session.query(Item.id, Item.title, Item.description)
+                .filter(Item.id > last_id).order_by(Item.id).limit(5000).all())
+        if not rows:
+            break
+        postings = [
+            {'term': term, 'item_id': item_id, 'weight': weight}
+            for item_id, title, description in rows
+            for term, weight in _item_terms(title, description).items()
+        ]
+        if postings:
+            connection.execute(table.insert(), postings)
+        last_id = rows[-1][0]
+
+
+# ========== WIRING ==========
+def init_app(app, db, Item):
+    """Declare the inverted-index table, hook index maintenance and add `flask search-reindex`"""
+    terms_table = db.Table(
+        'item_terms',
+        db.Column('term', db.String(MAX_TERM_LENGTH), primary_key=True),
+        db.Column('item_id', db.Integer, primary_key=True, index=True),
+        db.Column('weight', db.Integer, nullable=False),
+    )
+    _state['terms_table'] = terms_table
+
+    @event.listens_for(db.metadata, 'after_create')
+    def _create_fts(target, connection, **kw):
+        _backends[str(connection.engine.url)] = ensure_index(connection)
+
+    @event.listens_for(db.metadata, 'before_drop')
+    def _drop_fts(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text("DROP TABLE IF EXISTS items_fts"))
+        _backends.pop(str(connection.engine.url), None)
+
+    event.listen(Item, 'after_insert', _after_insert)
+    event.listen(Item, 'after_update', _after_update)
+    event.listen(Item, 'after_delete', _after_delete)
+
+    @app.cli.command('search-reindex')
+    def search_reindex():
+        """Rebuild the item full-text index"""
+        rebuild(db.session, Item)
+        db.session.commit()
+        print("✓ Search index rebuilt")
+
+    return terms_table
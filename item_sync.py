@@ -0,0 +1,135 @@
+# item_sync.py - Incremental change feed for item sync
+#
+# Clients keep an opaque cursor and ask for everything that changed after it:
+# items created/updated (ordered by updated_at, id) and deletions, recorded as
+# rows in item_tombstones by an after_delete mapper event. Both sides are
+# served from (user_id, timestamp, id) indexes, so a sync costs bytes
+# proportional to what changed rather than to the user's whole history.
+#
+# Wire it up once from the app:  item_sync.init_app(app, db, Item)
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, literal, or_, select
+
+# Changes younger than this are held back: a transaction can commit after a
+# later timestamp has already been served, and its rows would be skipped.
+SAFETY_WINDOW_SECONDS = float(os.environ.get('SYNC_SAFETY_WINDOW_SECONDS', '2'))
+MAX_LIMIT = 1000
+
+_state = {}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, item_id):
+    raw = json.dumps([timestamp.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, item_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(item_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid sync cursor') from e
+
+
+def _after(ts_column, id_column, position):
+    """(ts, id) > position, spelled without row values (SQL Server has none)"""
+    if position is None:
+        return True
+    ts, last_id = position
+    return or_(ts_column > ts, and_(ts_column == ts, id_column > last_id))
+
+
+def changes(session, Item, user_id, cursor=None, limit=500):
+    """Return (changes, next_cursor, has_more) for one user"""
+    Tombstone = _state['tombstone_model']
+    position = decode_cursor(cursor) if cursor else None
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    horizon = datetime.utcnow() - timedelta(seconds=SAFETY_WINDOW_SECONDS)
+
+    items = (
+        session.query(Item)
+        .filter(Item.user_id == user_id, Item.updated_at <= horizon,
+                _after(Item.updated_at, Item.id, position))
+        .order_by(Item.updated_at, Item.id)
+        .limit(limit + 1)
+        .all()
+    )
+    tombstones = (
+        session.query(Tombstone)
+        .filter(Tombstone.user_id == user_id, Tombstone.deleted_at <= horizon,
+                _after(Tombstone.deleted_at, Tombstone.item_id, position))
+        .order_by(Tombstone.deleted_at, Tombstone.item_id)
+        .limit(limit + 1)
+        .all()
+    )
+
+    merged = sorted(
+        [(item.updated_at, item.id, {'op': 'upsert', 'item': item.to_dict()}) for item in items]
+        + [(t.deleted_at, t.item_id, {'op': 'delete', 'id': t.item_id, 'deleted_at': t.deleted_at.isoformat()})
+           for t in tombstones],
+        key=lambda change: (change[0], change[1]),
+    )
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+
+    if merged:
+        next_cursor = encode_cursor(merged[-1][0], merged[-1][1])
+    else:
+        next_cursor = cursor
+    return [change[2] for change in merged], next_cursor, has_more
+
+
+def record_deletions(connection, rows, deleted_at=None):
+    """Write tombstones for (item_id, user_id) pairs removed outside the ORM"""
+    table = _state['tombstone_model'].__table__
+    deleted_at = deleted_at or datetime.utcnow()
+    rows = [{'item_id': item_id, 'user_id': user_id, 'deleted_at': deleted_at} for item_id, user_id in rows]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def record_deletions_where(connection, Item, where, deleted_at=None):
+    """Tombstones for the items matching `where`, via INSERT ... SELECT; call before deleting them"""
+    table = _state['tombstone_model'].__table__
+    connection.execute(table.insert().from_select(
+        ['item_id', 'user_id', 'deleted_at'],
+        select(Item.id, Item.user_id, literal(deleted_at or datetime.utcnow())).where(where),
+    ))
+
+
+def _after_delete(mapper, connection, target):
+    record_deletions(connection, [(target.id, target.user_id)])
+
+
+def init_app(app, db, Item):
+    """Declare item_tombstones, the feed indexes and the tombstone hook"""
+
+    class ItemTombstone(db.Model):
+        __tablename__ = 'item_tombstones'
+        __table_args__ = (
+            db.Index('ix_item_tombstones_user_deleted', 'user_id', 'deleted_at', 'item_id'),
+        )
+        id = db.Column(db.Integer, primary_key=True)
+        item_id = db.Column(db.Integer, nullable=False)
+        user_id = db.Column(db.Integer)
+        deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    feed_index = db.Index('ix_items_user_updated', Item.user_id, Item.updated_at, Item.id)
+
+    @event.listens_for(db.metadata, 'after_create')
+    def _create_feed_index(target, connection, **kw):
+        # create_all() skips indexes on tables that already exist
+        feed_index.create(connection, checkfirst=True)
+
+    event.listen(Item, 'after_delete', _after_delete)
+    _state['tombstone_model'] = ItemTombstone
+    return ItemTombstone
@@ -0,0 +1,410 @@
+# jobs.py - Durable local job queue for long-running work
+#
+# Anything that can outlive a platform request timeout (table listing,
+# create_all, full-result proxy queries) can run here instead of inside the
+# HTTP request. Jobs live in a SQLite file (JOBS_DB), results are written as
+# JSON files next to it, and a worker pool process executes them:
+#
+#   python jobs.py worker --app app_azure_fixed --concurrency 4
+#   python jobs.py worker --app proxi_api            (proxy_query jobs)
+#
+# Handlers are registered by the app modules that own them; a worker only
+# claims the kinds it has handlers for.
+#
+# HTTP API (added to an app with jobs.init_app(app); all need the X-Admin-Token):
+#   POST   /api/jobs                {"kind": "...", "params": {...}}  -> 202
+#   GET    /api/jobs/<id>           status
+#   GET    /api/jobs/<id>/result    result document once succeeded
+#   DELETE /api/jobs/<id>           cancel (queued: immediately, running: cooperatively)
+#
+# Failed attempts are retried with exponential backoff up to max_attempts.
+# JOBS_MAX_PER_NODE caps running jobs across all worker processes on a host.
+import argparse
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from flask import jsonify, request, send_file
+
+from admin import admin_required
+
+JOBS_DB = os.environ.get('JOBS_DB', os.path.join('instance', 'jobs.db'))
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', '2'))
+JOBS_MAX_PER_NODE = int(os.environ.get('JOBS_MAX_PER_NODE', '4'))
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', '3'))
+# A running job whose worker has not heartbeated for this long is requeued
+JOBS_STALE_SECONDS = int(os.environ.get('JOBS_STALE_SECONDS', '120'))
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 10
+
+NODE = socket.gethostname()
+TERMINAL = ('succeeded', 'failed', 'cancelled')
+
+_handlers = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobRejected(Exception):
+    """Raised by a handler for params that can never succeed: the job fails without retries"""
+
+
+def handler(kind):
+    """Register a function(params, job) -> JSON-serialisable result"""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+# ========== STORE ==========
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    node TEXT,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (status, run_after, created_at);
+'''
+
+COLUMNS = ('id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at',
+           'started_at', 'finished_at', 'heartbeat_at', 'node', 'worker', 'cancel_requested', 'error')
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or JOBS_DB
+        self.results_dir = os.path.join(os.path.dirname(os.path.abspath(self.path)), 'job_results')
+        os.makedirs(self.results_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def result_path(self, job_id):
+        return os.path.join(self.results_dir, f'{job_id}.json')
+
+    def submit(self, kind, params=None, max_attempts=None):
+        if kind not in _handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, params, status, max_attempts, run_after, created_at) '
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(params or {}), max_attempts or JOBS_MAX_ATTEMPTS, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return self._row(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def claim(self, worker):
+        """Atomically move the oldest runnable job to running, respecting the per-node cap"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND node = ?", (NODE,)
+                ).fetchone()[0]
+                if running >= JOBS_MAX_PER_NODE:
+                    conn.execute('COMMIT')
+                    return None
+                kinds = sorted(_handlers)
+                row = conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                    'heartbeat_at = ?, node = ?, worker = ?, error = NULL '
+                    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                    f"AND kind IN ({', '.join('?' * len(kinds))}) "
+                    'ORDER BY created_at LIMIT 1) RETURNING *',
+                    (now, now, NODE, worker, now, *kinds),
+                ).fetchone()
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return self._row(row)
+
+    def heartbeat(self, job_id):
+        """Refresh the heartbeat; returns True if cancellation was requested"""
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job_id))
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id, status, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?',
+                (status, time.time(), error, job_id),
+            )
+
+    def retry_or_fail(self, job, error):
+        if job['attempts'] < job['max_attempts']:
+            backoff = min(300, 2 ** job['attempts'])
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', run_after = ?, error = ? WHERE id = ?",
+                    (time.time() + backoff, error, job['id']),
+                )
+            return 'queued'
+        self.finish(job['id'], 'failed', error)
+        return 'failed'
+
+    def cancel(self, job_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1 "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+        return self.get(job_id)
+
+    def requeue_stale(self):
+        """Give jobs of crashed workers back to the queue"""
+        cutoff = time.time() - JOBS_STALE_SECONDS
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, error = 'worker lost' "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (time.time(), cutoff),
+            ).rowcount
+
+
+# ========== WORKER ==========
+class JobContext:
+    """Handed to handlers so long jobs can heartbeat and honour cancellation"""
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job = job
+        self.id = job['id']
+        self._last_beat = time.monotonic()
+
+    def check_cancelled(self):
+        if time.monotonic() - self._last_beat >= 1:
+            self._last_beat = time.monotonic()
+            if self.store.heartbeat(self.id):
+                raise JobCancelled()
+
+
+def run_job(store, job):
+    fn = _handlers.get(job['kind'])
+    if fn is None:
+        store.finish(job['id'], 'failed', f"No handler for kind '{job['kind']}' in this worker")
+        return 'failed'
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            store.heartbeat(job['id'])
+
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        result = fn(job['params'], JobContext(store, job))
+        tmp_path = store.result_path(job['id']) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'id': job['id'], 'kind': job['kind'], 'result': result}, f, default=str)
+        os.replace(tmp_path, store.result_path(job['id']))
+        store.finish(job['id'], 'succeeded')
+        return 'succeeded'
+    except JobCancelled:
+        store.finish(job['id'], 'cancelled')
+        return 'cancelled'
+    except JobRejected as e:
+        store.finish(job['id'], 'failed', f'Rejected: {e}')
+        return 'failed'
+    except Exception as e:
+        traceback.print_exc()
+        return store.retry_or_fail(job, f'{type(e).__name__}: {str(e)[:500]}')
+    finally:
+        stop.set()
+
+
+def worker_loop(store, name, stop_event):
+    while not stop_event.is_set():
+        job = store.claim(name)
+        if job is None:
+            stop_event.wait(POLL_SECONDS)
+            continue
+        print(f"▶ {name}: {job['kind']} {job['id']} (attempt {job['attempts']})")
+        status = run_job(store, job)
+        print(f"■ {name}: {job['id']} -> {status}")
+
+
+def start_workers(store, concurrency, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    threads = []
+    for i in range(concurrency):
+        name = f'{NODE}:{os.getpid()}:{i}'
+        thread = threading.Thread(target=worker_loop, args=(store, name, stop_event), name=name, daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads, stop_event
+
+
+def requeue_loop(store, stop_event):
+    """Every JOBS_STALE_SECONDS/4, requeue running jobs whose worker stopped heartbeating"""
+    while not stop_event.is_set():
+        requeued = store.requeue_stale()
+        if requeued:
+            print(f'↻ Requeued {requeued} stale job(s)')
+        stop_event.wait(JOBS_STALE_SECONDS / 4)
+
+
+# ========== BUILT-IN HANDLERS ==========
+@handler('list_tables')
+def list_tables_job(params, job):
+    import azure_driver
+    conn = azure_driver.connect(**({'database': params['database']} if params.get('database') else {}))
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT TABLE_NAME
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_TYPE = 'BASE TABLE'
+            ORDER BY TABLE_NAME
+        """)
+        tables = [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    return {'tables': tables, 'count': len(tables)}
+
+
+# ========== HTTP API ==========
+def _job_json(job):
+    job = dict(job)
+    job['result_url'] = f"/api/jobs/{job['id']}/result" if job['status'] == 'succeeded' else None
+    return job
+
+
+def submit_response(store, kind, params=None):
+    """202 response for endpoints that offer ?async=1"""
+    job = store.submit(kind, params)
+    return jsonify({'job': _job_json(job), 'status_url': f"/api/jobs/{job['id']}"}), 202
+
+
+def wants_async():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def init_app(app, store=None):
+    """Add the /api/jobs routes; JOBS_EMBEDDED_WORKERS>0 also runs workers in-process"""
+    store = store or JobStore()
+    app.extensions['jobs'] = store
+
+    @app.route('/api/jobs', methods=['POST'])
+    @admin_required
+    def submit_job():
+        data = request.get_json(silent=True) or {}
+        try:
+            job = store.submit(data.get('kind', ''), data.get('params'), data.get('max_attempts'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'kinds': sorted(_handlers)}), 400
+        return jsonify({'job': _job_json(job), 'status_url': f"/api/jobs/{job['id']}"}), 202
+
+    @app.route('/api/jobs/<job_id>')
+    @admin_required
+    def job_status(job_id):
+        job = store.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(_job_json(job))
+
+    @app.route('/api/jobs/<job_id>/result')
+    @admin_required
+    def job_result(job_id):
+        job = store.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] != 'succeeded':
+            return jsonify({'error': f"Job is {job['status']}", 'job': _job_json(job)}), 409
+        return send_file(os.path.abspath(store.result_path(job_id)), mimetype='application/json',
+                         as_attachment=request.args.get('download') == '1',
+                         download_name=f'{job_id}.json')
+
+    @app.route('/api/jobs/<job_id>', methods=['DELETE'])
+    @admin_required
+    def cancel_job(job_id):
+        job = store.cancel(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(_job_json(job))
+
+    embedded = int(os.environ.get('JOBS_EMBEDDED_WORKERS', '0'))
+    if embedded:
+        _, stop_event = start_workers(store, embedded)
+        # Jobs a crashed process left running are requeued here too, not only by `jobs.py worker`
+        threading.Thread(target=requeue_loop, args=(store, stop_event), name='jobs-requeue', daemon=True).start()
+    return store
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FSEB job worker')
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker = sub.add_parser('worker', help='Run a worker pool')
+    worker.add_argument('--app', action='append', default=[],
+                        help='Module(s) to import so their @jobs.handler functions register')
+    worker.add_argument('--concurrency', type=int, default=JOBS_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    for module in args.app:
+        importlib.import_module(module)
+
+    store = JobStore()
+    threads, stop_event = start_workers(store, args.concurrency)
+    print(f"✅ Job worker on {NODE}: {args.concurrency} threads, kinds: {', '.join(sorted(_handlers))}")
+    try:
+        requeue_loop(store, stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=5)
+    return 0
+
+
+if __name__ == '__main__':
+    # Make `jobs.handler` registrations from --app modules land in this module, not __main__
+    sys.modules.setdefault('jobs', sys.modules[__name__])
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# live_events.py - Server-sent events push for dashboards
+#
+# One in-process fan-out Hub per worker process: events published in one
+# process (another gunicorn worker, a CLI command, the jobs runner) never
+# reach streams held by another. Item changes are collected in
+# SQLAlchemy after_flush and published from after_commit (rolled back work
+# never reaches a browser); database health is watched by a single monitor
+# thread that only publishes when the state changes. Browsers subscribe with
+#   new EventSource('/api/events')
+#
+# Each idle subscriber is just a small queue plus a parked generator, so under
+# an async worker (gunicorn -k gevent --worker-connections 2000) a worker can
+# hold thousands of open dashboards. Sync and gthread workers spend one thread
+# per stream, so each worker caps its open streams (EVENTS_MAX_STREAMS, default
+# from the serving preset, see serving.max_event_streams) and answers 503 with
+# Retry-After beyond that instead of starving ordinary requests.
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import Response, jsonify
+from sqlalchemy import event
+
+import serving
+
+HEARTBEAT_SECONDS = 15
+HEALTH_INTERVAL_SECONDS = 10
+MAX_QUEUED_EVENTS = 256
+STREAMS_RETRY_AFTER_SECONDS = 30
+
+
+def _max_streams():
+    value = os.environ.get('EVENTS_MAX_STREAMS')
+    if value:
+        return int(value)
+    try:
+        return serving.max_event_streams()
+    except ValueError:  # bad SERVING_PRESET: serving.py reports it at startup
+        return serving.max_event_streams('gthread')
+
+
+MAX_STREAMS = _max_streams()
+
+
+class Subscription:
+    def __init__(self, user_id, max_events):
+        self.user_id = user_id
+        self.events = deque(maxlen=max_events)
+        self.overflowed = False
+        self.ready = threading.Event()
+
+    def push(self, payload):
+        if len(self.events) == self.events.maxlen:
+            # Slow client: drop backlog and tell it to refetch
+            self.events.clear()
+            self.overflowed = True
+        self.events.append(payload)
+        self.ready.set()
+
+    def drain(self, timeout):
+        """Wait up to `timeout` seconds, then return queued events (oldest first)"""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            self.events.clear()
+            return [('resync', {})]
+        drained = []
+        while self.events:
+            drained.append(self.events.popleft())
+        return drained
+
+
+class Hub:
+    """Fan-out of (event, data) pairs to subscribed streams"""
+
+    def __init__(self, max_events=MAX_QUEUED_EVENTS, max_streams=MAX_STREAMS):
+        self.max_events = max_events
+        self.max_streams = max_streams
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.published = 0
+        self.refused = 0
+
+    def subscribe(self, user_id=None):
+        """New subscription, or None when this worker already holds max_streams"""
+        subscription = Subscription(user_id, self.max_events)
+        with self.lock:
+            if len(self.subscribers) >= self.max_streams:
+                self.refused += 1
+                return None
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event_name, data, user_id=None):
+        """user_id=None broadcasts; otherwise only that user's streams receive it"""
+        with self.lock:
+            targets = [s for s in self.subscribers if user_id is None or s.user_id == user_id]
+            self.published += 1
+        for subscription in targets:
+            subscription.push((event_name, data))
+
+    def stats(self):
+        with self.lock:
+            return {'subscribers': len(self.subscribers), 'max_streams': self.max_streams,
+                    'published': self.published, 'refused': self.refused}
+
+
+hub = Hub()
+
+
+def format_event(event_name, data):
+    return f'event: {event_name}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream(subscription, initial=()):
+    """Generator for one text/event-stream response"""
+    try:
+        yield 'retry: 5000\n\n'
+        for event_name, data in initial:
+            yield format_event(event_name, data)
+        while True:
+            events = subscription.drain(HEARTBEAT_SECONDS)
+            if not events:
+                yield ': ping\n\n'
+            for event_name, data in events:
+                yield format_event(event_name, data)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def event_response(user_id=None, initial=()):
+    subscription = hub.subscribe(user_id)
+    if subscription is None:
+        response = jsonify({'error': 'Too many live streams on this worker, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAMS_RETRY_AFTER_SECONDS)
+        return response
+    # Deliberately no stream_with_context: the request context (and its DB
+    # session/connection) is torn down as soon as the stream starts
+    response = Response(stream(subscription, initial), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ========== SQLALCHEMY HOOKS ==========
+def _after_flush(session, flush_context, model):
+    pending = session.info.setdefault('live_events', [])
+    for obj in session.new:
+        if isinstance(obj, model):
+            pending.append(('item', {'op': 'created', 'item': obj.to_dict()}, obj.user_id))
+    for obj in session.dirty:
+        if isinstance(obj, model) and session.is_modified(obj, include_collections=False):
+            pending.append(('item', {'op': 'updated', 'item': obj.to_dict()}, obj.user_id))
+    for obj in session.deleted:
+        if isinstance(obj, model):
+            pending.append(('item', {'op': 'deleted', 'id': obj.id}, obj.user_id))
+
+
+def _after_commit(session):
+    for event_name, data, user_id in session.info.pop('live_events', []):
+        hub.publish(event_name, data, user_id=user_id)
+
+
+def _after_rollback(session):
+    session.info.pop('live_events', None)
+
+
+# ========== HEALTH MONITOR ==========
+class HealthMonitor:
+    """One thread per worker; probes only while someone is listening"""
+
+    def __init__(self, app, check):
+        self.app = app
+        self.check = check
+        self.state = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def current(self):
+        return {'database': self.state, 'checked_at': time.time()}
+
+    def ensure_running(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            if hub.stats()['subscribers']:
+                with self.app.app_context():
+                    state = 'connected' if self.check() else 'disconnected'
+                if state != self.state:
+                    self.state = state
+                    hub.publish('health', self.current())
+            time.sleep(HEALTH_INTERVAL_SECONDS)
+
+
+def init_app(app, db, Item, health_check):
+    """Hook item commits into the hub and return the health monitor"""
+    event.listen(db.session, 'after_flush', lambda s, ctx: _after_flush(s, ctx, Item))
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_soft_rollback', lambda s, prev: _after_rollback(s))
+    return HealthMonitor(app, health_check)
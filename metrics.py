@@ -0,0 +1,72 @@
+# metrics.py - In-process counters and GET /api/metrics
+#
+#   metrics.incr('singleflight.shared', group='query')
+#   metrics.register('ratelimit', lambda: ratelimit.stats)   (computed on read)
+#
+# Counters are per worker process; scrape every worker (or sum them) when
+# running several. ?format=prometheus returns the text exposition format.
+import threading
+import time
+
+from flask import Response, jsonify, request
+
+_lock = threading.Lock()
+_counters = {}
+_collectors = {}
+_started = time.time()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def incr(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def value(name, **labels):
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def register(name, collector):
+    """collector() -> {metric: number}, reported under `name.`"""
+    _collectors[name] = collector
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+    result = {}
+    for (name, labels), count in sorted(counters.items()):
+        label = ','.join(f'{k}={v}' for k, v in labels)
+        result[f'{name}{{{label}}}' if label else name] = count
+    for prefix, collector in _collectors.items():
+        for name, count in collector().items():
+            result[f'{prefix}.{name}'] = count
+    return result
+
+
+def prometheus():
+    with _lock:
+        counters = dict(_counters)
+    lines = []
+    for (name, labels), count in sorted(counters.items()):
+        label = ','.join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"fseb_{name.replace('.', '_')}{{{label}}} {count}")
+    for prefix, collector in _collectors.items():
+        for name, count in collector().items():
+            lines.append(f"fseb_{prefix}_{name}".replace('.', '_') + f' {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Add GET /api/metrics"""
+
+    @app.route('/api/metrics')
+    def metrics():
+        if request.args.get('format') == 'prometheus':
+            return Response(prometheus(), mimetype='text/plain; version=0.0.4')
+        return jsonify({'uptime_seconds': round(time.time() - _started, 1), 'metrics': snapshot()})
@@ -0,0 +1,272 @@
+# plancapture.py - Execution plans for slow proxy queries
+#
+# Every proxied statement is recorded by fingerprint (literals replaced by ?,
+# whitespace and case folded) with call count, total/max time and rows.
+# Statements slower than PLAN_THRESHOLD_MS also get their plan captured on a
+# separate connection:
+#
+#   PLAN_MODE=estimated  (default) SET SHOWPLAN_XML ON: compiled, not executed
+#   PLAN_MODE=actual     SET STATISTICS XML ON: executes the read again, inside
+#                        a transaction that is always rolled back, and returns
+#                        the plan with actual row counts. Only statements
+#                        singleflight.is_read_only() accepts are re-executed;
+#                        anything else gets an estimated plan.
+#   stand-in             EXPLAIN QUERY PLAN from SQLite
+#
+# All of it happens on one background thread fed by a bounded queue, so a
+# slow query never gets slower. Plans live in a SQLite ring buffer
+# (PLAN_STORE, newest PLAN_RING_SIZE kept); a fingerprint is re-captured at
+# most every PLAN_RECAPTURE_SECONDS. Browse with init_app()'s admin routes:
+#
+#   GET /admin/plans?top=20&order=total|max|calls|avg
+#   GET /admin/plans/<fingerprint>
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from flask import jsonify, request
+
+import admin
+import singleflight
+
+PLAN_THRESHOLD_MS = float(os.environ.get('PLAN_THRESHOLD_MS', '1000'))
+PLAN_MODE = os.environ.get('PLAN_MODE', 'estimated')
+PLAN_STORE = os.environ.get('PLAN_STORE', os.path.join('instance', 'plans.db'))
+PLAN_RING_SIZE = int(os.environ.get('PLAN_RING_SIZE', '500'))
+PLAN_RECAPTURE_SECONDS = float(os.environ.get('PLAN_RECAPTURE_SECONDS', '300'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_stats (
+    fingerprint TEXT PRIMARY KEY,
+    sql_text TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    total_ms REAL NOT NULL,
+    max_ms REAL NOT NULL,
+    last_ms REAL NOT NULL,
+    total_rows INTEGER NOT NULL,
+    slow_calls INTEGER NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    elapsed_ms REAL NOT NULL,
+    row_count INTEGER,
+    plan_format TEXT NOT NULL,
+    plan TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_plans_fingerprint ON plans (fingerprint, id);
+"""
+
+_LITERALS = re.compile(r"N?'(?:[^']|'')*'|\b0x[0-9a-f]+\b|\b\d+(?:\.\d+)?\b", re.IGNORECASE)
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals as ?, IN lists collapsed, whitespace and case folded"""
+    text = _LITERALS.sub('?', sql)
+    text = _IN_LIST.sub('(?)', text)
+    return _SPACE.sub(' ', text).strip().rstrip(';').strip().lower()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+# ========== STORE ==========
+class PlanStore:
+    def __init__(self, path=PLAN_STORE, ring_size=PLAN_RING_SIZE):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ring_size = ring_size
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def record(self, fp, sql, elapsed_ms, rows, slow):
+        with self.lock:
+            self.db.execute(
+                """INSERT INTO query_stats VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(fingerprint) DO UPDATE SET
+                     calls = calls + 1, total_ms = total_ms + excluded.total_ms,
+                     max_ms = MAX(max_ms, excluded.max_ms), last_ms = excluded.last_ms,
+                     total_rows = total_rows + excluded.total_rows,
+                     slow_calls = slow_calls + excluded.slow_calls, last_seen = excluded.last_seen""",
+                (fp, normalize(sql), elapsed_ms, elapsed_ms, elapsed_ms, rows or 0, int(slow), time.time()),
+            )
+
+    def last_capture(self, fp):
+        with self.lock:
+            row = self.db.execute('SELECT MAX(captured_at) FROM plans WHERE fingerprint = ?', (fp,)).fetchone()
+        return row[0] or 0
+
+    def add_plan(self, fp, elapsed_ms, rows, plan_format, plan):
+        with self.lock:
+            cursor = self.db.execute(
+                'INSERT INTO plans (fingerprint, captured_at, elapsed_ms, row_count, plan_format, plan) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (fp, time.time(), elapsed_ms, rows, plan_format, plan))
+            # Ring buffer: keep the newest ring_size plans
+            self.db.execute('DELETE FROM plans WHERE id <= ?', (cursor.lastrowid - self.ring_size,))
+
+    def top(self, order='total', limit=20):
+        column = {'total': 'total_ms', 'max': 'max_ms', 'calls': 'calls', 'avg': 'total_ms / calls'}[order]
+        with self.lock:
+            rows = self.db.execute(
+                f"""SELECT s.*, (SELECT COUNT(*) FROM plans p WHERE p.fingerprint = s.fingerprint)
+                    FROM query_stats s ORDER BY {column} DESC LIMIT ?""", (limit,)).fetchall()
+        return [self._stats(row) for row in rows]
+
+    def get(self, fp, plans=5):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT s.*, (SELECT COUNT(*) FROM plans p WHERE p.fingerprint = s.fingerprint) '
+                'FROM query_stats s WHERE fingerprint = ?', (fp,)).fetchone()
+            captured = self.db.execute(
+                'SELECT id, captured_at, elapsed_ms, row_count, plan_format, plan FROM plans '
+                'WHERE fingerprint = ? ORDER BY id DESC LIMIT ?', (fp, plans)).fetchall()
+        if row is None:
+            return None
+        result = self._stats(row)
+        result['plans'] = [
+            {'id': p[0], 'captured_at': p[1], 'elapsed_ms': round(p[2], 1), 'rows': p[3],
+             'format': p[4], 'plan': p[5]}
+            for p in captured
+        ]
+        return result
+
+    @staticmethod
+    def _stats(row):
+        fp, sql, calls, total, worst, last, rows, slow, seen, plans = row
+        return {
+            'fingerprint': fp,
+            'sql': sql,
+            'calls': calls,
+            'total_ms': round(total, 1),
+            'avg_ms': round(total / calls, 1),
+            'max_ms': round(worst, 1),
+            'last_ms': round(last, 1),
+            'avg_rows': round(rows / calls, 1),
+            'slow_calls': slow,
+            'last_seen': seen,
+            'plans': plans,
+        }
+
+
+# ========== CAPTURE ==========
+def explain(connect, sql, standin, mode=PLAN_MODE):
+    """(format, plan text) for sql on a fresh connection"""
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        if standin:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            lines = [f'{row[0]}|{row[1]}| {row[-1]}' for row in cursor.fetchall()]
+            return 'sqlite-eqp', '\n'.join(lines)
+        if mode == 'actual' and singleflight.is_read_only(sql):
+            cursor.execute('BEGIN TRANSACTION')
+            try:
+                cursor.execute('SET STATISTICS XML ON')
+                cursor.execute(sql)
+                plan = None
+                # The plan arrives as an extra one-row result set after the query's own
+                while True:
+                    try:
+                        rows = cursor.fetchall()
+                    except Exception:
+                        rows = []
+                    if rows and isinstance(rows[-1][0], str) and rows[-1][0].lstrip().startswith('<ShowPlanXML'):
+                        plan = rows[-1][0]
+                    if not cursor.nextset():
+                        break
+                cursor.execute('SET STATISTICS XML OFF')
+            finally:
+                # Whatever the statement did (it should have done nothing) is undone
+                cursor.execute('IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION')
+            return 'showplan-xml-actual', plan
+        cursor.execute('SET SHOWPLAN_XML ON')
+        cursor.execute(sql)
+        plan = cursor.fetchone()[0]
+        cursor.execute('SET SHOWPLAN_XML OFF')
+        return 'showplan-xml', plan
+    finally:
+        conn.close()
+
+
+class Capturer:
+    """Background recorder: observe() never blocks the request"""
+
+    def __init__(self, store, connect, standin, threshold_ms=PLAN_THRESHOLD_MS, max_pending=1000):
+        self.store = store
+        self.connect = connect
+        self.standin = standin
+        self.threshold_ms = threshold_ms
+        self.pending = queue.Queue(max_pending)
+        self.dropped = 0
+        self.errors = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def observe(self, sql, elapsed_ms, rows=None, read_only=True):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='plan-capture', daemon=True)
+                self.thread.start()
+        try:
+            self.pending.put_nowait((sql, elapsed_ms, rows, read_only))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            sql, elapsed_ms, rows, read_only = self.pending.get()
+            fp = fingerprint(sql)
+            slow = elapsed_ms >= self.threshold_ms
+            try:
+                self.store.record(fp, sql, elapsed_ms, rows, slow)
+                # Plans only for reads, re-checked here rather than trusting the caller:
+                # a SHOWPLAN is harmless, but PLAN_MODE=actual re-executes
+                if slow and read_only and singleflight.is_read_only(sql) and time.time() - self.store.last_capture(fp) >= PLAN_RECAPTURE_SECONDS:
+                    plan_format, plan = explain(self.connect, sql, self.standin)
+                    self.store.add_plan(fp, elapsed_ms, rows, plan_format, plan)
+            except Exception as e:
+                self.errors += 1
+                print(f'⚠ Plan capture failed for {fp}: {e}')
+
+    def stats(self):
+        return {'pending': self.pending.qsize(), 'dropped': self.dropped, 'errors': self.errors}
+
+
+def init_app(app, connect, standin=False, store=None):
+    """Add the /admin/plans routes and return the Capturer"""
+    capturer = Capturer(store or PlanStore(), connect, standin)
+
+    @app.route('/admin/plans')
+    @admin.admin_required
+    def admin_plans():
+        order = request.args.get('order', 'total')
+        if order not in ('total', 'max', 'calls', 'avg'):
+            return jsonify({'error': 'order must be total, max, calls or avg'}), 400
+        limit = max(1, min(int(request.args.get('top', 20)), 200))
+        return jsonify({
+            'order': order,
+            'threshold_ms': capturer.threshold_ms,
+            'capture': capturer.stats(),
+            'queries': capturer.store.top(order, limit),
+        })
+
+    @app.route('/admin/plans/<fp>')
+    @admin.admin_required
+    def admin_plan(fp):
+        result = capturer.store.get(fp, plans=int(request.args.get('plans', 5)))
+        if result is None:
+            return jsonify({'error': 'Unknown fingerprint'}), 404
+        return jsonify(result)
+
+    return capturer
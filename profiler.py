@@ -0,0 +1,216 @@
+# profiler.py - On-demand CPU sampling and tracemalloc snapshots (admin only)
+#
+#   POST /admin/profile?seconds=10&interval_ms=10
+#        samples every thread's stack for N seconds and returns collapsed
+#        stacks ("thread;file:func;file:func count" per line), ready for
+#        flamegraph.pl or speedscope. ?format=json gives the same as JSON.
+#   POST /admin/memory/snapshot        start tracemalloc if needed, keep a snapshot
+#   GET  /admin/memory/diff?from=1&to=2 top allocation growth between snapshots
+#                                       (to defaults to a fresh one)
+#   POST /admin/memory/stop            stop tracemalloc, drop the snapshots
+#
+# Both are per worker process (the pid is in every response). The sampler is
+# a plain thread reading sys._current_frames(), so nothing is installed into
+# the interpreter and the other threads are never paused beyond the GIL
+# switch; one profile runs at a time and PROFILE_MAX_SECONDS caps it.
+# tracemalloc only runs between the first snapshot and /stop, since it slows
+# allocation while on.
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from flask import Response, jsonify, request
+
+import admin
+
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '30'))
+PROFILE_MAX_DEPTH = int(os.environ.get('PROFILE_MAX_DEPTH', '64'))
+TRACEMALLOC_FRAMES = int(os.environ.get('TRACEMALLOC_FRAMES', '10'))
+MAX_SNAPSHOTS = int(os.environ.get('MAX_MEMORY_SNAPSHOTS', '4'))
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_snapshots = collections.OrderedDict()
+_next_snapshot = [1]
+
+
+# ========== CPU ==========
+def _frame_label(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def sample(seconds, interval=0.01, include_idle=False):
+    """Counter of (thread name, frame labels root->leaf) over `seconds`"""
+    stacks = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    samples = 0
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            # Threads parked in a wait are not burning CPU; skip them unless asked
+            if not include_idle and labels and labels[0].split(':')[1] in ('wait', 'select', 'poll', 'accept', 'get'):
+                continue
+            labels.reverse()
+            stacks[(names.get(ident, str(ident)),) + tuple(labels)] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def collapsed(stacks):
+    return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()) + '\n'
+
+
+# ========== MEMORY ==========
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def take_snapshot():
+    """(id, snapshot); the oldest is dropped beyond MAX_SNAPSHOTS, possibly before the caller reads it back"""
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        snapshot_id = _next_snapshot[0]
+        _next_snapshot[0] += 1
+        _snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+        return snapshot_id, snapshot
+
+
+def _top_arg(default):
+    """?top= as a positive int; raises ValueError"""
+    top = int(request.args.get('top', default))
+    if top < 1:
+        raise ValueError(top)
+    return top
+
+
+def _stat(stat, key_type):
+    frames = stat.traceback if key_type == 'traceback' else stat.traceback[:1]
+    return {
+        'where': [f'{os.path.basename(f.filename)}:{f.lineno}' for f in frames],
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count,
+        **({'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff}
+           if hasattr(stat, 'size_diff') else {}),
+    }
+
+
+def stop_tracing():
+    with _memory_lock:
+        _snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+# ========== WIRING ==========
+def init_app(app):
+    """Add the /admin/profile and /admin/memory/* routes"""
+
+    @app.route('/admin/profile', methods=['POST'])
+    @admin.admin_required
+    def admin_profile():
+        try:
+            seconds = float(request.args.get('seconds', 10))
+            interval_ms = float(request.args.get('interval_ms', 10))
+        except ValueError:
+            return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+        if not 0 < seconds <= PROFILE_MAX_SECONDS or interval_ms < 1:
+            return jsonify({'error': f'seconds must be in (0, {PROFILE_MAX_SECONDS}], interval_ms >= 1'}), 400
+        if not _profile_lock.acquire(blocking=False):
+            return jsonify({'error': 'A profile is already running in this worker'}), 409
+        try:
+            started = time.perf_counter()
+            stacks, samples = sample(seconds, interval_ms / 1000.0, request.args.get('idle') in ('1', 'true'))
+            elapsed = time.perf_counter() - started
+        finally:
+            _profile_lock.release()
+
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'pid': os.getpid(),
+                'seconds': round(elapsed, 3),
+                'samples': samples,
+                'stacks': [{'stack': list(stack), 'count': count} for stack, count in stacks.most_common()],
+            })
+        response = Response(collapsed(stacks), mimetype='text/plain')
+        response.headers['X-Profile-Pid'] = str(os.getpid())
+        response.headers['X-Profile-Samples'] = str(samples)
+        return response
+
+    @app.route('/admin/memory/snapshot', methods=['POST'])
+    @admin.admin_required
+    def admin_memory_snapshot():
+        try:
+            top = _top_arg(20)
+        except ValueError:
+            return jsonify({'error': 'top must be a positive integer'}), 400
+        snapshot_id, snapshot = take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        top = snapshot.statistics('lineno')[:top]
+        with _memory_lock:
+            snapshot_ids = list(_snapshots)
+        return jsonify({
+            'pid': os.getpid(),
+            'id': snapshot_id,
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'snapshots': snapshot_ids,
+            'top': [_stat(s, 'lineno') for s in top],
+        })
+
+    @app.route('/admin/memory/diff')
+    @admin.admin_required
+    def admin_memory_diff():
+        key_type = request.args.get('key', 'lineno')
+        if key_type not in ('lineno', 'traceback', 'filename'):
+            return jsonify({'error': 'key must be lineno, traceback or filename'}), 400
+        try:
+            first = int(request.args['from'])
+            second = int(request.args['to']) if request.args.get('to') else None
+            top = _top_arg(30)
+        except (KeyError, ValueError):
+            return jsonify({'error': 'from (and optional to) must be snapshot ids, top a positive integer'}), 400
+        new = None
+        if second is None:
+            # Use the object itself: a concurrent snapshot may already have evicted it
+            second, new = take_snapshot()
+            t2 = time.time()
+        with _memory_lock:
+            if first not in _snapshots or (new is None and second not in _snapshots):
+                return jsonify({'error': 'Unknown snapshot in this worker', 'snapshots': list(_snapshots)}), 404
+            t1, old = _snapshots[first]
+            if new is None:
+                t2, new = _snapshots[second]
+        stats = new.compare_to(old, key_type)
+        return jsonify({
+            'pid': os.getpid(),
+            'from': first,
+            'to': second,
+            'seconds_apart': round(t2 - t1, 1),
+            'size_diff_kb': round(sum(s.size_diff for s in stats) / 1024, 1),
+            'top': [_stat(s, key_type) for s in stats[:top]],
+        })
+
+    @app.route('/admin/memory/stop', methods=['POST'])
+    @admin.admin_required
+    def admin_memory_stop():
+        stop_tracing()
+        return jsonify({'pid': os.getpid(), 'tracing': False})
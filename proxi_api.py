@@ -1,24 +1,150 @@
 # proxy_api.py (deploy on Railway)
-from flask import Flask, jsonify, request
-import pymssql
+from flask import Flask, Response, jsonify, request
+import azure_driver
+import colformat
+import fanout
+import jobs
+import metrics
+import plancapture
+import profiler
+import os
+import ratelimit
+import shmcache
+import singleflight
+import time
+import traffic
 
 app = Flask(__name__)
+# TRAFFIC_CAPTURE=1: sanitised request log for `python traffic.py replay` (registered first so every request is timed)
+traffic.init_app(app)
+# Full-result reads can run as background jobs: POST /api/query?async=1 (poll /api/jobs/<id> with X-Admin-Token)
+job_store = jobs.init_app(app)
+# GET /api/metrics: coalescing and rate-limit counters
+metrics.init_app(app)
+metrics.register('ratelimit', lambda: dict(ratelimit.stats))
+# Per-fingerprint timings, plans for slow reads: GET /admin/plans (ADMIN_TOKEN)
+plans = plancapture.init_app(app, azure_driver.connect, standin=azure_driver.is_standin())
+metrics.register('plancapture', plans.stats)
+
+# Admin-only CPU profile and tracemalloc snapshots
+profiler.init_app(app)
+
+# Health and table lists are probed by one worker per node and shared (GET /admin/shmcache)
+shmcache.init_app(app)
+HEALTH_CACHE_SECONDS = float(os.environ.get('HEALTH_CACHE_SECONDS', '10'))
+CATALOG_CACHE_SECONDS = float(os.environ.get('CATALOG_CACHE_SECONDS', '300'))
+FAILURE_CACHE_SECONDS = float(os.environ.get('FAILURE_CACHE_SECONDS', '2'))
+
+@jobs.handler('proxy_query')
+def proxy_query_job(params, job):
+    # POST /api/jobs is admin-only, but the SQL is still validated here, where it runs
+    if not singleflight.is_read_only(params.get('sql')):
+        raise jobs.JobRejected('proxy_query jobs only run read-only statements')
+    conn = azure_driver.connect(**({'database': params['database']} if params.get('database') else {}))
+    try:
+        cursor = conn.cursor()
+        cursor.execute(params['sql'])
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        rows = []
+        while True:
+            batch = cursor.fetchmany(5000)
+            if not batch:
+                break
+            rows.extend(list(row) for row in batch)
+            job.check_cancelled()
+    finally:
+        conn.close()
+    return {'columns': columns, 'results': rows, 'row_count': len(rows)}
 
 @app.route('/api/query', methods=['POST'])
+@ratelimit.limit('query', client='120/minute', global_='50/second', max_concurrent=8, max_queue_ms=500)
 def query():
     # This runs on Railway (can connect to Azure SQL)
     sql = request.json.get('sql')
     
-    conn = pymssql.connect(
-        server='fseb.database.windows.net',
-        database='fseb',
-        user='fseb_admin',
-        password='Welcome1'
-    )
+    # "databases" / "database_set": same query on several databases in parallel
+    if request.json.get('databases') is not None or request.json.get('database_set') is not None:
+        return fanout_query(request.json, sql)
+    
+    if jobs.wants_async():
+        # Background pulls are for big reads only; the job re-checks before executing
+        if not singleflight.is_read_only(sql):
+            return jsonify({'error': 'async queries must be read-only'}), 400
+        return jobs.submit_response(job_store, 'proxy_query', {'sql': sql})
     
-    cursor = conn.cursor()
-    cursor.execute(sql)
-    results = cursor.fetchall()
-    conn.close()
+    def run():
+        conn = azure_driver.connect()
+        
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        cursor.execute(sql)
+        columns = [column[0] for column in cursor.description or []]
+        results = cursor.fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        conn.close()
+        plans.observe(sql, elapsed_ms, len(results), read_only=singleflight.is_read_only(sql))
+        return columns, results
+    
+    # Identical reads in flight at the same time share one execution
+    if singleflight.is_read_only(sql):
+        (columns, results), _ = singleflight.do('query', [azure_driver.AZURE_CONNECTION['database'], sql], run)
+    else:
+        columns, results = run()
+    
+    # JSON by default; columnar/msgpack/Arrow when the Accept header asks for it
+    return colformat.response(columns, results)
+
+
+def fanout_query(data, sql):
+    if not singleflight.is_read_only(sql):
+        return jsonify({'error': 'Fan-out queries must be read-only'}), 400
+    if jobs.wants_async():
+        return jsonify({'error': 'async is not supported for fan-out queries'}), 400
+    try:
+        databases = fanout.resolve(data.get('databases'), data.get('database_set'))
+        result = fanout.FanOut(databases, sql, merge_on=data.get('merge_on'), descending=bool(data.get('desc')))
+    except fanout.FanOutError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({'results': results})
\ No newline at end of file
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return Response(fanout.ndjson(result), mimetype='application/x-ndjson')
+    
+    rows = list(result.rows())
+    # Partial failures still answer 200 with the per-database report; only "all failed" is an error
+    status = 502 if len(result.failed) == len(databases) else 200
+    return colformat.response(result.columns, rows, meta={'databases': result.report()}, status=status)
+
+
+def check_database():
+    try:
+        conn = azure_driver.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        finally:
+            conn.close()
+        return {'database': 'connected'}
+    except Exception as e:
+        return {'database': 'error', 'error': str(e)}
+
+
+@app.route('/api/health')
+def health():
+    result = shmcache.get(f"proxy:health:{azure_driver.AZURE_CONNECTION['server']}", check_database,
+                          ttl=lambda r: HEALTH_CACHE_SECONDS if r['database'] == 'connected' else FAILURE_CACHE_SECONDS)
+    healthy = result['database'] == 'connected'
+    return jsonify(dict(result, status='healthy' if healthy else 'degraded')), 200 if healthy else 503
+
+
+@app.route('/api/tables')
+def tables():
+    database = request.args.get('database') or azure_driver.AZURE_CONNECTION['database']
+    if database not in fanout.ALLOWED_DATABASES:
+        return jsonify({'error': f'Database not allowed: {database}'}), 400
+    try:
+        result = shmcache.get(f'proxy:tables:{database}',
+                              lambda: jobs.list_tables_job({'database': database}, None), ttl=CATALOG_CACHE_SECONDS)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    return jsonify(dict(result, database=database))
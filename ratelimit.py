@@ -0,0 +1,326 @@
+# ratelimit.py - Token-bucket rate limiting and load shedding
+#
+# Protects the expensive endpoints (password hashing in /api/auth/*, Azure
+# connections in /api/query) by refusing work *before* it starts:
+#
+#   429  the client (or everyone together) is over its token bucket
+#   503  the endpoint is saturated: a request would queue longer than
+#        max_queue_ms for a free slot (or already waited that long upstream,
+#        per the X-Request-Start header set by proxies)
+#
+# Bucket state backends (RATELIMIT_STORE):
+#   mmap     (default) fixed-slot table in an mmap'd file, shared by every
+#            gunicorn worker on the node, guarded by flock
+#   memory   per-process dict (used automatically where fcntl is missing)
+#   tcp://host:port  a bucket server shared by several nodes; a local
+#            stand-in is `python ratelimit.py serve --port 7379`
+#
+# Limits are "N/second|minute|hour" and can be overridden per scope, e.g.
+# RATELIMIT_LOGIN_CLIENT=5/minute  RATELIMIT_QUERY_GLOBAL=50/second
+#
+# Clients are keyed by IP. Behind a reverse proxy remote_addr is the proxy
+# itself, so every visitor would share one bucket: on PythonAnywhere, Railway
+# and Render (detected from their environment variables) the address the
+# platform proxy appended to X-Forwarded-For is used instead. Elsewhere set
+# RATELIMIT_TRUST_PROXY=1 only if a proxy you control sets that header, and
+# RATELIMIT_PROXY_HOPS to the number of proxies in front of the app.
+import argparse
+import functools
+import hashlib
+import mmap
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from flask import jsonify, request
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') != '0'
+RATELIMIT_STORE = os.environ.get('RATELIMIT_STORE', 'mmap')
+RATELIMIT_STATE = os.environ.get('RATELIMIT_STATE', os.path.join('instance', 'ratelimit.bin'))
+PLATFORM_PROXY_VARS = ('PYTHONANYWHERE_DOMAIN', 'PYTHONANYWHERE_SITE', 'RAILWAY_ENVIRONMENT',
+                       'RAILWAY_ENVIRONMENT_NAME', 'RENDER')
+BEHIND_PLATFORM_PROXY = any(os.environ.get(name) for name in PLATFORM_PROXY_VARS)
+RATELIMIT_TRUST_PROXY = os.environ.get('RATELIMIT_TRUST_PROXY', '1' if BEHIND_PLATFORM_PROXY else '0') == '1'
+RATELIMIT_PROXY_HOPS = max(1, int(os.environ.get('RATELIMIT_PROXY_HOPS', '1')))
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+stats = {'allowed': 0, 'limited': 0, 'shed': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def parse_limit(spec):
+    """'10/minute' -> (rate per second, burst)"""
+    if not spec:
+        return None
+    count, _, period = spec.partition('/')
+    count = float(count)
+    return count / PERIODS[period.strip() or 'second'], max(1.0, count)
+
+
+# ========== STORES ==========
+class MemoryStore:
+    """Per-process buckets"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, rate, burst, cost=1.0):
+        now = time.time()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class MmapStore:
+    """Buckets in a fixed-size open-addressing table shared through an mmap'd file
+
+    Slot layout (32 bytes): key hash u64, tokens f64, updated f64, padding.
+    A full probe window evicts the least recently updated bucket.
+    """
+
+    SLOT = struct.Struct('<Qdd8x')
+    PROBES = 8
+
+    def __init__(self, path, slots=8192):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size != size:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self.fd).st_size != size:
+                    os.ftruncate(self.fd, size)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, size)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key):
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def take(self, key, rate, burst, cost=1.0):
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        now = time.time()
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                chosen, tokens, updated, oldest = None, burst, now, None
+                for i in range(self.PROBES):
+                    index = (start + i) % self.slots
+                    slot_hash, slot_tokens, slot_updated = self.SLOT.unpack_from(self.map, index * self.SLOT.size)
+                    if slot_hash == key_hash:
+                        chosen, tokens, updated = index, slot_tokens, slot_updated
+                        break
+                    if slot_hash == 0 and chosen is None:
+                        chosen = index
+                    if oldest is None or slot_updated < oldest[1]:
+                        oldest = (index, slot_updated)
+                if chosen is None:
+                    chosen = oldest[0]
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self.SLOT.pack_into(self.map, chosen * self.SLOT.size, key_hash, tokens, now)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class RemoteStore:
+    """Client for the line-protocol bucket server (see `serve`)"""
+
+    def __init__(self, host, port, timeout=0.5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.local = threading.local()
+        self.fallback = MemoryStore()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = socket.create_connection(self.address, timeout=self.timeout)
+            self.local.conn = conn
+            self.local.reader = conn.makefile('r')
+        return conn
+
+    def take(self, key, rate, burst, cost=1.0):
+        try:
+            conn = self._conn()
+            conn.sendall(f'TAKE {key} {rate} {burst} {cost}\n'.encode())
+            allowed, wait = self.local.reader.readline().split()
+            return allowed == '1', float(wait)
+        except (OSError, ValueError):
+            # Never let the limiter take the site down: degrade to per-process buckets
+            self.local.conn = None
+            return self.fallback.take(key, rate, burst, cost)
+
+
+def serve(host='127.0.0.1', port=7379):
+    """Stand-in for a shared multi-node bucket store"""
+    store = MemoryStore()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                parts = line.decode().split()
+                if len(parts) != 5 or parts[0] != 'TAKE':
+                    self.wfile.write(b'ERR 0\n')
+                    continue
+                allowed, wait = store.take(parts[1], float(parts[2]), float(parts[3]), float(parts[4]))
+                self.wfile.write(f'{int(allowed)} {wait:.4f}\n'.encode())
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with Server((host, port), Handler) as server:
+        print(f'✅ Rate-limit store listening on {host}:{port}')
+        server.serve_forever()
+
+
+def make_store(spec=None):
+    spec = spec or RATELIMIT_STORE
+    if spec.startswith('tcp://'):
+        host, _, port = spec[len('tcp://'):].partition(':')
+        return RemoteStore(host, int(port or 7379))
+    if spec == 'mmap' and fcntl is not None:
+        return MmapStore(RATELIMIT_STATE)
+    return MemoryStore()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    # Opened lazily so each gunicorn worker maps the file after fork
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = make_store()
+    return _store
+
+
+def after_fork():
+    """Drop a store inherited from the parent: flock does not exclude processes sharing one open file"""
+    global _store
+    _store = None
+
+
+# ========== LOAD SHEDDING ==========
+class Shedder:
+    """At most max_concurrent requests run; others may queue for max_queue_ms, then get 503"""
+
+    def __init__(self, max_concurrent, max_queue_ms):
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_queue = max_queue_ms / 1000.0
+
+    def upstream_queue_seconds(self):
+        # X-Request-Start: t=<epoch seconds | ms | us>, set by nginx/Heroku-style routers
+        header = request.headers.get('X-Request-Start', '')
+        try:
+            value = float(header.replace('t=', ''))
+        except ValueError:
+            return 0.0
+        while value > 1e11:
+            value /= 1000.0
+        return max(0.0, time.time() - value)
+
+    def acquire(self):
+        budget = self.max_queue - self.upstream_queue_seconds()
+        if budget <= 0:
+            return False
+        return self.slots.acquire(timeout=budget)
+
+    def release(self):
+        self.slots.release()
+
+
+def client_id():
+    if RATELIMIT_TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+        # Each proxy appends the address it saw; entries left of ours are client-supplied
+        hops = [h.strip() for h in request.headers['X-Forwarded-For'].split(',') if h.strip()]
+        if hops:
+            return hops[-min(RATELIMIT_PROXY_HOPS, len(hops))]
+    return request.remote_addr or 'unknown'
+
+
+def _refuse(status, message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def limit(scope, client=None, global_=None, max_concurrent=None, max_queue_ms=250):
+    """Decorator: token buckets per client and per scope, plus concurrency-based shedding"""
+    env = scope.upper()
+    client = parse_limit(os.environ.get(f'RATELIMIT_{env}_CLIENT', client))
+    global_ = parse_limit(os.environ.get(f'RATELIMIT_{env}_GLOBAL', global_))
+    max_concurrent = int(os.environ.get(f'RATELIMIT_{env}_CONCURRENCY', max_concurrent or 0))
+    shedder = Shedder(max_concurrent, max_queue_ms) if max_concurrent else None
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if not RATELIMIT_ENABLED:
+                return view(*args, **kwargs)
+            store = get_store()
+            if client:
+                allowed, wait = store.take(f'{scope}:c:{client_id()}', *client)
+                if not allowed:
+                    _count('limited')
+                    return _refuse(429, 'Too many requests', wait)
+            if global_:
+                allowed, wait = store.take(f'{scope}:g', *global_)
+                if not allowed:
+                    _count('limited')
+                    return _refuse(429, 'Service is rate limited, retry shortly', wait)
+            if shedder and not shedder.acquire():
+                _count('shed')
+                return _refuse(503, 'Server busy, retry shortly', 1)
+            _count('allowed')
+            try:
+                return view(*args, **kwargs)
+            finally:
+                if shedder:
+                    shedder.release()
+        return wrapped
+    return decorator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rate-limit bucket store stand-in')
+    sub = parser.add_subparsers(dest='command', required=True)
+    server = sub.add_parser('serve')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=7379)
+    args = parser.parse_args()
+    sys.exit(serve(args.host, args.port))
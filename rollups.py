@@ -0,0 +1,369 @@
+# rollups.py - Incrementally maintained item counts for dashboards
+#
+# Items per user, per status and per creation day, and per status and day
+# within each user's own items ("<user_id>:<bucket>"), without scanning items:
+#
+#   item_rollup_deltas  append-only (dimension, bucket, +/-n) rows, written in
+#                       the same transaction as the change by an after_flush
+#                       hook (ORM) or record_change() (set-based Core writes)
+#   item_rollups        (dimension, bucket) -> item_count, folded in by merge()
+#
+# Writers only ever INSERT deltas, so concurrent transactions never queue on
+# a hot "status=active" or "today" counter row. Readers sum rollups + deltas
+# in one statement. merge() moves deltas into rollups (checking it deleted
+# exactly the rows it summed, so concurrent merges cannot double-apply) and
+# runs in the background once ROLLUP_MERGE_THRESHOLD deltas are pending.
+#
+# When create_all() first creates item_rollups on a database that already
+# has items, the table is backfilled by rebuild() in the same DDL connection.
+# A table created before the per-user dimensions existed needs one
+# `flask --app app rollups-reconcile` to fill them. Anything that bypasses
+# both paths (raw SQL, restores) is repaired by
+# rebuild(), which recomputes every count from items in one serializable
+# transaction:  flask --app app rollups-reconcile   (or POST /admin/rollups/reconcile)
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import Date, String, and_, cast, event, func, inspect, literal, select, union_all
+
+import admin
+
+MERGE_THRESHOLD = int(os.environ.get('ROLLUP_MERGE_THRESHOLD', '1000'))
+DIMENSIONS = ('user', 'status', 'day', 'user_status', 'user_day')
+
+_state = {}
+_merge_lock = threading.Lock()
+
+
+def enabled():
+    return 'rollups' in _state
+
+
+# ========== KEYS ==========
+def _day(value):
+    return value.date().isoformat() if value is not None else ''
+
+
+def keys_for(user_id, status, created_at):
+    user = '' if user_id is None else str(user_id)
+    return (('user', user),
+            ('status', status or ''),
+            ('day', _day(created_at)),
+            ('user_status', f'{user}:{status or ""}'),
+            ('user_day', f'{user}:{_day(created_at)}'))
+
+
+def _key_columns(connection, Item):
+    """SQL expressions computing keys_for() server-side, in DIMENSIONS order"""
+    if connection.dialect.name == 'sqlite':
+        day = func.date(Item.created_at)
+    else:
+        day = cast(cast(Item.created_at, Date), String(10))
+    user = func.coalesce(cast(Item.user_id, String(64)), '')
+    status = func.coalesce(Item.status, '')
+    day = func.coalesce(day, '')
+    return {
+        'user': user,
+        'status': status,
+        'day': day,
+        'user_status': user.concat(':').concat(status),
+        'user_day': user.concat(':').concat(day),
+    }
+
+
+# ========== WRITES ==========
+def _write_deltas(connection, deltas):
+    rows = [{'dimension': d, 'bucket': k, 'delta': n} for (d, k), n in deltas.items() if n]
+    if rows:
+        connection.execute(_state['deltas'].insert(), rows)
+
+
+def record_change(connection, Item, where, sign):
+    """Deltas for a set-based write: call with sign=-1 before deleting (or
+    updating) the rows matching `where`, and sign=+1 after inserting (or
+    updating) them. Grouped server-side; no rows come back to Python."""
+    if not enabled():
+        return
+    deltas = _state['deltas']
+    for dimension, key in _key_columns(connection, Item).items():
+        connection.execute(deltas.insert().from_select(
+            ['dimension', 'bucket', 'delta'],
+            select(literal(dimension), key, func.count() * sign).where(where).group_by(key),
+        ))
+
+
+def record_status_change(connection, Item, where, status):
+    """Deltas for UPDATE items SET status=:status WHERE where (user and day
+    buckets do not move); call before the update"""
+    if not enabled():
+        return
+    deltas = _state['deltas']
+    keys = _key_columns(connection, Item)
+    moving = and_(where, keys['status'] != status)
+    new_keys = {'status': literal(status), 'user_status': keys['user'].concat(':' + status)}
+    for dimension, new_key in new_keys.items():
+        old_key = keys[dimension]
+        connection.execute(deltas.insert().from_select(
+            ['dimension', 'bucket', 'delta'],
+            select(literal(dimension), old_key, -func.count()).where(moving).group_by(old_key),
+        ))
+        connection.execute(deltas.insert().from_select(
+            ['dimension', 'bucket', 'delta'],
+            select(literal(dimension), new_key, func.count()).where(moving).group_by(new_key),
+        ))
+
+
+def _history(obj, name):
+    """(old, new) value of a column attribute within the current flush"""
+    history = inspect(obj).attrs[name].history
+    new = getattr(obj, name)
+    if history.deleted:
+        return history.deleted[0], new
+    return new, new
+
+
+def _after_flush(session, flush_context, model):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, model):
+            for key in keys_for(obj.user_id, obj.status, obj.created_at):
+                deltas[key] += 1
+    for obj in session.deleted:
+        if isinstance(obj, model):
+            old = [_history(obj, name)[0] for name in ('user_id', 'status', 'created_at')]
+            for key in keys_for(*old):
+                deltas[key] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, model) and obj not in session.deleted:
+            pairs = [_history(obj, name) for name in ('user_id', 'status', 'created_at')]
+            before = keys_for(*[old for old, _ in pairs])
+            after = keys_for(*[new for _, new in pairs])
+            for old_key, new_key in zip(before, after):
+                if old_key != new_key:
+                    deltas[old_key] -= 1
+                    deltas[new_key] += 1
+    if deltas:
+        _write_deltas(session.connection(), deltas)
+
+
+# ========== MERGE / REBUILD ==========
+class _Conflict(Exception):
+    pass
+
+
+def pending(connection):
+    return connection.execute(select(func.count()).select_from(_state['deltas'])).scalar()
+
+
+def merge(engine):
+    """Fold pending deltas into item_rollups; returns the number of delta rows merged"""
+    deltas, rollups = _state['deltas'], _state['rollups']
+    with engine.begin() as connection:
+        upto = connection.execute(select(func.max(deltas.c.id))).scalar()
+        if upto is None:
+            return 0
+        in_range = deltas.c.id <= upto
+        rows = connection.execute(select(func.count()).where(in_range)).scalar()
+        totals = connection.execute(
+            select(deltas.c.dimension, deltas.c.bucket, func.sum(deltas.c.delta))
+            .where(in_range).group_by(deltas.c.dimension, deltas.c.bucket)
+        ).all()
+        if connection.execute(deltas.delete().where(in_range)).rowcount != rows:
+            # Someone else merged (part of) this range first: theirs wins
+            raise _Conflict()
+        for dimension, bucket, delta in totals:
+            if not delta:
+                continue
+            match = (rollups.c.dimension == dimension) & (rollups.c.bucket == bucket)
+            if connection.execute(rollups.update().where(match)
+                                  .values(item_count=rollups.c.item_count + delta)).rowcount == 0:
+                connection.execute(rollups.insert().values(dimension=dimension, bucket=bucket, item_count=delta))
+        connection.execute(rollups.delete().where(rollups.c.item_count == 0))
+    return rows
+
+
+def merge_quietly(engine):
+    """merge() for background use: one per worker at a time, conflicts ignored"""
+    if not _merge_lock.acquire(blocking=False):
+        return 0
+    try:
+        return merge(engine)
+    except _Conflict:
+        return 0
+    except Exception as e:
+        print(f'⚠ Rollup merge failed: {e}')
+        return 0
+    finally:
+        _merge_lock.release()
+
+
+def rebuild(connection, Item):
+    """Recompute every rollup from items, exactly; run inside one transaction"""
+    deltas, rollups = _state['deltas'], _state['rollups']
+    # Take the write locks first so no item write can commit between the
+    # clear and the recount (SQLite: RESERVED lock; SQL Server: SERIALIZABLE)
+    connection.execute(deltas.delete())
+    connection.execute(rollups.delete())
+    for dimension, key in _key_columns(connection, Item).items():
+        connection.execute(rollups.insert().from_select(
+            ['dimension', 'bucket', 'item_count'],
+            select(literal(dimension), key, func.count()).select_from(Item.__table__).group_by(key),
+        ))
+
+
+def reconcile(engine, Item):
+    started = time.perf_counter()
+    options = {} if engine.dialect.name == 'sqlite' else {'isolation_level': 'SERIALIZABLE'}
+    with engine.execution_options(**options).begin() as connection:
+        rebuild(connection, Item)
+    return round(time.perf_counter() - started, 3)
+
+
+# ========== READS ==========
+def counts(connection, dimension=None):
+    """{dimension: {bucket: count}} from rollups + pending deltas"""
+    deltas, rollups = _state['deltas'], _state['rollups']
+    both = union_all(
+        select(rollups.c.dimension, rollups.c.bucket, rollups.c.item_count.label('n')),
+        select(deltas.c.dimension, deltas.c.bucket, deltas.c.delta.label('n')),
+    ).subquery()
+    query = select(both.c.dimension, both.c.bucket, func.sum(both.c.n)).group_by(both.c.dimension, both.c.bucket)
+    if dimension is not None:
+        query = query.where(both.c.dimension == dimension)
+    result = {d: {} for d in DIMENSIONS}
+    for dim, bucket, n in connection.execute(query):
+        if n:
+            result[dim][bucket] = int(n)
+    return result
+
+
+def user_counts(connection, user_id):
+    """{'items': n, 'by_status': {...}, 'by_day': {...}} for one user's own items"""
+    deltas, rollups = _state['deltas'], _state['rollups']
+    prefix = f'{user_id}:'
+
+    def mine(table):
+        return and_(table.c.dimension.in_(('user_status', 'user_day')),
+                    table.c.bucket.startswith(prefix, autoescape=True))
+
+    both = union_all(
+        select(rollups.c.dimension, rollups.c.bucket, rollups.c.item_count.label('n')).where(mine(rollups)),
+        select(deltas.c.dimension, deltas.c.bucket, deltas.c.delta.label('n')).where(mine(deltas)),
+    ).subquery()
+    result = {'user_status': {}, 'user_day': {}}
+    for dim, bucket, n in connection.execute(
+        select(both.c.dimension, both.c.bucket, func.sum(both.c.n)).group_by(both.c.dimension, both.c.bucket)
+    ):
+        if n:
+            result[dim][bucket[len(prefix):]] = int(n)
+    return {'items': sum(result['user_status'].values()),
+            'by_status': result['user_status'], 'by_day': result['user_day']}
+
+
+# ========== WIRING ==========
+def init_app(app, db, Item):
+    """Declare the rollup tables and hooks, add /api/stats, /admin/stats and `flask rollups-reconcile`"""
+    import click
+
+    rollups = db.Table(
+        'item_rollups',
+        db.Column('dimension', db.String(16), primary_key=True),
+        db.Column('bucket', db.String(64), primary_key=True),
+        db.Column('item_count', db.BigInteger, nullable=False),
+    )
+    deltas = db.Table(
+        'item_rollup_deltas',
+        db.Column('id', db.Integer, primary_key=True),
+        db.Column('dimension', db.String(16), nullable=False),
+        db.Column('bucket', db.String(64), nullable=False),
+        db.Column('delta', db.Integer, nullable=False),
+    )
+    _state.update(rollups=rollups, deltas=deltas)
+    event.listen(db.session, 'after_flush', lambda s, ctx: _after_flush(s, ctx, Item))
+
+    @event.listens_for(rollups, 'after_create')
+    def backfill(target, connection, **kw):
+        # Existing databases would otherwise report 0 items until a manual reconcile
+        if inspect(connection).has_table(Item.__tablename__):
+            rebuild(connection, Item)
+            print('✓ item_rollups backfilled from items')
+
+    def merge_in_background():
+        engine = db.engine
+        threading.Thread(target=merge_quietly, args=(engine,), name='rollup-merge', daemon=True).start()
+
+    def _args():
+        days = max(1, min(int(request.args.get('days', 30)), 3660))
+        top = max(1, min(int(request.args.get('top', 10)), 100))
+        return days, top
+
+    @app.route('/api/stats')
+    @login_required
+    def item_stats():
+        """The caller's own item counts, read from rollups only"""
+        try:
+            days, _ = _args()
+        except ValueError:
+            return jsonify({'error': 'days and top must be integers'}), 400
+        with db.engine.connect() as connection:
+            data = user_counts(connection, current_user.id)
+            backlog = pending(connection)
+        if backlog >= MERGE_THRESHOLD:
+            merge_in_background()
+        return jsonify({
+            'items': data['items'],
+            'by_status': data['by_status'],
+            'by_day': dict(sorted(data['by_day'].items())[-days:]),
+        })
+
+    @app.route('/admin/stats')
+    @admin.admin_required
+    def admin_stats():
+        """Counts across all users"""
+        try:
+            days, top = _args()
+        except ValueError:
+            return jsonify({'error': 'days and top must be integers'}), 400
+        with db.engine.connect() as connection:
+            data = counts(connection)
+            backlog = pending(connection)
+        if backlog >= MERGE_THRESHOLD:
+            merge_in_background()
+        by_user = data['user']
+        return jsonify({
+            'items': sum(data['status'].values()),
+            'by_status': data['status'],
+            'by_day': dict(sorted(data['day'].items())[-days:]),
+            'top_users': [{'user_id': int(k), 'items': n}
+                          for k, n in sorted(by_user.items(), key=lambda kv: -kv[1])[:top] if k],
+            'pending_deltas': backlog,
+        })
+
+    @app.route('/admin/rollups/reconcile', methods=['POST'])
+    @admin.admin_required
+    def admin_rollups_reconcile():
+        engine = db.engine
+
+        def work():
+            try:
+                print(f'✓ Rollups rebuilt in {reconcile(engine, Item)}s')
+            except Exception as e:
+                print(f'⚠ Rollup reconcile failed: {e}')
+        threading.Thread(target=work, name='rollup-reconcile', daemon=True).start()
+        return jsonify({'status': 'started'}), 202
+
+    @app.cli.command('rollups-reconcile')
+    @click.option('--merge-only', is_flag=True, help='Only fold pending deltas into item_rollups')
+    def rollups_reconcile(merge_only):
+        """Rebuild item_rollups exactly from items"""
+        db.create_all()
+        if merge_only:
+            print(f'✓ Merged {merge(db.engine)} delta rows')
+            return
+        print(f'✓ Rollups rebuilt in {reconcile(db.engine, Item)}s')
+
+    return rollups
@@ -0,0 +1,160 @@
+# serving.py - Production serving presets
+#
+#   SERVING_PRESET=gthread gunicorn -c gunicorn_conf.py app:app
+#   python serving.py show --preset async         (print the resolved settings)
+#   python serving.py run app:app                 (gunicorn where available,
+#                                                  threaded werkzeug elsewhere)
+#
+# Presets (SERVING_PRESET, default gthread):
+#   sync     2*cores+1 single-threaded workers. Simplest; every slow Azure
+#            query or open /api/events stream pins a whole worker.
+#   gthread  one worker per core, SERVING_THREADS threads each. Good default:
+#            DB calls release the GIL, and streams cost a thread, not a process.
+#   async    gevent (or eventlet) workers with SERVING_WORKER_CONNECTIONS
+#            greenlets each, for many idle long-lived connections (dashboards).
+#            Falls back to gthread when neither library is installed.
+#
+# Live dashboards (/api/events) hold a thread each under sync/gthread, so each
+# worker refuses streams beyond max_event_streams() with 503; serve many open
+# dashboards with the async preset (or raise EVENTS_MAX_STREAMS with threads).
+#
+# Overrides: WEB_CONCURRENCY (workers), SERVING_THREADS, SERVING_TIMEOUT,
+# SERVING_GRACEFUL_TIMEOUT, SERVING_KEEPALIVE, SERVING_MAX_REQUESTS,
+# SERVING_MAX_REQUESTS_JITTER, GUNICORN_PRELOAD.
+import argparse
+import importlib.util
+import json
+import os
+import sys
+
+PRESETS = ('sync', 'gthread', 'async')
+DEFAULT_PRESET = 'gthread'
+
+
+def available_cores():
+    """CPUs this process may actually use (affinity mask and cgroup quota, not the host's count)"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS/Windows
+        cores = os.cpu_count() or 1
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(1, int(int(quota) / int(period) + 0.5)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def async_worker_class():
+    for module, worker_class in (('gevent', 'gevent'), ('eventlet', 'eventlet')):
+        if importlib.util.find_spec(module) is not None:
+            return worker_class
+    return None
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def settings(preset=None, cores=None):
+    """gunicorn settings for a preset, with environment overrides applied"""
+    preset = preset or os.environ.get('SERVING_PRESET', DEFAULT_PRESET)
+    if preset not in PRESETS:
+        raise ValueError(f'Unknown SERVING_PRESET {preset!r} (choose from {", ".join(PRESETS)})')
+    cores = cores or available_cores()
+    notes = []
+
+    if preset == 'async':
+        worker_class = async_worker_class()
+        if worker_class is None:
+            notes.append('gevent/eventlet not installed: using gthread')
+            preset = 'gthread'
+
+    if preset == 'sync':
+        config = {'worker_class': 'sync', 'workers': 2 * cores + 1, 'threads': 1}
+    elif preset == 'gthread':
+        config = {'worker_class': 'gthread', 'workers': cores, 'threads': _env_int('SERVING_THREADS', 8)}
+    else:
+        config = {'worker_class': worker_class, 'workers': cores,
+                  'worker_connections': _env_int('SERVING_WORKER_CONNECTIONS', 1000)}
+
+    config['workers'] = _env_int('WEB_CONCURRENCY', config['workers'])
+    config.update({
+        # sync: a request running longer than this gets its worker killed (so are
+        # /api/events streams); gthread/async: the worker must stay responsive
+        'timeout': _env_int('SERVING_TIMEOUT', 30),
+        'graceful_timeout': _env_int('SERVING_GRACEFUL_TIMEOUT', 30),
+        'keepalive': _env_int('SERVING_KEEPALIVE', 5),
+        # Recycle workers to cap slow leaks; jitter keeps them from restarting together
+        'max_requests': _env_int('SERVING_MAX_REQUESTS', 2000),
+        'max_requests_jitter': _env_int('SERVING_MAX_REQUESTS_JITTER', 200),
+        'preload_app': os.environ.get('GUNICORN_PRELOAD', '1') == '1',
+    })
+    config['_preset'] = preset
+    config['_cores'] = cores
+    config['_notes'] = notes
+    return config
+
+
+def max_event_streams(preset=None):
+    """Default cap on open /api/events streams per worker (live_events.EVENTS_MAX_STREAMS)
+
+    Under sync and gthread every stream holds a thread until the browser leaves,
+    so only half the threads may stream; sync gets none (a stream would pin the
+    worker's only thread, and the timeout kills it anyway). Async workers keep
+    a tenth of their connections free for ordinary requests.
+    """
+    config = settings(preset)
+    if 'worker_connections' in config:
+        return max(1, config['worker_connections'] * 9 // 10)
+    return config['threads'] // 2
+
+
+def gunicorn_settings(preset=None):
+    """settings() without the informational keys, ready for gunicorn_conf.py"""
+    return {k: v for k, v in settings(preset).items() if not k.startswith('_')}
+
+
+def run(target, host='0.0.0.0', port=None, preset=None):
+    """Serve `module:app` with the preset, or threaded werkzeug where gunicorn cannot run (Windows)"""
+    port = int(port or os.environ.get('PORT', '8000'))
+    if importlib.util.find_spec('gunicorn') is not None and os.name != 'nt':
+        if preset:
+            os.environ['SERVING_PRESET'] = preset
+        conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn_conf.py')
+        os.environ['PORT'] = str(port)
+        os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', conf, target])
+
+    import importlib
+    from werkzeug.serving import run_simple
+    module_name, _, attr = target.partition(':')
+    app = getattr(importlib.import_module(module_name), attr or 'app')
+    print(f'⚠ gunicorn unavailable: serving {target} with threaded werkzeug on {host}:{port}')
+    run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FSEB serving configuration')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help='Print the resolved gunicorn settings')
+    show.add_argument('--preset', choices=PRESETS)
+    runner = sub.add_parser('run', help='Serve an app with the selected preset')
+    runner.add_argument('target', nargs='?', default='app:app')
+    runner.add_argument('--preset', choices=PRESETS)
+    runner.add_argument('--host', default='0.0.0.0')
+    runner.add_argument('--port', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        print(json.dumps(settings(args.preset), indent=2))
+        return 0
+    run(args.target, args.host, args.port, args.preset)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
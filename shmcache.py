@@ -0,0 +1,406 @@
+# shmcache.py - Small hot datasets shared by every worker on the node
+#
+#   tables = shmcache.get('azure:tables', list_tables, ttl=300)
+#
+# Values live in an mmap'd file (SHMCACHE_PATH) that all gunicorn workers map,
+# so a health probe or catalogue query made by one worker answers the others
+# too. The file is a fixed table of SHMCACHE_SLOTS slots of
+# SHMCACHE_SLOT_BYTES each:
+#
+#   file header (64 bytes): magic 'SHMC', format, slots, slot_bytes
+#   slot header (96 bytes): seq u64, key hash u64, version u64,
+#                           published f64, expires f64, length u32, crc32 u32,
+#                           key name 48s
+#   payload: the value as compact JSON
+#
+# Reads take no lock: a writer makes seq odd, writes, then makes it even
+# again, and a reader retries until it sees the same even seq before and
+# after copying (plus a crc32 of the payload). Every publish bumps the slot's
+# version.
+#
+# When a value is missing or expired exactly one caller on the node refreshes
+# it: the one that wins a non-blocking lockf on the key's byte in an election
+# range past the end of the file (plus a thread lock within the worker).
+# The others keep serving the stale value for up to SHMCACHE_STALE_SECONDS;
+# if there is none yet they wait (SHMCACHE_WAIT_SECONDS) for the winner's
+# result instead of making the same query themselves.
+#
+#   SHMCACHE_STORE=mmap     (default) shared by the workers of the node
+#   SHMCACHE_STORE=memory   per process (used automatically where fcntl is missing)
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import jsonify, request
+
+import metrics
+from admin import admin_required
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SHMCACHE_STORE = os.environ.get('SHMCACHE_STORE', 'mmap')
+SHMCACHE_PATH = os.environ.get('SHMCACHE_PATH', os.path.join('instance', 'shmcache.bin'))
+SHMCACHE_SLOTS = int(os.environ.get('SHMCACHE_SLOTS', '64'))
+SHMCACHE_SLOT_BYTES = int(os.environ.get('SHMCACHE_SLOT_BYTES', '65536'))
+SHMCACHE_WAIT_SECONDS = float(os.environ.get('SHMCACHE_WAIT_SECONDS', '10'))
+SHMCACHE_STALE_SECONDS = float(os.environ.get('SHMCACHE_STALE_SECONDS', '60'))
+
+Entry = namedtuple('Entry', 'value version published expires')
+
+
+def _hash(key):
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':'), default=str).encode()
+
+
+class _Cache:
+    """get() on top of a store's read/publish and refresher election"""
+
+    def __init__(self):
+        self.stats = {'hits': 0, 'stale': 0, 'waited': 0, 'refreshes': 0, 'errors': 0, 'oversize': 0}
+        self._stats_lock = threading.Lock()
+        self._thread_locks = {}
+        self._thread_locks_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _thread_lock(self, key_hash):
+        with self._thread_locks_lock:
+            return self._thread_locks.setdefault(key_hash, threading.Lock())
+
+    @contextmanager
+    def elect(self, key, timeout=0):
+        """Yields True to the one caller on the node allowed to refresh `key` (waits up to timeout)"""
+        key_hash = _hash(key)
+        lock = self._thread_lock(key_hash)
+        acquired = lock.acquire(timeout=timeout) if timeout > 0 else lock.acquire(blocking=False)
+        if not acquired:
+            yield False
+            return
+        try:
+            deadline = time.monotonic() + timeout
+            while not self._try_lock_key(key_hash):
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(0.02)
+            try:
+                yield True
+            finally:
+                self._unlock_key(key_hash)
+        finally:
+            lock.release()
+
+    def _try_lock_key(self, key_hash):
+        return True
+
+    def _unlock_key(self, key_hash):
+        pass
+
+    def get(self, key, refresh, ttl, stale=SHMCACHE_STALE_SECONDS, wait=SHMCACHE_WAIT_SECONDS):
+        """Cached value of `key`, calling refresh() on one worker when it has expired
+
+        ttl is seconds, or a function of the fresh value (e.g. shorter for failures).
+        """
+        entry = self.read(key)
+        now = time.time()
+        if entry is not None and entry.expires > now:
+            self._count('hits')
+            return entry.value
+        usable = entry if entry is not None and entry.expires + stale > now else None
+
+        with self.elect(key) as elected:
+            if elected:
+                return self._refresh(key, refresh, ttl, usable, seen=entry)
+        if usable is not None:
+            # Another worker is refreshing it right now
+            self._count('stale')
+            return usable.value
+
+        with self.elect(key, timeout=wait) as elected:
+            latest = self.read(key)
+            if latest is not None and latest.expires > time.time():
+                self._count('waited')
+                return latest.value
+            # The winner failed (or took longer than `wait`): do it ourselves
+            return self._refresh(key, refresh, ttl, usable, seen=latest)
+
+    def _refresh(self, key, refresh, ttl, usable, seen):
+        latest = self.read(key)
+        if latest is not None and latest.expires > time.time() and (seen is None or latest.version != seen.version):
+            # Published by the previous winner between our read and the election
+            self._count('hits')
+            return latest.value
+        try:
+            value = refresh()
+        except Exception:
+            self._count('errors')
+            if usable is not None:
+                return usable.value
+            raise
+        self._count('refreshes')
+        self.publish(key, value, ttl(value) if callable(ttl) else ttl)
+        return value
+
+
+# ========== STORES ==========
+class MemoryCache(_Cache):
+    """Per-process entries"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.entries_by_key = {}
+        self.versions = {}
+
+    def read(self, key):
+        with self.lock:
+            return self.entries_by_key.get(key)
+
+    def publish(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            version = self.versions.get(key, 0) + 1
+            self.versions[key] = version
+            self.entries_by_key[key] = Entry(value, version, now, now + ttl)
+        return version
+
+    def invalidate(self, key):
+        with self.lock:
+            entry = self.entries_by_key.get(key)
+            if entry is not None:
+                self.entries_by_key[key] = entry._replace(expires=0.0)
+        return entry is not None
+
+    def entries(self):
+        with self.lock:
+            items = list(self.entries_by_key.items())
+        return [_describe(key, entry.version, entry.published, entry.expires, len(_encode(entry.value)))
+                for key, entry in items]
+
+
+class SharedCache(_Cache):
+    """Entries in a fixed slot table of an mmap'd file shared by every worker on the node"""
+
+    FILE_HEADER = struct.Struct('<4sIII48x')
+    SLOT = struct.Struct('<QQQddII48s')
+    SEQ = struct.Struct('<Q')
+    MAGIC = b'SHMC'
+    FORMAT = 1
+    PROBES = 8
+    READ_RETRIES = 1000
+    # Election locks are single bytes far past the end of the file
+    ELECTION_BASE = 1 << 40
+    ELECTION_SPACE = 1 << 20
+
+    def __init__(self, path, slots=SHMCACHE_SLOTS, slot_bytes=SHMCACHE_SLOT_BYTES):
+        super().__init__()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.capacity = slot_bytes - self.SLOT.size
+        size = self.FILE_HEADER.size + slots * slot_bytes
+        header = self.FILE_HEADER.pack(self.MAGIC, self.FORMAT, slots, slot_bytes)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size != size or os.pread(self.fd, len(header), 0) != header:
+                # New file or another layout: start empty
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, header, 0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, size)
+        self.write_lock = threading.Lock()
+
+    def _offset(self, index):
+        return self.FILE_HEADER.size + index * self.slot_bytes
+
+    def _try_lock_key(self, key_hash):
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1,
+                        self.ELECTION_BASE + key_hash % self.ELECTION_SPACE)
+            return True
+        except OSError:
+            return False
+
+    def _unlock_key(self, key_hash):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.ELECTION_BASE + key_hash % self.ELECTION_SPACE)
+
+    def _read_slot(self, index, with_payload=True):
+        """(header tuple, payload bytes) of a consistent snapshot, or None if it kept changing"""
+        offset = self._offset(index)
+        for attempt in range(self.READ_RETRIES):
+            seq = self.SEQ.unpack_from(self.map, offset)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            header = self.SLOT.unpack_from(self.map, offset)
+            length = min(header[5], self.capacity)
+            start = offset + self.SLOT.size
+            payload = self.map[start:start + length] if with_payload else b''
+            if self.SEQ.unpack_from(self.map, offset)[0] != seq or header[0] != seq:
+                continue
+            if with_payload and zlib.crc32(payload) != header[6]:
+                continue
+            return header, payload
+        return None
+
+    def _find(self, key_hash):
+        start = key_hash % self.slots
+        for i in range(self.PROBES):
+            index = (start + i) % self.slots
+            if self.SLOT.unpack_from(self.map, self._offset(index))[1] == key_hash:
+                return index
+        return None
+
+    def read(self, key):
+        key_hash = _hash(key)
+        index = self._find(key_hash)
+        if index is None:
+            return None
+        snapshot = self._read_slot(index)
+        if snapshot is None or snapshot[0][1] != key_hash or not snapshot[0][2]:
+            return None
+        (_, _, version, published, expires, _, _, _), payload = snapshot
+        return Entry(json.loads(payload), version, published, expires)
+
+    def publish(self, key, value, ttl):
+        """Store value for ttl seconds; returns its version (None if it does not fit a slot)"""
+        payload = _encode(value)
+        if len(payload) > self.capacity:
+            self._count('oversize')
+            return None
+        key_hash = _hash(key)
+        now = time.time()
+        with self.write_lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                index = self._find(key_hash)
+                if index is None:
+                    index = self._claim(key_hash, now)
+                offset = self._offset(index)
+                seq, _, version = self.SLOT.unpack_from(self.map, offset)[:3]
+                self.SEQ.pack_into(self.map, offset, seq + 1)
+                start = offset + self.SLOT.size
+                self.map[start:start + len(payload)] = payload
+                self.SLOT.pack_into(self.map, offset, seq + 1, key_hash, version + 1, now, now + ttl,
+                                    len(payload), zlib.crc32(payload), key.encode()[:48])
+                self.SEQ.pack_into(self.map, offset, seq + 2)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return version + 1
+
+    def _claim(self, key_hash, now):
+        """Slot for a new key: an empty one in its probe window, else the one expired longest"""
+        start = key_hash % self.slots
+        oldest = None
+        for i in range(self.PROBES):
+            index = (start + i) % self.slots
+            slot_hash, _, _, expires = self.SLOT.unpack_from(self.map, self._offset(index))[1:5]
+            if slot_hash == 0:
+                return index
+            if oldest is None or expires < oldest[1]:
+                oldest = (index, expires)
+        return oldest[0]
+
+    def invalidate(self, key):
+        """Expire key now (its value stays readable as stale); False if absent"""
+        key_hash = _hash(key)
+        with self.write_lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                index = self._find(key_hash)
+                if index is None:
+                    return False
+                offset = self._offset(index)
+                header = list(self.SLOT.unpack_from(self.map, offset))
+                self.SEQ.pack_into(self.map, offset, header[0] + 1)
+                header[0] += 2
+                header[4] = 0.0
+                self.SLOT.pack_into(self.map, offset, *header)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return True
+
+    def entries(self):
+        result = []
+        for index in range(self.slots):
+            snapshot = self._read_slot(index, with_payload=False)
+            if snapshot is None or not snapshot[0][1]:
+                continue
+            _, _, version, published, expires, length, _, name = snapshot[0]
+            result.append(_describe(name.rstrip(b'\0').decode(errors='replace'), version, published, expires, length))
+        return result
+
+
+def _describe(key, version, published, expires, size):
+    now = time.time()
+    return {'key': key, 'version': version, 'age_seconds': round(now - published, 1),
+            'expires_in_seconds': round(expires - now, 1), 'bytes': size}
+
+
+# ========== MODULE API ==========
+_state = {'cache': None}
+_state_lock = threading.Lock()
+
+
+def cache():
+    """The process-wide cache (created on first use, i.e. after gunicorn forks)"""
+    with _state_lock:
+        if _state['cache'] is None:
+            if SHMCACHE_STORE == 'mmap' and fcntl is not None:
+                _state['cache'] = SharedCache(SHMCACHE_PATH)
+            else:
+                _state['cache'] = MemoryCache()
+        return _state['cache']
+
+
+def get(key, refresh, ttl, **options):
+    return cache().get(key, refresh, ttl, **options)
+
+
+def read(key):
+    return cache().read(key)
+
+
+def publish(key, value, ttl):
+    return cache().publish(key, value, ttl)
+
+
+def invalidate(key):
+    return cache().invalidate(key)
+
+
+def init_app(app):
+    """GET /admin/shmcache lists the shared entries, DELETE ?key= expires one; stats go to /api/metrics"""
+    metrics.register('shmcache', lambda: dict(cache().stats))
+
+    @app.route('/admin/shmcache', methods=['GET', 'DELETE'])
+    @admin_required
+    def shmcache_entries():
+        if request.method == 'DELETE':
+            key = request.args.get('key', '')
+            if not invalidate(key):
+                return jsonify({'error': f'No entry for {key!r}'}), 404
+            return jsonify({'invalidated': key})
+        return jsonify({'store': type(cache()).__name__, 'entries': cache().entries(), 'stats': cache().stats})
+
+    print(f"✓ Shared cache: {SHMCACHE_STORE} ({SHMCACHE_PATH if SHMCACHE_STORE == 'mmap' else 'per process'})")
@@ -0,0 +1,323 @@
+# singleflight.py - Coalesce identical concurrent queries
+#
+# When many dashboards refresh at once they send the same SQL at the same
+# moment. do(key, fn) lets the first caller run fn(); callers arriving with the
+# same key while it runs wait and receive the same result (or exception)
+# instead of opening their own Azure connection.
+#
+#   SINGLEFLIGHT_MODE=local   (default) coalesce across threads of one worker
+#   SINGLEFLIGHT_MODE=file    also across workers on the node: the leader
+#                             holds an flock on SINGLEFLIGHT_DIR/<key>.lock and
+#                             publishes its result next to it for the others
+#
+# Published results are data, never code: a JSON header line, then the rows
+# in colformat's columnar encoding (a failure is published as its message and
+# re-raised as SharedError). Waiters take the lock in turn right after the
+# leader finishes, so result files (and idle lock files) older than
+# SINGLEFLIGHT_RESULT_TTL seconds are of no use and are swept.
+#
+# Only read-only statements should be coalesced (see is_read_only): two
+# identical INSERTs are two operations. Results are shared objects, so
+# callers must not mutate them.
+#
+# is_read_only() is also the gate for fan-out queries and actual-plan
+# capture, so it errs towards False: one SELECT/WITH statement, no batch,
+# and none of the data-changing or DDL keywords anywhere outside string
+# literals, quoted identifiers and comments. Anything it cannot tokenize
+# (an unterminated literal or comment) is not read-only.
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+
+import colformat
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: local mode only
+    fcntl = None
+
+SINGLEFLIGHT_MODE = os.environ.get('SINGLEFLIGHT_MODE', 'local')
+SINGLEFLIGHT_DIR = os.environ.get('SINGLEFLIGHT_DIR', os.path.join('instance', 'singleflight'))
+SINGLEFLIGHT_RESULT_TTL = float(os.environ.get('SINGLEFLIGHT_RESULT_TTL', '30'))
+SINGLEFLIGHT_SWEEP_SECONDS = float(os.environ.get('SINGLEFLIGHT_SWEEP_SECONDS', '10'))
+
+_QUOTED_OR_SPACE = re.compile(r"('(?:[^']|'')*'|\"[^\"]*\"|\[[^\]]*\])|\s+")
+_WORD = re.compile(r'[A-Za-z_@#][\w@#$]*')
+_WRITE_KEYWORDS = frozenset('''
+    insert update delete merge truncate into
+    exec execute call sp_executesql xp_cmdshell
+    create alter drop rename grant revoke deny
+    declare set use go begin commit rollback save transaction
+    dbcc backup restore kill shutdown reconfigure bulk
+    openrowset opendatasource openquery openxml waitfor
+    attach detach pragma vacuum reindex analyze
+'''.split())
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside quoted text and drop trailing semicolons"""
+    sql = _QUOTED_OR_SPACE.sub(lambda m: m.group(1) or ' ', sql.strip())
+    return sql.rstrip('; ')
+
+
+def _code_only(sql):
+    """sql with string literals, quoted identifiers and comments blanked out; None if one is unterminated"""
+    out = []
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = n if end < 0 else end
+        elif c == '/' and sql.startswith('/*', i):
+            # T-SQL block comments nest
+            depth, i = 1, i + 2
+            while depth and i < n:
+                if sql.startswith('/*', i):
+                    depth, i = depth + 1, i + 2
+                elif sql.startswith('*/', i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+            if depth:
+                return None
+        elif c in '\'"[':
+            close = ']' if c == '[' else c
+            i += 1
+            while True:
+                end = sql.find(close, i)
+                if end < 0:
+                    return None
+                if sql.startswith(close * 2, end):  # doubled quote is an escaped one
+                    i = end + 2
+                    continue
+                i = end + 1
+                break
+        else:
+            out.append(c)
+            i += 1
+            continue
+        out.append(' ')
+    return ''.join(out)
+
+
+def is_read_only(sql):
+    """True only for a single SELECT/WITH statement that cannot change anything"""
+    code = _code_only(sql or '')
+    if code is None:
+        return False
+    code = code.strip().rstrip(';').rstrip()
+    if not code or ';' in code:
+        return False
+    words = [w.lower() for w in _WORD.findall(code)]
+    if not words or words[0] not in ('select', 'with'):
+        return False
+    return not any(w in _WRITE_KEYWORDS or w.startswith(('sp_', 'xp_')) for w in words)
+
+
+def make_key(*parts):
+    """Stable key for (group, normalised sql, params, ...)"""
+    normalized = [normalize_sql(p) if isinstance(p, str) else p for p in parts]
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SharedError(RuntimeError):
+    """The run this caller waited for in another worker failed with this message"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class Group:
+    def __init__(self, name, mode=None, directory=None):
+        self.name = name
+        self.mode = mode or SINGLEFLIGHT_MODE
+        self.directory = directory or SINGLEFLIGHT_DIR
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.last_sweep = 0.0
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True if another caller's run was reused"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            metrics.incr('singleflight.shared', group=self.name)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            if self.mode == 'file' and fcntl is not None:
+                call.result, shared = self._do_across_workers(key, fn)
+            else:
+                call.result, shared = fn(), False
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    # ---- cross-worker ----
+    def _lock(self, path):
+        """fd holding LOCK_EX on `path`, and whether we had to wait for it"""
+        waited = False
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                waited = True
+            try:
+                # _sweep() may have unlinked it meanwhile: then it no longer excludes anyone
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    return fd, waited
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _do_across_workers(self, key, fn):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f'{self.name}-{key}')
+        waiting_since = time.time()
+        fd, waited = self._lock(base + '.lock')
+        try:
+            if waited:
+                # Another worker ran it while we waited: take its result
+                published = self._read_result(base, waiting_since)
+                if published is not None:
+                    metrics.incr('singleflight.shared_cross_worker', group=self.name)
+                    ok, value = published
+                    if not ok:
+                        raise SharedError(value)
+                    return value, True
+            metrics.incr('singleflight.executed', group=self.name)
+            try:
+                result = fn()
+            except Exception as e:
+                self._write_result(base, False, f'{type(e).__name__}: {e}')
+                raise
+            self._write_result(base, True, result)
+            return result, False
+        finally:
+            # Recently used: the sweep leaves it alone while the waiters take their turns
+            os.utime(fd)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            self._sweep()
+
+    @staticmethod
+    def _write_result(base, ok, value):
+        """JSON header line, then the value: colformat bytes for (columns, rows), else JSON"""
+        header = {'finished_at': time.time(), 'ok': ok}
+        try:
+            if ok and isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], list):
+                header['format'] = 'columnar'
+                body = colformat.encode(value[0], value[1])
+            else:
+                header['format'] = 'json'
+                body = json.dumps(value).encode()
+        except (TypeError, ValueError, OverflowError, struct.error):
+            # Not representable: the other workers simply run the query themselves
+            return
+        tmp = f'{base}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(json.dumps(header).encode() + b'\n' + body)
+            os.replace(tmp, base + '.result')
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def _read_result(base, not_before):
+        try:
+            with open(base + '.result', 'rb') as f:
+                header = json.loads(f.readline())
+                if header['finished_at'] < not_before:
+                    # Only a run that finished while we waited counts; older files are stale results
+                    return None
+                body = f.read()
+            if header['format'] == 'columnar':
+                columns = colformat.decode(body)
+                return header['ok'], (columns.columns, columns.to_rows())
+            return header['ok'], json.loads(body)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def _sweep(self):
+        """Every SINGLEFLIGHT_SWEEP_SECONDS, drop results (and idle locks) older than SINGLEFLIGHT_RESULT_TTL"""
+        now = time.time()
+        with self.lock:
+            if now - self.last_sweep < SINGLEFLIGHT_SWEEP_SECONDS:
+                return
+            self.last_sweep = now
+        prefix = f'{self.name}-'
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith(prefix)]
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime < SINGLEFLIGHT_RESULT_TTL:
+                    continue
+                if not name.endswith('.lock'):
+                    os.remove(path)
+                    continue
+                fd = os.open(path, os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                # Only unlinked while nobody holds it; late openers re-check the inode in _lock()
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.remove(path)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def group(name):
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = Group(name)
+        return _groups[name]
+
+
+def do(name, key_parts, fn):
+    """group(name).do(make_key(name, *key_parts), fn) -> (result, shared); counts runs in local mode too"""
+    g = group(name)
+    key = make_key(name, *key_parts)
+    if g.mode != 'file' or fcntl is None:
+        def counted():
+            metrics.incr('singleflight.executed', group=name)
+            return fn()
+        return g.do(key, counted)
+    return g.do(key, fn)
@@ -0,0 +1,299 @@
+# sql_standin.py - Latency-injecting Azure SQL stand-in (SQLite behind a DB-API facade)
+#
+# Lets pooling, caching and timeout behaviour be exercised on a laptop with no
+# network. Each logical database name maps to one SQLite file, queries accept
+# pymssql-style parameters (%s / %(name)s), and the handful of T-SQL idioms the
+# apps use (@@VERSION, DB_NAME(), INFORMATION_SCHEMA.TABLES, TOP n) are
+# rewritten to SQLite.
+#
+# Behaviour is configured with environment variables (see StandinConfig) or by
+# passing keyword overrides to connect().
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+apilevel = '2.0'
+threadsafety = 1
+paramstyle = 'pyformat'
+
+
+# ========== DB-API EXCEPTIONS ==========
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+# ========== CONFIGURATION ==========
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+class StandinConfig:
+    """Latency and failure knobs (all latencies in milliseconds)"""
+
+    def __init__(self, **overrides):
+        self.directory = os.environ.get('STANDIN_DIR', os.path.join('instance', 'standin'))
+        self.connect_latency_ms = _env_float('STANDIN_CONNECT_LATENCY_MS', 0)
+        self.query_latency_ms = _env_float('STANDIN_QUERY_LATENCY_MS', 0)
+        self.jitter_ms = _env_float('STANDIN_JITTER_MS', 0)
+        self.failure_rate = _env_float('STANDIN_FAILURE_RATE', 0)
+        # '' (healthy), 'firewall' (hang for the timeout, then fail) or 'auth'
+        self.connect_failure = os.environ.get('STANDIN_CONNECT_FAILURE', '')
+        self.max_qps = _env_float('STANDIN_MAX_QPS', 0)
+        self.rows_per_sec = _env_float('STANDIN_ROWS_PER_SEC', 0)
+        for key, value in overrides.items():
+            if not hasattr(self, key):
+                raise TypeError(f'Unknown stand-in option: {key}')
+            setattr(self, key, value)
+
+    def path_for(self, database):
+        if database == ':memory:':
+            return database
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f'{database or "fseb"}.db')
+
+
+class _Throttle:
+    """Token bucket shared by every connection in the process (the 'server' capacity)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+    def acquire(self, rate):
+        if rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(rate, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+_throttle = _Throttle()
+_seed = os.environ.get('STANDIN_SEED')
+_rng = random.Random(int(_seed) if _seed else None)
+
+
+# ========== T-SQL -> SQLITE ==========
+_INFORMATION_SCHEMA_TABLES = (
+    "(SELECT 'fseb' AS TABLE_CATALOG, 'dbo' AS TABLE_SCHEMA, name AS TABLE_NAME, "
+    "CASE type WHEN 'view' THEN 'VIEW' ELSE 'BASE TABLE' END AS TABLE_TYPE "
+    "FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%')"
+)
+_TOP = re.compile(r'^(\s*SELECT\s+)TOP\s*\(?\s*(\d+)\s*\)?\s+', re.IGNORECASE)
+_NOOP = re.compile(r'^\s*SET\s+(NOCOUNT|ANSI_\w+|XACT_ABORT)\s+(ON|OFF)\s*;?\s*$', re.IGNORECASE)
+
+
+def translate(sql, params=None, pyformat=True):
+    """Rewrite a T-SQL / pymssql-style statement into SQLite syntax"""
+    sql = re.sub(r'INFORMATION_SCHEMA\.TABLES', _INFORMATION_SCHEMA_TABLES, sql, flags=re.IGNORECASE)
+    sql = re.sub(r'@@VERSION', "('Microsoft SQL Azure (stand-in) - SQLite ' || sqlite_version())", sql,
+                 flags=re.IGNORECASE)
+    sql = re.sub(r'@@SERVERNAME', "'standin'", sql, flags=re.IGNORECASE)
+    match = _TOP.match(sql)
+    if match:
+        sql = match.group(1) + sql[match.end():].rstrip().rstrip(';') + f' LIMIT {match.group(2)}'
+    if pyformat:
+        if isinstance(params, dict):
+            sql = re.sub(r'%\((\w+)\)s', r':\1', sql)
+        else:
+            sql = sql.replace('%s', '?')
+        sql = sql.replace('%%', '%')
+    return sql
+
+
+# ========== DB-API FACADE ==========
+class Cursor:
+    def __init__(self, connection, as_dict=False):
+        self.connection = connection
+        self.as_dict = as_dict
+        self._cursor = connection._raw.cursor()
+        self.arraysize = 1
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql, params=None):
+        self.connection._before_query()
+        if _NOOP.match(sql):
+            return self
+        try:
+            translated = translate(sql, params, self.connection.pyformat)
+            if params is None:
+                self._cursor.execute(translated)
+            elif isinstance(params, (dict, list, tuple)):
+                self._cursor.execute(translated, params)
+            else:
+                self._cursor.execute(translated, (params,))
+        except sqlite3.OperationalError as e:
+            raise OperationalError(str(e)) from e
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        except sqlite3.Error as e:
+            raise ProgrammingError(str(e)) from e
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.connection._before_query()
+        seq_of_params = list(seq_of_params)
+        first = seq_of_params[0] if seq_of_params else None
+        try:
+            self._cursor.executemany(translate(sql, first, self.connection.pyformat), seq_of_params)
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        except sqlite3.Error as e:
+            raise OperationalError(str(e)) from e
+        return self
+
+    def _shape(self, rows):
+        self.connection._before_fetch(len(rows))
+        if self.as_dict and self._cursor.description:
+            names = [d[0] for d in self._cursor.description]
+            return [dict(zip(names, row)) for row in rows]
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._shape([row])[0] if row is not None else None
+
+    def fetchmany(self, size=None):
+        return self._shape(self._cursor.fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        return self._shape(self._cursor.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+    def __getattr__(self, name):
+        if name == '_cursor':
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+
+class Connection:
+    def __init__(self, database, config, pyformat=True):
+        self.database = database
+        self.config = config
+        self.pyformat = pyformat
+        self._rng = random.Random(_rng.random())
+        self._raw = sqlite3.connect(config.path_for(database), check_same_thread=False,
+                                    timeout=30, isolation_level='')
+        self._raw.create_function('DB_NAME', 0, lambda: database)
+        self._raw.create_function('GETDATE', 0, lambda: time.strftime('%Y-%m-%d %H:%M:%S'))
+        self._raw.create_function('GETUTCDATE', 0, lambda: time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        self.closed = False
+
+    def _delay(self, base_ms):
+        jitter = self._rng.uniform(-self.config.jitter_ms, self.config.jitter_ms) if self.config.jitter_ms else 0
+        delay = max(0.0, base_ms + jitter) / 1000.0
+        if delay:
+            time.sleep(delay)
+
+    def _before_query(self):
+        if self.closed:
+            raise InterfaceError('Connection is closed')
+        _throttle.acquire(self.config.max_qps)
+        self._delay(self.config.query_latency_ms)
+        if self.config.failure_rate and self._rng.random() < self.config.failure_rate:
+            raise OperationalError('Stand-in injected failure: connection reset by peer')
+
+    def _before_fetch(self, rows):
+        if self.config.rows_per_sec and rows:
+            time.sleep(rows / self.config.rows_per_sec)
+
+    def cursor(self, as_dict=False):
+        return Cursor(self, as_dict=as_dict)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        # SQLAlchemy's sqlite dialect pokes at the raw connection (create_function, isolation_level, ...)
+        if name == '_raw':
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+
+def connect(server=None, database=None, user=None, password=None, timeout=None, login_timeout=None,
+            pyformat=True, **overrides):
+    """pymssql.connect()-compatible entry point"""
+    config = StandinConfig(**overrides)
+
+    jitter = _rng.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0
+    delay = max(0.0, config.connect_latency_ms + jitter) / 1000.0
+    if delay:
+        time.sleep(delay)
+
+    if config.connect_failure == 'firewall':
+        # A blocked port hangs until the driver gives up
+        time.sleep(float(login_timeout or timeout or 60))
+        raise OperationalError(f'Unable to connect: Adaptive Server is unavailable or does not exist ({server})')
+    if config.connect_failure == 'auth':
+        raise OperationalError(f"Login failed for user '{user}'.")
+    if config.failure_rate and _rng.random() < config.failure_rate:
+        raise OperationalError(f'Unable to connect: stand-in injected connect failure ({server})')
+
+    return Connection(database, config, pyformat=pyformat)
@@ -0,0 +1,52 @@
+# tests/test_fanout.py - Fan-out across more databases than it has spare threads
+#
+# Producers park on their short row queues until the consumer reaches them,
+# so a fan-out must never wait on a database whose producer has not started.
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix='fseb-tests-')
+os.environ.setdefault('AZURE_DRIVER', 'standin')
+os.environ.setdefault('STANDIN_DIR', os.path.join(_tmp, 'standin'))
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+
+import fanout  # noqa: E402
+
+DATABASES = ['fanout_a', 'fanout_b', 'fanout_c']
+TWENTY_ROWS = 'WITH n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 20) SELECT i FROM n'
+
+
+@pytest.fixture
+def small_fanout(monkeypatch):
+    monkeypatch.setattr(fanout, 'ALLOWED_DATABASES', fanout.ALLOWED_DATABASES | set(DATABASES))
+    monkeypatch.setattr(fanout, 'FANOUT_MAX_WORKERS', len(DATABASES))
+    monkeypatch.setattr(fanout, 'FANOUT_BATCH_ROWS', 1)
+    monkeypatch.setattr(fanout, 'FANOUT_QUEUE_BATCHES', 2)
+
+
+@pytest.mark.parametrize('merge_on', [None, 'i'])
+def test_every_database_answers(small_fanout, merge_on):
+    result = fanout.FanOut(fanout.resolve(DATABASES), TWENTY_ROWS, merge_on=merge_on, timeout=3)
+    rows = list(result.rows())
+    assert result.failed == []
+    assert len(rows) == 20 * len(DATABASES)
+    assert {db: r['rows'] for db, r in result.report().items()} == {db: 20 for db in DATABASES}
+
+
+def test_concurrent_fanouts_do_not_starve_each_other(small_fanout):
+    first = fanout.FanOut(DATABASES, TWENTY_ROWS, timeout=3)
+    second = fanout.FanOut(DATABASES, TWENTY_ROWS, timeout=3)
+    assert len(list(second.rows())) == len(list(first.rows())) == 20 * len(DATABASES)
+    assert first.failed == second.failed == []
+
+
+def test_more_databases_than_workers_is_rejected(small_fanout, monkeypatch):
+    monkeypatch.setattr(fanout, 'FANOUT_MAX_WORKERS', 2)
+    with pytest.raises(fanout.FanOutError, match='FANOUT_MAX_WORKERS'):
+        fanout.resolve(DATABASES)
@@ -0,0 +1,69 @@
+# tests/test_read_only_gate.py - Statements that must never pass the read-only gate
+#
+# singleflight.is_read_only() decides which statements are coalesced, which
+# get re-executed for actual plans, and which may be fanned out to every
+# database, so writes hidden behind a SELECT/WITH prefix must be rejected.
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix='fseb-tests-')
+os.environ.setdefault('AZURE_DRIVER', 'standin')
+os.environ.setdefault('STANDIN_DIR', os.path.join(_tmp, 'standin'))
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+os.environ.setdefault('JOBS_DB', os.path.join(_tmp, 'jobs.db'))
+os.environ.setdefault('PLAN_STORE', os.path.join(_tmp, 'plans.db'))
+os.environ.setdefault('SHMCACHE_PATH', os.path.join(_tmp, 'shmcache.bin'))
+
+import singleflight  # noqa: E402
+
+WRITES = [
+    'SELECT 1; DELETE FROM users',
+    'SELECT 1; DROP TABLE users',
+    'WITH x AS (SELECT 1 a) DELETE FROM t',
+    'with c as (select 1) update t set a=1',
+    'SELECT 1 DELETE FROM users',
+    'SELECT a INTO b FROM t',
+    'WITH s AS (SELECT 1 a) MERGE t USING s ON 1=1 WHEN MATCHED THEN DELETE;',
+    'SELECT 1; EXEC sp_who',
+    "SELECT 'unterminated",
+    'SELECT 1 /* unterminated',
+    'DELETE FROM users',
+    '',
+]
+
+READS = [
+    'SELECT 1',
+    'select * from items where title = \'a; delete from users\'',
+    'SELECT [update], deleted_at FROM t -- ; DROP TABLE t',
+    'WITH x AS (SELECT 1 a) SELECT a FROM x;',
+    "SELECT N'it''s' AS s /* nested /* comment */ ok */",
+]
+
+
+@pytest.mark.parametrize('sql', WRITES)
+def test_writes_are_not_read_only(sql):
+    assert not singleflight.is_read_only(sql)
+
+
+@pytest.mark.parametrize('sql', READS)
+def test_reads_are_read_only(sql):
+    assert singleflight.is_read_only(sql)
+
+
+@pytest.fixture(scope='module')
+def proxy_client():
+    import proxi_api
+    return proxi_api.app.test_client()
+
+
+@pytest.mark.parametrize('sql', WRITES)
+def test_fanout_rejects_writes(proxy_client, sql):
+    response = proxy_client.post('/api/query', json={'sql': sql, 'databases': ['fseb']})
+    assert response.status_code == 400
+    assert 'read-only' in response.get_json()['error']
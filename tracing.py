@@ -0,0 +1,393 @@
+# tracing.py - Request spans, Server-Timing header and trace export
+#
+# A sampled request records nested spans:
+#   request           before_request .. after_request
+#     auth            flask_login user loader (wrap it with traced('auth'))
+#     sql             every cursor execute, via SQLAlchemy engine events
+#     <custom>        with tracing.span('serialize'): ...
+#   response          after_request .. WSGI close, i.e. writing the body
+# The breakdown (summed per span name) goes out in a Server-Timing header;
+# `response` finishes after the headers are sent so it is only in the export.
+#
+#   TRACE_SAMPLE_RATE=0.05   fraction of requests traced (default 0.05)
+#   TRACE_PARENT_SAMPLE_RATE fraction of requests whose W3C traceparent has the
+#                            sampled flag that are traced, joining the
+#                            caller's trace (default TRACE_SAMPLE_RATE: the
+#                            header is client input; raise it to 1 only where
+#                            a trusted proxy sets it)
+#   TRACE_EXPORT=file        JSON line per trace in TRACE_FILE (default),
+#                            rotated at TRACE_MAX_BYTES keeping TRACE_BACKUPS
+#   TRACE_EXPORT=otlp        OTLP/HTTP JSON POSTs to TRACE_OTLP_ENDPOINT
+#   TRACE_EXPORT=none        Server-Timing only
+#
+# Export runs on a background thread behind a bounded queue; a full queue
+# drops traces rather than slowing requests. For local work,
+# `python tracing.py collect` is an OTLP/HTTP collector stand-in that
+# appends what it receives to a JSONL file.
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.05'))
+TRACE_PARENT_SAMPLE_RATE = float(os.environ.get('TRACE_PARENT_SAMPLE_RATE', str(TRACE_SAMPLE_RATE)))
+TRACE_EXPORT = os.environ.get('TRACE_EXPORT', 'file')
+TRACE_FILE = os.environ.get('TRACE_FILE', os.path.join('instance', 'traces.jsonl'))
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_BYTES', str(20 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get('TRACE_BACKUPS', '3'))
+TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'fseb')
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'end', 'attrs')
+
+    def __init__(self, name, parent_id, attrs):
+        self.name = name
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end = None
+        self.attrs = attrs
+
+
+class Trace:
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or '%032x' % random.getrandbits(128)
+        self.remote_parent = parent_id
+        self.wall_ns = time.time_ns()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.stack = []
+
+    def open(self, name, **attrs):
+        parent = self.stack[-1].span_id if self.stack else self.remote_parent
+        span = Span(name, parent, attrs)
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span):
+        span.end = time.perf_counter()
+        if span in self.stack:
+            # Closing a parent also closes children left open by an exception
+            while self.stack and self.stack.pop() is not span:
+                pass
+
+    def server_timing(self):
+        """name;dur=ms per span name (summed), in first-seen order"""
+        totals, counts = {}, {}
+        for span in self.spans:
+            if span.end is None or span.name == 'request':
+                continue
+            totals[span.name] = totals.get(span.name, 0) + (span.end - span.start)
+            counts[span.name] = counts.get(span.name, 0) + 1
+        parts = []
+        for name, seconds in totals.items():
+            desc = f';desc="{counts[name]}x"' if counts[name] > 1 else ''
+            parts.append(f'{name};dur={seconds * 1000:.2f}{desc}')
+        root = self.spans[0]
+        if root.end is not None:
+            parts.append(f'total;dur={(root.end - root.start) * 1000:.2f}')
+        return ', '.join(parts)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'start_unix_ns': self.wall_ns,
+            'spans': [
+                {
+                    'name': s.name,
+                    'span_id': s.span_id,
+                    'parent_id': s.parent_id,
+                    'offset_ms': round((s.start - self.origin) * 1000, 3),
+                    'duration_ms': round(((s.end or s.start) - s.start) * 1000, 3),
+                    'attributes': s.attrs,
+                }
+                for s in self.spans
+            ],
+        }
+
+    def to_otlp(self):
+        def unix_ns(t):
+            return str(self.wall_ns + int((t - self.origin) * 1e9))
+
+        def attributes(attrs):
+            return [
+                {'key': k, 'value': {'intValue': str(v)} if isinstance(v, int) and not isinstance(v, bool)
+                 else {'stringValue': str(v)}}
+                for k, v in attrs.items()
+            ]
+
+        spans = [
+            {
+                'traceId': self.trace_id,
+                'spanId': s.span_id,
+                'parentSpanId': s.parent_id or '',
+                'name': s.name,
+                'kind': 2 if s.name == 'request' else 1,  # SERVER / INTERNAL
+                'startTimeUnixNano': unix_ns(s.start),
+                'endTimeUnixNano': unix_ns(s.end or s.start),
+                'attributes': attributes(s.attrs),
+            }
+            for s in self.spans
+        ]
+        return {'resourceSpans': [{
+            'resource': {'attributes': attributes({'service.name': TRACE_SERVICE_NAME})},
+            'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}],
+        }]}
+
+
+def current():
+    """The sampled Trace of this request, or None"""
+    return g.get('_trace') if has_request_context() else None
+
+
+class span:
+    """with tracing.span('serialize', rows=n): ...  (no-op when not traced)"""
+
+    __slots__ = ('name', 'attrs', 'trace', 'span')
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.trace = current()
+        self.span = self.trace.open(self.name, **self.attrs) if self.trace else None
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            if exc_type is not None:
+                self.span.attrs['error'] = exc_type.__name__
+            self.trace.close(self.span)
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# ========== SQL ==========
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current()
+    if trace is not None:
+        conn.info.setdefault('_trace_spans', []).append(
+            (trace, trace.open('sql', statement=statement[:200], executemany=executemany)))
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    pending = conn.info.get('_trace_spans')
+    if pending:
+        trace, sql_span = pending.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            sql_span.attrs['rowcount'] = cursor.rowcount
+        trace.close(sql_span)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    pending = context.connection.info.get('_trace_spans') if context.connection is not None else None
+    if pending:
+        trace, sql_span = pending.pop()
+        sql_span.attrs['error'] = type(context.original_exception).__name__
+        trace.close(sql_span)
+
+
+# ========== EXPORT ==========
+class Exporter:
+    def __init__(self, mode=TRACE_EXPORT, path=TRACE_FILE, endpoint=TRACE_OTLP_ENDPOINT, max_pending=1000,
+                 max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.mode = mode
+        self.path = path
+        self.endpoint = endpoint
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.pending = queue.Queue(max_pending)
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, trace):
+        if self.mode == 'none':
+            return
+        with self.lock:
+            # Started lazily so a pre-forking server's workers each get their own thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                self.thread.start()
+        try:
+            self.pending.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.mode == 'otlp':
+                    self._post(batch)
+                else:
+                    self._append(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f'⚠ Trace export failed: {e}')
+
+    def _append(self, batch):
+        data = ''.join(json.dumps(trace.to_dict(), default=str) + '\n' for trace in batch)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Every worker appends to the same file: rotate under a shared lock
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a') as f:
+                    f.write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def _post(self, batch):
+        payload = {'resourceSpans': [rs for trace in batch for rs in trace.to_otlp()['resourceSpans']]}
+        req = urllib.request.Request(self.endpoint, data=json.dumps(payload, default=str).encode(),
+                                     headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(req, timeout=5).close()
+
+    def stats(self):
+        return {'exported': self.exported, 'dropped': self.dropped, 'errors': self.errors,
+                'rotations': self.rotations, 'pending': self.pending.qsize()}
+
+
+def _sampled():
+    """(trace_id, parent_span_id) if this request should be traced, else None"""
+    match = _TRACEPARENT.match(request.headers.get('traceparent', ''))
+    if match and int(match.group(3), 16) & 1:
+        # Anyone can send the flag: it only picks the rate, never forces a trace
+        rate, parent = TRACE_PARENT_SAMPLE_RATE, (match.group(1), match.group(2))
+    else:
+        rate, parent = TRACE_SAMPLE_RATE, (None, None)
+    if rate > 0 and random.random() < rate:
+        return parent
+    return None
+
+
+def init_app(app, exporter=None):
+    """Trace a sample of app's requests; returns the Exporter"""
+    exporter = exporter or Exporter()
+
+    @app.before_request
+    def start_trace():
+        sampled = _sampled()
+        if sampled is not None:
+            trace = g._trace = Trace(*sampled)
+            trace.open('request', method=request.method, route=str(request.url_rule or request.path))
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.pop('_trace', None)
+        if trace is None:
+            return response
+        trace.spans[0].attrs['status'] = response.status_code
+        trace.close(trace.spans[0])
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers['traceparent'] = f'00-{trace.trace_id}-{trace.spans[0].span_id}-01'
+        write = trace.open('response')
+        write.parent_id = trace.spans[0].span_id
+
+        def written():
+            trace.close(write)
+            exporter.submit(trace)
+        response.call_on_close(written)
+        return response
+
+    return exporter
+
+
+# ========== COLLECTOR STAND-IN ==========
+def collect(port=4318, out=os.path.join('instance', 'otlp-collected.jsonl')):
+    """Minimal OTLP/HTTP JSON receiver: POST /v1/traces, one line per request body"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            payload = json.loads(body)
+            spans = sum(len(ss['spans']) for rs in payload.get('resourceSpans', []) for ss in rs['scopeSpans'])
+            with lock, open(out, 'a') as f:
+                f.write(json.dumps(payload) + '\n')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+            print(f'  received {spans} spans')
+
+        def log_message(self, *args):
+            pass
+
+    print(f'📡 OTLP collector stand-in on :{port}/v1/traces -> {out}')
+    ThreadingHTTPServer(('127.0.0.1', port), Handler).serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tracing tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('collect', help='run the OTLP/HTTP collector stand-in')
+    p.add_argument('--port', type=int, default=4318)
+    p.add_argument('--out', default=os.path.join('instance', 'otlp-collected.jsonl'))
+    args = parser.parse_args()
+    collect(args.port, args.out)
@@ -0,0 +1,409 @@
+# traffic.py - Capture request metadata and replay it against a local instance
+#
+#   TRAFFIC_CAPTURE=1 gunicorn app:app        (writes instance/traffic.jsonl)
+#   python traffic.py replay instance/traffic.jsonl* --target http://127.0.0.1:5000 \
+#       --speed 4 --login admin:admin123
+#   python traffic.py replay instance/traffic.jsonl --dry-run     (workload summary only)
+#
+# Capture: after each request one line is queued for a background writer
+# thread (never blocking the request; a full queue drops the line). The
+# line has the route rule, method, path, query args, status, size, duration
+# and a salted hash of the user (or client address). It keeps the *shape*
+# of a JSON body: keys, types, string lengths and list sizes, not the
+# values. Routes listed in TRAFFIC_KEEP_BODIES keep the whole body (e.g.
+# /api/query, whose SQL is the workload). Fields and query args that look
+# like secrets are always redacted. The file rotates at TRAFFIC_MAX_BYTES
+# with TRAFFIC_BACKUPS old files; workers of one node share it under an
+# flock.
+#
+# Replay: requests are re-issued open-loop at their captured offsets divided
+# by --speed, so requests that overlapped in production overlap again
+# (concurrency is preserved and scales with the speed) however slow the
+# target is. Each captured user gets its own cookie session, logged in
+# round-robin as the --login accounts. Bodies that were only recorded as a
+# shape are filled with placeholder values of the same shape. /api/auth/
+# requests are skipped; sessions are set up by --login instead.
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from flask import g, request
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TRAFFIC_CAPTURE = os.environ.get('TRAFFIC_CAPTURE', '0') == '1'
+TRAFFIC_FILE = os.environ.get('TRAFFIC_FILE', os.path.join('instance', 'traffic.jsonl'))
+TRAFFIC_SAMPLE_RATE = float(os.environ.get('TRAFFIC_SAMPLE_RATE', '1.0'))
+TRAFFIC_MAX_BYTES = int(os.environ.get('TRAFFIC_MAX_BYTES', str(50 * 1024 * 1024)))
+TRAFFIC_BACKUPS = int(os.environ.get('TRAFFIC_BACKUPS', '5'))
+TRAFFIC_MAX_BODY = int(os.environ.get('TRAFFIC_MAX_BODY', '65536'))
+TRAFFIC_SALT = os.environ.get('TRAFFIC_SALT', '')
+TRAFFIC_EXCLUDE = tuple(p for p in os.environ.get(
+    'TRAFFIC_EXCLUDE', '/static/,/admin/,/api/events,/api/metrics').split(',') if p)
+TRAFFIC_KEEP_BODIES = {r for r in os.environ.get('TRAFFIC_KEEP_BODIES', '').split(',') if r}
+
+_SECRET = re.compile(r'pass|token|secret|auth|key|signature|cookie', re.IGNORECASE)
+REDACTED = '<redacted>'
+MAX_DEPTH = 6
+
+
+# ========== SANITISING ==========
+def shape(value, depth=0):
+    """Structure of a JSON value without its content: 'str:12', 'int', {'$list': 3, 'item': ...}"""
+    if depth > MAX_DEPTH:
+        return '...'
+    if isinstance(value, dict):
+        return {k: REDACTED if _SECRET.search(k) else shape(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, list):
+        return {'$list': len(value), 'item': shape(value[0], depth + 1) if value else None}
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return type(value).__name__
+    if isinstance(value, str):
+        return f'str:{len(value)}'
+    return 'null'
+
+
+def redact(value):
+    """The value itself with secret-looking fields replaced"""
+    if isinstance(value, dict):
+        return {k: REDACTED if _SECRET.search(k) else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def fill(spec):
+    """Placeholder value with the shape recorded by shape()"""
+    if isinstance(spec, dict):
+        if '$list' in spec:
+            return [fill(spec['item']) for _ in range(min(spec['$list'], 1000))] if spec['item'] is not None else []
+        return {k: fill(v) for k, v in spec.items()}
+    if spec == 'bool':
+        return False
+    if spec == 'int':
+        return 1
+    if spec == 'float':
+        return 1.0
+    if isinstance(spec, str) and spec.startswith('str:'):
+        return 'x' * int(spec[4:])
+    if spec == REDACTED:
+        return 'x'
+    return None
+
+
+def _client_id():
+    # flask_login keeps the loaded user in g; anonymous requests fall back to the address
+    user = getattr(g, '_login_user', None)
+    ident = user.get_id() if user is not None and getattr(user, 'is_authenticated', False) else None
+    ident = f'user:{ident}' if ident is not None else f'addr:{request.remote_addr}'
+    return hashlib.blake2b((TRAFFIC_SALT + ident).encode(), digest_size=6).hexdigest()
+
+
+def record(response, elapsed_ms):
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    entry = {
+        'ts': round(time.time() - elapsed_ms / 1000.0, 6),
+        'ms': round(elapsed_ms, 3),
+        'method': request.method,
+        'route': rule,
+        'path': request.path,
+        'args': {k: [REDACTED] if _SECRET.search(k) else v for k, v in request.args.to_dict(flat=False).items()},
+        'status': response.status_code,
+        'bytes': response.calculate_content_length(),
+        'client': _client_id(),
+    }
+    if request.is_json and (request.content_length or 0) <= TRAFFIC_MAX_BODY:
+        body = request.get_json(silent=True)
+        if body is not None:
+            if rule in TRAFFIC_KEEP_BODIES:
+                entry['body'] = redact(body)
+            else:
+                entry['shape'] = shape(body)
+    return entry
+
+
+# ========== WRITER ==========
+class Writer:
+    """Background appender to a size-rotated JSONL file"""
+
+    def __init__(self, path=TRAFFIC_FILE, max_bytes=TRAFFIC_MAX_BYTES, backups=TRAFFIC_BACKUPS, max_pending=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.pending = queue.Queue(max_pending)
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, entry):
+        with self.lock:
+            # Started lazily so a pre-forking server's workers each get their own thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='traffic-writer', daemon=True)
+                self.thread.start()
+        try:
+            self.pending.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(''.join(json.dumps(e, default=str, separators=(',', ':')) + '\n' for e in batch))
+                self.written += len(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f'⚠ Traffic capture write failed: {e}')
+
+    def _append(self, data):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a') as f:
+                    f.write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'errors': self.errors,
+                'rotations': self.rotations, 'pending': self.pending.qsize()}
+
+
+def init_app(app, writer=None):
+    """Record every request (TRAFFIC_CAPTURE=1) to TRAFFIC_FILE; returns the writer or None"""
+    if not TRAFFIC_CAPTURE:
+        return None
+    writer = writer or Writer()
+    metrics.register('traffic', writer.stats)
+
+    @app.before_request
+    def _traffic_start():
+        if not request.path.startswith(TRAFFIC_EXCLUDE) and random.random() < TRAFFIC_SAMPLE_RATE:
+            g._traffic_start = time.perf_counter()
+
+    @app.after_request
+    def _traffic_record(response):
+        started = g.pop('_traffic_start', None)
+        if started is not None:
+            try:
+                writer.submit(record(response, (time.perf_counter() - started) * 1000.0))
+            except Exception as e:
+                writer.errors += 1
+                print(f'⚠ Traffic capture failed: {e}')
+        return response
+
+    print(f'✓ Traffic capture -> {writer.path} (sample {TRAFFIC_SAMPLE_RATE:g})')
+    return writer
+
+
+# ========== REPLAY ==========
+def load(paths):
+    """Captured entries from all files (rotated ones included), oldest first"""
+    entries = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    entries.sort(key=lambda e: e['ts'])
+    return entries
+
+
+def peak_concurrency(intervals):
+    """Most intervals (start, end) open at one instant"""
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def summarize(entries, speed=1.0):
+    if not entries:
+        return {'requests': 0}
+    t0 = entries[0]['ts']
+    span = max(e['ts'] + e['ms'] / 1000.0 for e in entries) - t0
+    routes = Counter(f"{e['method']} {e['route'] or e['path']}" for e in entries)
+    return {
+        'requests': len(entries),
+        'captured_seconds': round(span, 3),
+        'replay_seconds': round(span / speed, 3),
+        'clients': len({e['client'] for e in entries}),
+        'peak_concurrency': peak_concurrency([(e['ts'], e['ts'] + e['ms'] / 1000.0) for e in entries]),
+        'routes': dict(routes.most_common()),
+    }
+
+
+def replay(entries, target, speed=1.0, logins=(), max_workers=256, timeout=30):
+    """Re-issue entries against target at their captured offsets / speed; returns a report dict"""
+    from benchmark import Client, percentile
+
+    sessions = {}
+    sessions_lock = threading.Lock()
+
+    def session_for(client_id):
+        with sessions_lock:
+            if client_id not in sessions:
+                client = Client(target)
+                if logins:
+                    username, password = logins[len(sessions) % len(logins)]
+                    client.request('POST', '/api/auth/login', {'username': username, 'password': password})
+                sessions[client_id] = client
+            return sessions[client_id]
+
+    # Log every session in up front so logins do not distort the schedule
+    for client_id in dict.fromkeys(e['client'] for e in entries):
+        session_for(client_id)
+
+    results = []
+    results_lock = threading.Lock()
+
+    def send(entry, scheduled):
+        started = time.perf_counter()
+        path = entry['path']
+        if entry.get('args'):
+            path += '?' + urlencode(entry['args'], doseq=True)
+        body = entry['body'] if 'body' in entry else fill(entry['shape']) if 'shape' in entry else None
+        try:
+            status = session_for(entry['client']).request(entry['method'], path, body)
+        except Exception:
+            status = 0
+        finished = time.perf_counter()
+        with results_lock:
+            results.append((entry, status, started - scheduled, started, finished))
+
+    t0 = entries[0]['ts']
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for entry in entries:
+            scheduled = began + (entry['ts'] - t0) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, entry, scheduled)
+    elapsed = time.perf_counter() - began
+
+    by_route = defaultdict(lambda: {'captured': [], 'replayed': [], 'errors': 0})
+    for entry, status, _, started, finished in results:
+        route = by_route[f"{entry['method']} {entry['route'] or entry['path']}"]
+        route['captured'].append(entry['ms'])
+        route['replayed'].append((finished - started) * 1000.0)
+        if status == 0 or status >= 500 or (status >= 400) != (entry['status'] >= 400):
+            route['errors'] += 1
+
+    def latency(values):
+        values = sorted(values)
+        return {'p50_ms': round(percentile(values, 50), 3), 'p99_ms': round(percentile(values, 99), 3)}
+
+    lags = sorted(max(0.0, lag) * 1000.0 for _, _, lag, _, _ in results)
+    return {
+        'target': target,
+        'speed': speed,
+        'requests': len(results),
+        'seconds': round(elapsed, 3),
+        'statuses': dict(Counter(str(status) for _, status, _, _, _ in results)),
+        'peak_concurrency': {
+            'captured': peak_concurrency([(e['ts'], e['ts'] + e['ms'] / 1000.0) for e in entries]),
+            # Same arrivals compressed by `speed`, if the target answered as fast as when captured
+            'expected': peak_concurrency([(e['ts'] / speed, e['ts'] / speed + e['ms'] / 1000.0) for e in entries]),
+            'replayed': peak_concurrency([(started, finished) for _, _, _, started, finished in results]),
+        },
+        'schedule_lag_ms': {'p50': round(percentile(lags, 50), 3), 'p99': round(percentile(lags, 99), 3),
+                            'max': round(lags[-1], 3)} if lags else None,
+        'routes': {name: {'requests': len(r['captured']), 'mismatched': r['errors'],
+                          'captured': latency(r['captured']), 'replayed': latency(r['replayed'])}
+                   for name, r in sorted(by_route.items())},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Traffic capture tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('replay', help='re-issue captured traffic against a local instance')
+    p.add_argument('files', nargs='+', help='captured JSONL files (rotated ones too)')
+    p.add_argument('--target', default='http://127.0.0.1:5000')
+    p.add_argument('--speed', type=float, default=1.0, help='time compression: 2 = twice as fast (default 1)')
+    p.add_argument('--login', action='append', default=[], metavar='USER:PASSWORD',
+                   help='account for the replayed sessions (repeatable, used round-robin)')
+    p.add_argument('--route', help='only replay routes matching this regex')
+    p.add_argument('--include-auth', action='store_true', help='also replay /api/auth/ requests')
+    p.add_argument('--limit', type=int, help='replay at most this many requests')
+    p.add_argument('--max-workers', type=int, default=256, help='cap on requests in flight')
+    p.add_argument('--dry-run', action='store_true', help='print the workload summary only')
+    p.add_argument('--out', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    if args.speed <= 0:
+        parser.error('--speed must be positive')
+    entries = load(args.files)
+    if not args.include_auth:
+        entries = [e for e in entries if not e['path'].startswith('/api/auth/')]
+    if args.route:
+        pattern = re.compile(args.route)
+        entries = [e for e in entries if pattern.search(f"{e['method']} {e['route'] or e['path']}")]
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print('⚠ Nothing to replay', file=sys.stderr)
+        return 1
+
+    summary = summarize(entries, args.speed)
+    print(f"🚀 {summary['requests']} requests over {summary['captured_seconds']}s "
+          f"from {summary['clients']} clients (peak {summary['peak_concurrency']} concurrent)", file=sys.stderr)
+    if args.dry_run:
+        report = summary
+    else:
+        logins = [tuple(login.split(':', 1)) for login in args.login]
+        report = replay(entries, args.target.rstrip('/'), args.speed, logins, args.max_workers)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# warmup.py - Fork-safe pools and per-worker warm-up
+#
+# Under a pre-forking server (gunicorn --preload, see gunicorn_conf.py) every
+# worker inherits the master's SQLAlchemy pools, i.e. the very same sockets.
+# after_fork() drops those references without closing them (closing would
+# also kill the parent's copy) so each worker opens its own connections.
+#
+# start() then warms one worker in a background thread:
+#   * opens WARMUP_CONNECTIONS pooled connections at once, so the first
+#     requests do not pay the TCP/TLS/login cost (seconds against Azure SQL)
+#   * compiles every Jinja template and renders WARMUP_PAGES once
+# GET /api/ready answers 503 until that has finished, then 200: point the
+# platform's readiness/health check there, not at /api/health.
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy import text
+
+WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', '2'))
+WARMUP_PAGES = [p.strip() for p in os.environ.get('WARMUP_PAGES', '/').split(',') if p.strip()]
+
+
+class Warmup:
+    """Warm-up state of this worker process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.pid = None
+        self.started_at = None
+        self.seconds = None
+        self.connections = 0
+        self.pages = []
+        self.errors = []
+
+    def status(self):
+        return {
+            'ready': self.ready.is_set(),
+            'pid': os.getpid(),
+            'warming': self.pid == os.getpid() and not self.ready.is_set(),
+            'seconds': self.seconds,
+            'connections': self.connections,
+            'pages': self.pages,
+            'errors': self.errors,
+        }
+
+    def reset(self):
+        self.ready.clear()
+        self.pid = self.started_at = self.seconds = None
+        self.connections = 0
+        self.pages, self.errors = [], []
+
+
+state = Warmup()
+
+
+def _engines(app):
+    db = app.extensions.get('sqlalchemy')
+    if db is None:
+        return []
+    with app.app_context():
+        return list(db.engines.values())
+
+
+def after_fork(app):
+    """Forget pooled connections inherited from the parent process"""
+    for engine in _engines(app):
+        engine.dispose(close=False)
+    # Threads do not survive fork(): whatever the parent started must restart here
+    state.reset()
+
+
+def warm_connections(app, count):
+    opened = 0
+    for engine in _engines(app):
+        # Hold them all at once: connecting one by one would reuse a single socket
+        size = getattr(engine.pool, 'size', lambda: count)()
+        connections = []
+        try:
+            for _ in range(min(count, size)):
+                connection = engine.connect()
+                connections.append(connection)
+                connection.execute(text('SELECT 1'))
+                opened += 1
+        finally:
+            for connection in connections:
+                connection.close()
+    return opened
+
+
+def warm_pages(app, paths):
+    rendered = []
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    client = app.test_client()
+    for path in paths:
+        response = client.get(path)
+        rendered.append({'path': path, 'status': response.status_code})
+    return rendered
+
+
+def _run(app, connections, pages):
+    started = time.perf_counter()
+    try:
+        state.connections = warm_connections(app, connections)
+    except Exception as e:
+        # Not fatal: the pool connects on demand once the database is back
+        state.errors.append(f'connections: {e}')
+    try:
+        state.pages = warm_pages(app, pages)
+    except Exception as e:
+        state.errors.append(f'pages: {e}')
+    state.seconds = round(time.perf_counter() - started, 3)
+    state.ready.set()
+    print(f"✓ Worker {os.getpid()} warm in {state.seconds}s "
+          f"({state.connections} connections, {len(state.pages)} pages)")
+
+
+def start(app, connections=None, pages=None, wait=False):
+    """Warm this worker once (in the background unless wait=True)"""
+    with state.lock:
+        if state.pid == os.getpid():
+            thread = None
+        else:
+            state.pid = os.getpid()
+            state.started_at = time.time()
+            thread = threading.Thread(
+                target=_run, name='warmup', daemon=True,
+                args=(app, WARMUP_CONNECTIONS if connections is None else connections,
+                      WARMUP_PAGES if pages is None else pages),
+            )
+            thread.start()
+    if wait:
+        state.ready.wait()
+    return state
+
+
+def init_app(app):
+    """Add GET /api/ready"""
+
+    @app.route('/api/ready')
+    def ready():
+        # Servers without the gunicorn hook (flask run, python app.py) warm on first probe
+        start(app)
+        status = state.status()
+        return jsonify(status), 200 if status['ready'] else 503
+
+    return state